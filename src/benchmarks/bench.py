@@ -0,0 +1,447 @@
+# ==============================================
+# Benchmarks offline do ETL e do dashboard
+# ==============================================
+# Roda sem Spotify, YouTube nem PostgreSQL: dados de synthetic.py, clientes
+# de fakes.py e, para o dashboard, SQLite em memória (ou --db com a URL de um
+# PostgreSQL de teste). Cada caso mede tempo (mediana/min/p95 de --repeat
+# execuções), vazão em linhas/s e pico de memória (tracemalloc, numa execução
+# extra). Os resultados vão para um JSON-lines com o commit do git, e
+# --compare mostra a variação contra o último resultado de outro commit.
+#
+#   python src/benchmarks/bench.py --scale small
+#   python src/benchmarks/bench.py --scale large --only correlate --compare
+# ==============================================
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, SRC_DIR)
+
+from sqlalchemy import create_engine
+
+import extract_spotify
+import extract_youtube
+import load
+import parquet_store
+from clients import use_clients
+from dashboard import queries, parquet_queries
+from dashboard.dataset_cache import DatasetCache, load_run
+from landing import Landing
+from lsh_index import LSHIndex
+from match_cache import MatchCache
+from rate_limit import RequestScheduler
+from transform import correlate_music_video
+
+from fakes import FakeEngine, FakeSpotify, FakeYouTube
+from synthetic import SCALES, make_dataset
+
+RESULTS_PATH = os.getenv("BENCH_RESULTS_PATH", os.path.join(BENCH_DIR, "results.jsonl"))
+
+# Colunas da tabela correlations (correlate_music_video devolve DataFrame vazio sem colunas quando não há match)
+CORRELATION_COLUMNS = ["track_id", "track_name", "artist_name", "video_id", "video_title",
+                       "similarity_score", "region_spotify", "region_youtube"]
+
+# Acima disso o motor legacy (loop par a par em Python) levaria minutos: fica de fora
+LEGACY_MAX_PAIRS = 100_000
+
+def git_commit():
+    """(hash curto do HEAD, árvore com alterações não commitadas?)"""
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=SRC_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return git("rev-parse", "--short", "HEAD") or None, bool(git("status", "--porcelain", "--untracked-files=no"))
+    except OSError:
+        return None, False
+
+def quiet():
+    """Silencia os prints de progresso do ETL durante as medições."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+def measure(name: str, fn, rows: int, repeat: int = 3, setup=None) -> dict:
+    """
+    Executa fn() repeat vezes (setup() antes de cada uma, fora do tempo) e
+    uma vez extra sob tracemalloc para o pico de memória.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with quiet():
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    with quiet():
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = float(np.median(times))
+    result = {
+        "case": name,
+        "rows": rows,
+        "repeat": repeat,
+        "median_s": round(median, 6),
+        "min_s": round(min(times), 6),
+        "p95_s": round(float(np.percentile(times, 95)), 6),
+        "rows_per_s": round(rows / median, 1) if median else None,
+        "peak_mb": round(peak / 2**20, 2),
+    }
+    print(f"  {name:<36} {median * 1000:>10.1f} ms  {result['rows_per_s'] or 0:>14,.0f} linhas/s"
+          f"  {result['peak_mb']:>9.1f} MB")
+    return result
+
+# ================================
+# Casos
+# ================================
+def bench_correlate(spotify_df, youtube_df, repeat):
+    pairs = len(spotify_df) * len(youtube_df)
+    results = [measure("correlate/batched", lambda: correlate_music_video(spotify_df, youtube_df), pairs, repeat)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "match_cache.json.gz")
+        warm = MatchCache.load(path)
+        with quiet():
+            correlate_music_video(spotify_df, youtube_df, cache=warm)
+        warm.save()
+        results.append(measure("correlate/cache-warm",
+                               lambda: correlate_music_video(spotify_df, youtube_df, cache=MatchCache.load(path)),
+                               pairs, repeat))
+
+    # LSH: índice montado dentro da medição (primeiro run) e já montado (runs seguintes)
+    results.append(measure("correlate/lsh",
+                           lambda: correlate_music_video(spotify_df, youtube_df, method="lsh"), pairs, repeat))
+    index = LSHIndex()
+    with quiet():
+        exact = correlate_music_video(spotify_df, youtube_df)
+        approx = correlate_music_video(spotify_df, youtube_df, method="lsh", lsh_index=index)
+    results.append(measure("correlate/lsh-warm",
+                           lambda: correlate_music_video(spotify_df, youtube_df, method="lsh", lsh_index=index),
+                           pairs, repeat))
+    # recall: linhas do matcher exaustivo que o LSH reproduz com o mesmo score
+    keys = ["track_id", "region_spotify", "similarity_score"]
+    found = exact.merge(approx[keys], on=keys, how="inner") if not approx.empty else approx
+    recall = len(found) / len(exact) if len(exact) else None
+    results[-2]["recall"] = results[-1]["recall"] = round(recall, 4) if recall is not None else None
+    print(f"  {'correlate/lsh recall':<36} {recall or 0:>10.1%}  ({len(found)} de {len(exact)} correlações)")
+
+    if pairs <= LEGACY_MAX_PAIRS:
+        results.append(measure("correlate/legacy",
+                               lambda: correlate_music_video(spotify_df, youtube_df, method="legacy"), pairs, 1))
+    else:
+        print(f"  {'correlate/legacy':<36} ignorado ({pairs:,} pares > {LEGACY_MAX_PAIRS:,})")
+    return results
+
+def bench_extract(spotify_df, youtube_df, repeat, latency, workers):
+    fake_sp = FakeSpotify.from_tracks(spotify_df, extract_spotify.REGIONS, latency=latency)
+    fake_yt = FakeYouTube(youtube_df, latency=latency)
+
+    # clientes falsos e schedulers sem limite de taxa: mede só o ETL
+    use_clients(spotify=fake_sp, youtube=fake_yt)
+    extract_spotify.scheduler = RequestScheduler("Spotify", rate=1e9, burst=10**9)
+    extract_youtube.scheduler = RequestScheduler("YouTube", rate=1e9, burst=10**9)
+
+    rows = {}
+
+    def spotify():
+        rows["spotify"] = len(extract_spotify.extract_spotify_tracks(max_workers=workers))
+
+    def youtube():
+        rows["youtube"] = len(extract_youtube.extract_youtube_videos(max_workers=workers))
+
+    def refresh_spotify():
+        extract_spotify.refresh_spotify_stats(spotify_df["track_id"])
+
+    def refresh_youtube():
+        extract_youtube.refresh_youtube_stats(youtube_df["video_id"])
+
+    # chamadas de API de um run de cada tipo: extração completa x só métricas
+    calls = {}
+    with quiet():
+        for name, fn, fake in (("spotify", spotify, fake_sp), ("youtube", youtube, fake_yt),
+                               ("refresh_spotify", refresh_spotify, fake_sp),
+                               ("refresh_youtube", refresh_youtube, fake_yt)):
+            before = fake.calls
+            fn()
+            calls[name] = fake.calls - before
+    results = [
+        measure(f"extract/spotify (w={workers})", spotify, rows["spotify"], repeat),
+        measure(f"extract/youtube (w={workers})", youtube, rows["youtube"], repeat),
+        measure("extract/refresh-stats spotify", refresh_spotify, spotify_df["track_id"].nunique(), repeat),
+        measure("extract/refresh-stats youtube", refresh_youtube, youtube_df["video_id"].nunique(), repeat),
+    ]
+    for result, name in zip(results, ["spotify", "youtube", "refresh_spotify", "refresh_youtube"]):
+        result["api_calls"] = calls[name]
+    print(f"  {'chamadas de API por run':<36} Spotify {calls['spotify']} → {calls['refresh_spotify']} (só métricas), "
+          f"YouTube {calls['youtube']} → {calls['refresh_youtube']}")
+
+    # landing zone: custo de gravar as respostas e replay do run a partir dos arquivos
+    landing = Landing("bench", tempfile.mkdtemp())
+    results += [
+        measure(f"extract/spotify +landing (w={workers})",
+                lambda: extract_spotify.extract_spotify_tracks(max_workers=workers, landing=landing),
+                rows["spotify"], repeat),
+        measure(f"extract/youtube +landing (w={workers})",
+                lambda: extract_youtube.extract_youtube_videos(max_workers=workers, landing=landing),
+                rows["youtube"], repeat),
+        measure(f"extract/replay spotify (w={workers})",
+                lambda: extract_spotify.replay_spotify_tracks("bench", workers, landing.base_dir),
+                rows["spotify"], repeat),
+        measure(f"extract/replay youtube (w={workers})",
+                lambda: extract_youtube.replay_youtube_videos("bench", workers, landing.base_dir),
+                rows["youtube"], repeat),
+    ]
+    size = sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(landing.base_dir) for name in names)
+    print(f"  {'landing zone (gzip JSONL)':<36} {size / 2**20:.2f} MB")
+    return results
+
+def bench_load(spotify_df, youtube_df, repeat, db_engine=None):
+    """Sem --db, FakeEngine: mede a serialização CSV + montagem das transações."""
+    target = db_engine or FakeEngine()
+    kind = "db" if db_engine is not None else "fake"
+    results = []
+    for table, df in (("spotify_tracks", spotify_df), ("youtube_videos", youtube_df)):
+        results.append(measure(f"load/copy {table} ({kind})", lambda: load.copy_load(df, table, target),
+                               len(df), repeat))
+        results.append(measure(f"load/upsert {table} ({kind})", lambda: load.upsert_load(df, table, target),
+                               len(df), repeat))
+        records = df.to_dict("records")
+        pages = lambda: (records[i:i + 100] for i in range(0, len(records), 100))
+        results.append(measure(f"load/stream {table} ({kind})",
+                               lambda: load.stream_load(pages(), table, db_engine=target), len(df), repeat))
+    return results
+
+def bench_dashboard(spotify_df, youtube_df, repeat, db_engine=None):
+    """
+    Consultas do dashboard sem filtro e com filtros típicos da sidebar, no
+    banco (SQLite em memória ou --db) e nos snapshots Parquet.
+    """
+    if db_engine is None:
+        db_engine = create_engine("sqlite://")
+        kind = "sqlite"
+    else:
+        kind = "db"
+    with quiet():
+        correlations = correlate_music_video(spotify_df.head(2000), youtube_df.head(2000))
+    correlations = correlations.reindex(columns=CORRELATION_COLUMNS)
+    spotify_df.to_sql("spotify_tracks", db_engine, if_exists="replace", index=False)
+    youtube_df.to_sql("youtube_videos", db_engine, if_exists="replace", index=False)
+    correlations.to_sql("correlations", db_engine, if_exists="replace", index=False)
+    with quiet():
+        for table in load.ROLLUP_TABLES:
+            load.refresh_rollups(table, db_engine)
+
+    options = queries.filter_options(db_engine)
+    # all/regions saem dos rollups no banco; filtered (popularidade, views) precisa das linhas
+    filters = {
+        "all": queries.Filters(),
+        "regions": queries.Filters(regions=tuple(options["regions"][:1]), categories=("Music",)),
+        "filtered": queries.Filters(
+            regions=tuple(options["regions"][:2]),
+            popularity=(70, 100),
+            categories=("Music",),
+            views=(10_000, options["views"][1]),
+        ),
+    }
+    rows = len(spotify_df) + len(youtube_df)
+
+    def page(backend, source, f):
+        backend.spotify_histogram(source, f, "popularity")
+        backend.spotify_histogram(source, f, "duration_s")
+        backend.spotify_popularity_by_region(source, f)
+        backend.youtube_kpis(source, f)
+        backend.youtube_top_categories(source, f)
+        backend.youtube_views_by_region(source, f)
+        backend.correlations(source, f)
+
+    results = []
+    with tempfile.TemporaryDirectory() as store:
+        with quiet():
+            for table, df in (("spotify_tracks", spotify_df), ("youtube_videos", youtube_df),
+                              ("correlations", correlations)):
+                parquet_store.write_snapshot(df, table, "bench", base_dir=store)
+        parquet_store.PARQUET_STORE_DIR = store
+        # cache Arrow do dashboard: carga do run (a cada run novo do ETL) e consultas em memória
+        results.append(measure("dashboard/load_run (arrow)", lambda: load_run("bench", store), rows, repeat))
+        with quiet():
+            datasets = DatasetCache(store).current()
+        print(f"  {'dashboard/arrow em memória':<36} {datasets.nbytes / 2**20:>10.1f} MB (uma cópia por processo)")
+        for backend, source, label in ((queries, db_engine, kind), (parquet_queries, "bench", "parquet"),
+                                       (parquet_queries, datasets, "arrow")):
+            results.append(measure(f"dashboard/filter_options ({label})",
+                                   lambda: backend.filter_options(source), rows, repeat))
+            for name, f in filters.items():
+                results.append(measure(f"dashboard/page {name} ({label})",
+                                       lambda: page(backend, source, f), rows, repeat))
+    return results
+
+# O que cada ponto de entrada faz antes do primeiro trabalho útil (import + clientes)
+ENTRY_POINTS = {
+    "etl_runner": "import etl_runner",
+    "extract_spotify": "import extract_spotify, clients; clients.get_spotify()",
+    "extract_youtube": "import extract_youtube, clients; clients.get_youtube()",
+    "load": "import load, clients; clients.get_engine()",
+    "transform": "import transform",
+    "tests": "import tests",
+    # o app em si só roda sob o streamlit: mede os imports e o engine que ele usa
+    "dashboard": "import streamlit, plotly.express, clients; from dashboard import queries; clients.get_engine()",
+}
+
+# Pico de RSS pelo VmHWM (Linux): o ru_maxrss de um processo filho herda o do pai no fork
+_COLD_START = """
+import os, sys, time, resource
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if os.path.exists("/proc/self/status"):
+    with open("/proc/self/status") as f:
+        peak_kb = next((int(line.split()[1]) for line in f if line.startswith("VmHWM")), peak_kb)
+print(elapsed, peak_kb)
+"""
+
+def bench_cold_start(repeat):
+    """
+    Cada ponto de entrada em um interpretador novo: tempo do import + criação
+    dos clientes (median_s) e do processo inteiro (process_s). Nenhum cliente
+    acessa a rede aqui; o discovery do YouTube vem do cache local.
+    """
+    env = {**os.environ}
+    for var in ("SPOTIFY_CLIENT_ID", "SPOTIFY_CLIENT_SECRET", "YOUTUBE_API_KEY"):
+        env.setdefault(var, "offline-benchmark")
+    root = os.path.dirname(SRC_DIR)
+    results = []
+    for name, statement in ENTRY_POINTS.items():
+        code = _COLD_START.format(src=SRC_DIR, statement=statement)
+        inner, outer, peaks = [], [], []
+        # a primeira execução aquece o cache de disco (bytecode, discovery) e fica de fora
+        for i in range(repeat + 1):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, "-c", code], cwd=root, env=env,
+                                 capture_output=True, text=True, check=True).stdout.split()
+            if i:
+                outer.append(time.perf_counter() - start)
+                inner.append(float(out[-2]))
+                peaks.append(int(out[-1]) / 2**10)
+        median = float(np.median(inner))
+        result = {
+            "case": f"cold_start/{name}",
+            "rows": 1,
+            "repeat": repeat,
+            "median_s": round(median, 6),
+            "min_s": round(min(inner), 6),
+            "p95_s": round(float(np.percentile(inner, 95)), 6),
+            "process_s": round(float(np.median(outer)), 6),
+            "rows_per_s": None,
+            "peak_mb": round(max(peaks), 2),
+        }
+        print(f"  {result['case']:<36} {median * 1000:>10.1f} ms  processo {result['process_s'] * 1000:>8.1f} ms"
+              f"  {result['peak_mb']:>9.1f} MB RSS")
+        results.append(result)
+    return results
+
+# ================================
+# Resultados
+# ================================
+def save_results(record: dict, path: str = RESULTS_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def previous_results(record: dict, path: str = RESULTS_PATH):
+    """Último resultado com o mesmo tamanho de dados e outro commit."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    same_size = [r for r in runs if (r["n_tracks"], r["n_videos"]) == (record["n_tracks"], record["n_videos"])
+                 and r["commit"] != record["commit"]]
+    return same_size[-1] if same_size else None
+
+def compare(record: dict, previous: dict):
+    print(f"\n📈 Comparação com {previous['commit']} ({previous['timestamp']}):")
+    before = {r["case"]: r for r in previous["results"]}
+    for result in record["results"]:
+        old = before.get(result["case"])
+        if not old or not old["median_s"]:
+            continue
+        time_delta = (result["median_s"] / old["median_s"] - 1) * 100
+        mem_delta = result["peak_mb"] - old["peak_mb"]
+        flag = "🔴" if time_delta > 10 else "🟢" if time_delta < -10 else "⚪"
+        print(f"  {flag} {result['case']:<36} tempo {time_delta:+6.1f}%   memória {mem_delta:+8.1f} MB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline do ETL e do dashboard.")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--tracks", type=int, help="número de faixas (ignora --scale)")
+    parser.add_argument("--videos", type=int, help="número de vídeos (ignora --scale)")
+    parser.add_argument("--only", nargs="+", choices=["correlate", "extract", "load", "dashboard", "cold_start"],
+                        default=["correlate", "extract", "load", "dashboard", "cold_start"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="segundos por chamada nos clientes falsos")
+    parser.add_argument("--workers", type=int, default=4, help="threads por fonte na extração")
+    parser.add_argument("--db", help="URL SQLAlchemy de um PostgreSQL de teste (carga e dashboard reais)")
+    parser.add_argument("--compare", action="store_true", help="compara com o último resultado de outro commit")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    spotify_df, youtube_df = make_dataset(args.scale, args.tracks, args.videos)
+    commit, dirty = git_commit()
+    print(f"🏁 Benchmarks: {len(spotify_df):,} faixas x {len(youtube_df):,} vídeos "
+          f"(commit {commit}{'+alterações' if dirty else ''})")
+
+    db_engine = create_engine(args.db) if args.db else None
+    results = []
+    if "correlate" in args.only:
+        results += bench_correlate(spotify_df, youtube_df, args.repeat)
+    if "extract" in args.only:
+        results += bench_extract(spotify_df, youtube_df, args.repeat, args.api_latency, args.workers)
+    if "load" in args.only:
+        results += bench_load(spotify_df, youtube_df, args.repeat, db_engine)
+    if "dashboard" in args.only:
+        results += bench_dashboard(spotify_df, youtube_df, args.repeat, db_engine)
+    if "cold_start" in args.only:
+        results += bench_cold_start(args.repeat)
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "scale": args.scale if args.tracks is None and args.videos is None else "custom",
+        "n_tracks": len(spotify_df),
+        "n_videos": len(youtube_df),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if args.compare:
+        previous = previous_results(record)
+        if previous:
+            compare(record, previous)
+        else:
+            print("\nℹ️ Nenhum resultado anterior de outro commit com o mesmo tamanho de dados.")
+    if not args.no_save:
+        save_results(record)
+        print(f"\n💾 Resultados em {RESULTS_PATH}")
+
+if __name__ == "__main__":
+    main()
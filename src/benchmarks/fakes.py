@@ -0,0 +1,219 @@
+# ==============================================
+# Fakes em processo dos clientes de API e do banco
+# ==============================================
+# FakeSpotify imita os métodos de spotipy.Spotify que o ETL usa e FakeYouTube
+# imita o resource do googleapiclient (videos().list(...).execute()), ambos
+# servindo DataFrames (ex.: os de synthetic.py). FakeEngine aceita
+# raw_connection()/cursor()/copy_expert() e descarta os dados: mede o custo
+# do lado Python da carga sem PostgreSQL.
+# ==============================================
+
+import hashlib
+import threading
+import time
+
+import httplib2
+import pandas as pd
+from googleapiclient.errors import HttpError
+
+def _etag(*parts) -> str:
+    return '"' + hashlib.md5("|".join(map(str, parts)).encode()).hexdigest() + '"'
+
+class _CallCounter:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _hit(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+class FakeSpotify(_CallCounter):
+    """
+    playlists: {playlist_id: DataFrame no formato de spotify_tracks}.
+    latency simula o tempo de rede de cada chamada (segundos).
+    overlap: cada página depois da primeira repete os últimos N itens da
+    anterior (como quando a playlist muda durante a paginação).
+    """
+
+    def __init__(self, playlists: dict, latency: float = 0.0, version: int = 1, overlap: int = 0):
+        super().__init__(latency)
+        self.playlists = playlists
+        self.version = version
+        self.overlap = overlap
+        self.tracks_by_id = {}
+        for df in playlists.values():
+            for track in self._track_dicts(df):
+                self.tracks_by_id.setdefault(track["id"], track)
+
+    @classmethod
+    def from_tracks(cls, tracks: pd.DataFrame, regions: dict, **kwargs) -> "FakeSpotify":
+        """Uma playlist por região de regions ({região: playlist_id}), com as faixas daquela região."""
+        return cls({pid: tracks[tracks["region"] == region] for region, pid in regions.items()}, **kwargs)
+
+    @staticmethod
+    def _track_dicts(df: pd.DataFrame) -> list:
+        return [{
+            "id": row.track_id,
+            "name": row.track_name,
+            "artists": [{"name": a} for a in row.artist_name.split(", ")],
+            "album": {"name": row.album_name, "release_date": f"{row.release_year}-01-01"},
+            "duration_ms": int(row.duration_s) * 1000,
+            "popularity": int(row.popularity),
+        } for row in df.itertuples(index=False)]
+
+    def playlist(self, playlist_id, fields=None, market=None, additional_types=("track",)):
+        self._hit()
+        return {"snapshot_id": f"{playlist_id}-v{self.version}"}
+
+    def playlist_tracks(self, playlist_id, fields=None, limit=100, offset=0, market=None,
+                        additional_types=("track",)):
+        self._hit()
+        df = self.playlists[playlist_id]
+        page = self._track_dicts(df.iloc[max(offset - self.overlap, 0):offset + limit])
+        has_next = offset + limit < len(df)
+        return {
+            "items": [{"track": t} for t in page],
+            "limit": limit,
+            "offset": offset,
+            "total": len(df),
+            "next": f"fake://{playlist_id}?offset={offset + limit}&limit={limit}" if has_next else None,
+        }
+
+    def next(self, result):
+        if not result.get("next"):
+            return None
+        playlist_id, query = result["next"][len("fake://"):].split("?")
+        params = dict(p.split("=") for p in query.split("&"))
+        return self.playlist_tracks(playlist_id, limit=int(params["limit"]), offset=int(params["offset"]))
+
+    def tracks(self, tracks, market=None):
+        self._hit()
+        return {"tracks": [self.tracks_by_id.get(t) for t in tracks]}
+
+class _FakeRequest:
+    def __init__(self, youtube: "FakeYouTube", kwargs: dict):
+        self.youtube = youtube
+        self.kwargs = kwargs
+        self.headers = {}
+
+    def execute(self, num_retries=0):
+        return self.youtube._execute(self.kwargs, self.headers)
+
+class FakeYouTube(_CallCounter):
+    """
+    Resource youtube v3 servindo um DataFrame no formato de youtube_videos:
+    chart="mostPopular" por regionCode com pageToken, ou id="a,b,c".
+    Responde 304 (HttpError) quando o If-None-Match bate com o ETag da página.
+    overlap: cada página depois da primeira repete os últimos N itens da anterior.
+    """
+
+    def __init__(self, videos: pd.DataFrame, latency: float = 0.0, version: int = 1, overlap: int = 0):
+        super().__init__(latency)
+        self.videos_df = videos
+        self.version = version
+        self.overlap = overlap
+        self.by_region = {r: df for r, df in videos.groupby("region", sort=False)}
+        self.by_id = videos.drop_duplicates("video_id").set_index("video_id", drop=False)
+
+    def videos(self):
+        return self
+
+    def list(self, **kwargs):
+        return _FakeRequest(self, kwargs)
+
+    @staticmethod
+    def _items(df: pd.DataFrame) -> list:
+        return [{
+            "id": row.video_id,
+            "snippet": {
+                "title": row.title,
+                "channelId": row.channel_id,
+                "channelTitle": row.channel_title,
+                "categoryId": row.category,
+                "publishedAt": row.published_at,
+            },
+            "statistics": {
+                "viewCount": str(row.view_count),
+                "likeCount": str(row.like_count),
+                "commentCount": str(row.comment_count),
+            },
+        } for row in df.itertuples(index=False)]
+
+    def _execute(self, kwargs: dict, headers: dict):
+        self._hit()
+        if "id" in kwargs:
+            ids = [i for i in kwargs["id"].split(",") if i in self.by_id.index]
+            return {"etag": _etag("ids", self.version, kwargs["id"]), "items": self._items(self.by_id.loc[ids])}
+
+        region = kwargs["regionCode"]
+        size = int(kwargs.get("maxResults", 5))
+        offset = int(kwargs.get("pageToken") or 0)
+        etag = _etag(region, self.version, offset)
+        if headers.get("If-None-Match") == etag:
+            raise HttpError(httplib2.Response({"status": 304}), b"")
+        df = self.by_region.get(region, self.videos_df.iloc[:0])
+        response = {"etag": etag, "items": self._items(df.iloc[max(offset - self.overlap, 0):offset + size]),
+                    "pageInfo": {"totalResults": len(df), "resultsPerPage": size}}
+        if offset + size < len(df):
+            response["nextPageToken"] = str(offset + size)
+        return response
+
+class _FakeCursor:
+    def __init__(self, engine: "FakeEngine"):
+        self.engine = engine
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.engine.statements += 1
+
+    def copy_expert(self, sql, buffer):
+        # consome o CSV como o servidor faria
+        self.engine.copied_bytes += len(buffer.read())
+
+class _FakeConnection:
+    def __init__(self, engine: "FakeEngine"):
+        self.engine = engine
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return _FakeCursor(self.engine)
+
+    def exec_driver_sql(self, sql, params=None):
+        self.engine.statements += 1
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class FakeEngine:
+    """Substitui o engine do SQLAlchemy em copy_load/upsert_load/stream_load/refresh_rollups."""
+
+    def __init__(self):
+        self.statements = 0
+        self.copied_bytes = 0
+
+    def raw_connection(self):
+        return _FakeConnection(self)
+
+    def begin(self):
+        return _FakeConnection(self)
@@ -0,0 +1,165 @@
+# ==============================================
+# Gerador de dados sintéticos para os benchmarks
+# ==============================================
+# Vocabulário, artistas, canais e categorias vêm dos dumps versionados
+# (spotify_tracks.csv / youtube_videos.csv); as tabelas geradas têm as mesmas
+# colunas das extrações reais e escalam de ~200 linhas até 100k x 100k.
+# Parte dos títulos de vídeo é derivada de faixas (com "(Official Video)",
+# "feat.", "| Canal" etc.), o resto é ruído, como no chart mostPopular.
+# ==============================================
+
+import os
+import re
+import string
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SPOTIFY_CSV = os.path.join(ROOT, "spotify_tracks.csv")
+YOUTUBE_CSV = os.path.join(ROOT, "youtube_videos.csv")
+
+# Tamanhos (faixas, vídeos) de cada escala; "shipped" usa os CSVs como estão
+SCALES = {
+    "shipped": None,
+    "small": (1_000, 1_000),
+    "medium": (10_000, 10_000),
+    "large": (100_000, 100_000),
+}
+
+SPOTIFY_REGIONS = ["GLOBAL", "BR", "US", "MX", "PT"]
+YOUTUBE_REGIONS = ["BR", "US", "MX", "PT"]
+
+# Como um vídeo de música costuma se chamar no YouTube
+MUSIC_TEMPLATES = [
+    "{artist} - {track} (Official Video)",
+    "{artist} - {track} (Official Music Video)",
+    "{artist} - {track} (Lyric Video)",
+    "{track} (Ao Vivo)",
+    "{track} - {artist} (Clipe Oficial)",
+    "{artist} - {track} | {channel}",
+    "{track} (feat. {guest})",
+    "{artist}, {guest} - {track} (Official Lyric Video)",
+    "{artist} - {track}",
+    "{TRACK} - {ARTIST} (AO VIVO)",
+]
+
+_WORD = re.compile(r"[^\W\d_]{2,}")
+_ID_ALPHABET = np.array(list(string.ascii_letters + string.digits))
+
+def load_shipped():
+    """Os dumps versionados no repositório (spotify_tracks.csv, youtube_videos.csv)."""
+    return pd.read_csv(SPOTIFY_CSV), pd.read_csv(YOUTUBE_CSV)
+
+def _vocabulary(texts) -> np.ndarray:
+    words = {w for text in texts.dropna() for w in _WORD.findall(str(text))}
+    return np.array(sorted(words))
+
+def _ids(rng, n: int, length: int) -> np.ndarray:
+    chars = _ID_ALPHABET[rng.integers(0, len(_ID_ALPHABET), size=(n, length))]
+    return chars.view(f"<U{length}").ravel() if n else np.array([], dtype=f"<U{length}")
+
+def _phrases(rng, vocab: np.ndarray, n: int, min_words: int, max_words: int) -> list:
+    sizes = rng.integers(min_words, max_words + 1, size=n)
+    words = vocab[rng.integers(0, len(vocab), size=int(sizes.sum()))]
+    phrases, start = [], 0
+    for size in sizes:
+        phrases.append(" ".join(words[start:start + size]).title()
+                       if rng.random() < 0.7 else " ".join(words[start:start + size]))
+        start += size
+    return phrases
+
+def synthetic_tracks(n: int, seed: int = 42, shipped: pd.DataFrame = None) -> pd.DataFrame:
+    """n faixas com as colunas de extract_spotify_tracks (+ genre, como no CSV)."""
+    rng = np.random.default_rng(seed)
+    shipped = shipped if shipped is not None else pd.read_csv(SPOTIFY_CSV)
+    vocab = _vocabulary(shipped["track_name"])
+    real_artists = sorted({a.strip() for names in shipped["artist_name"].dropna() for a in names.split(",")})
+    # artistas sintéticos (1 a 2 palavras) somados aos reais, ~1 artista para cada 5 faixas
+    artists = np.array(real_artists + _phrases(rng, _vocabulary(pd.Series(real_artists)),
+                                               max(n // 5 - len(real_artists), 0), 1, 2))
+    main = artists[rng.integers(0, len(artists), size=n)]
+    guest = artists[rng.integers(0, len(artists), size=n)]
+    with_guest = rng.random(n) < 0.2
+    genres = shipped["genre"].dropna().unique()
+    albums = shipped["album_name"].dropna().unique()
+    return pd.DataFrame({
+        "track_id": _ids(rng, n, 22),
+        "track_name": _phrases(rng, vocab, n, 1, 4),
+        "artist_name": np.where(with_guest, np.char.add(np.char.add(main, ", "), guest), main),
+        "album_name": albums[rng.integers(0, len(albums), size=n)],
+        "release_year": rng.choice([2025, 2024, 2023, 2022, 2019, 2015, 2008, 1997], size=n,
+                                   p=[.45, .2, .1, .08, .07, .05, .03, .02]),
+        "duration_s": rng.normal(190, 35, size=n).clip(60, 600).astype(int),
+        "popularity": rng.integers(40, 101, size=n),
+        "genre": genres[rng.integers(0, len(genres), size=n)],
+        "region": np.array(SPOTIFY_REGIONS)[rng.integers(0, len(SPOTIFY_REGIONS), size=n)],
+    })
+
+def synthetic_videos(n: int, tracks: pd.DataFrame, music_share: float = 0.35, seed: int = 43,
+                     shipped: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    n vídeos com as colunas de extract_youtube_videos. Uma fração music_share
+    dos títulos vem de faixas de tracks (MUSIC_TEMPLATES); o resto é ruído.
+    attrs["source_track_id"]: {video_id: track_id de origem} dos vídeos musicais
+    (gabarito para medir os motores de correlação).
+    """
+    rng = np.random.default_rng(seed)
+    shipped = shipped if shipped is not None else pd.read_csv(YOUTUBE_CSV)
+    vocab = _vocabulary(shipped["title"])
+    channels = shipped[["channel_id", "channel_title"]].drop_duplicates().to_numpy()
+    categories = shipped["category"].dropna().to_numpy()
+
+    is_music = rng.random(n) < music_share
+    picks = tracks.iloc[rng.integers(0, len(tracks), size=n)]
+    templates = rng.integers(0, len(MUSIC_TEMPLATES), size=n)
+    noise = _phrases(rng, vocab, n, 3, 9)
+    channel_rows = channels[rng.integers(0, len(channels), size=n)]
+
+    titles = []
+    for i, (track, artist) in enumerate(zip(picks["track_name"], picks["artist_name"])):
+        if not is_music[i]:
+            titles.append(noise[i])
+            continue
+        first_artist = artist.split(",")[0]
+        titles.append(MUSIC_TEMPLATES[templates[i]].format(
+            artist=first_artist, track=track, TRACK=track.upper(), ARTIST=first_artist.upper(),
+            guest=artist.split(",")[-1].strip(), channel=channel_rows[i][1]))
+
+    published = pd.Timestamp("2025-10-01", tz="UTC") - pd.to_timedelta(rng.integers(0, 60 * 86400, size=n), unit="s")
+    views = rng.lognormal(12, 2, size=n).astype(np.int64)
+    video_ids = _ids(rng, n, 11)  # sorteado aqui para manter a sequência do rng (mesmos datasets)
+    videos = pd.DataFrame({
+        "video_id": video_ids,
+        "title": titles,
+        "channel_id": channel_rows[:, 0],
+        "channel_title": channel_rows[:, 1],
+        "category": np.where(is_music, "Music", categories[rng.integers(0, len(categories), size=n)]),
+        "published_at": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "view_count": views,
+        "like_count": (views * rng.uniform(0.005, 0.08, size=n)).astype(np.int64),
+        "comment_count": (views * rng.uniform(0.0001, 0.005, size=n)).astype(np.int64),
+        "region": np.array(YOUTUBE_REGIONS)[rng.integers(0, len(YOUTUBE_REGIONS), size=n)],
+    })
+    videos.attrs["source_track_id"] = dict(zip(video_ids[is_music], picks["track_id"].to_numpy()[is_music]))
+    return videos
+
+def make_dataset(scale: str = "small", n_tracks: int = None, n_videos: int = None, seed: int = 42):
+    """
+    (spotify_df, youtube_df) de uma escala de SCALES, ou com tamanhos explícitos.
+    "shipped" devolve os CSVs do repositório sem alteração.
+    """
+    spotify, youtube = load_shipped()
+    if n_tracks is None and n_videos is None:
+        if SCALES[scale] is None:
+            return spotify, youtube
+        n_tracks, n_videos = SCALES[scale]
+    n_tracks = n_tracks or len(spotify)
+    n_videos = n_videos or len(youtube)
+    tracks = synthetic_tracks(n_tracks, seed=seed, shipped=spotify)
+    videos = synthetic_videos(n_videos, tracks, seed=seed + 1, shipped=youtube)
+    return tracks, videos
+
+if __name__ == "__main__":
+    tracks, videos = make_dataset("small")
+    print(tracks.head())
+    print(videos[["title", "channel_title", "category", "region"]].head(10))
@@ -0,0 +1,133 @@
+# ==============================================
+# Fábrica compartilhada de clientes (Spotify, YouTube, PostgreSQL)
+# ==============================================
+# Nada é criado no import: cada cliente nasce na primeira chamada de
+# get_spotify() / get_youtube() / get_engine() e é reaproveitado pelo processo
+# inteiro (o do YouTube, um por thread). spotipy e googleapiclient também só
+# são importados nessa hora, então importar transform, load ou os extratores
+# não paga rede, pool de conexões nem o import das bibliotecas de API.
+# ==============================================
+
+import json
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_HOST = os.getenv("DB_HOST", "localhost")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_NAME = os.getenv("DB_NAME", "spotify_youtube")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+
+# Documento de discovery da API do YouTube salvo localmente (vazio = sem cache em disco)
+YOUTUBE_DISCOVERY_CACHE = os.getenv("YOUTUBE_DISCOVERY_CACHE", ".cache/discovery")
+YOUTUBE_DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest"
+
+_lock = threading.Lock()
+_local = threading.local()
+_engine = None
+_spotify = None
+_youtube_discovery = None
+_overrides = {}
+
+def database_url() -> str:
+    return f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+def use_clients(spotify=None, youtube=None, engine=None):
+    """Injeta clientes prontos no lugar dos reais (ex.: fakes dos benchmarks). None mantém o atual."""
+    for name, client in (("spotify", spotify), ("youtube", youtube), ("engine", engine)):
+        if client is not None:
+            _overrides[name] = client
+
+def reset_clients():
+    """Descarta clientes criados e injetados; o próximo get_* cria de novo."""
+    global _engine, _spotify
+    with _lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine, _spotify = None, None
+        _overrides.clear()
+        _local.__dict__.clear()
+
+def get_engine():
+    """Engine SQLAlchemy único do processo (um pool de conexões para ETL, testes e dashboard)."""
+    global _engine
+    if "engine" in _overrides:
+        return _overrides["engine"]
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+                _engine = create_engine(database_url(), pool_pre_ping=True)
+    return _engine
+
+def get_spotify():
+    """Cliente spotipy com client credentials (retries internos desligados: quem repete é o scheduler)."""
+    global _spotify
+    if "spotify" in _overrides:
+        return _overrides["spotify"]
+    if _spotify is None:
+        with _lock:
+            if _spotify is None:
+                import spotipy
+                from spotipy.oauth2 import SpotifyClientCredentials
+                _spotify = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
+                    client_id=os.getenv("SPOTIFY_CLIENT_ID"),
+                    client_secret=os.getenv("SPOTIFY_CLIENT_SECRET")
+                ), retries=0, status_retries=0)
+    return _spotify
+
+def youtube_discovery() -> dict:
+    """
+    Documento de discovery do youtube v3, lido uma vez por processo.
+
+    Vem de YOUTUBE_DISCOVERY_CACHE; na primeira vez é copiado do documento
+    embutido no googleapiclient ou, se a versão instalada não tiver, baixado.
+    """
+    global _youtube_discovery
+    if _youtube_discovery is None:
+        with _lock:
+            if _youtube_discovery is None:
+                path = os.path.join(YOUTUBE_DISCOVERY_CACHE, "youtube.v3.json") if YOUTUBE_DISCOVERY_CACHE else None
+                if path and os.path.exists(path):
+                    with open(path, encoding="utf-8") as f:
+                        document = f.read()
+                else:
+                    document = _fetch_youtube_discovery()
+                    if path:
+                        os.makedirs(YOUTUBE_DISCOVERY_CACHE, exist_ok=True)
+                        tmp_path = f"{path}.tmp"
+                        with open(tmp_path, "w", encoding="utf-8") as f:
+                            f.write(document)
+                        os.replace(tmp_path, path)
+                _youtube_discovery = json.loads(document)
+    return _youtube_discovery
+
+def _fetch_youtube_discovery() -> str:
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+        document = get_static_doc("youtube", "v3")
+    except ImportError:
+        document = None
+    if document:
+        return document
+    import httplib2
+    response, content = httplib2.Http(timeout=30).request(YOUTUBE_DISCOVERY_URL)
+    if response.status != 200:
+        raise RuntimeError(f"Discovery do YouTube indisponível (HTTP {response.status})")
+    return content.decode("utf-8")
+
+def get_youtube():
+    """
+    Resource youtube v3 da thread atual: o cliente HTTP do googleapiclient
+    (httplib2) não é thread-safe, então cada thread tem o seu, todos montados
+    a partir do mesmo documento de discovery em memória.
+    """
+    if "youtube" in _overrides:
+        return _overrides["youtube"]
+    if not hasattr(_local, "youtube"):
+        from googleapiclient.discovery import build_from_document
+        _local.youtube = build_from_document(youtube_discovery(), developerKey=os.getenv("YOUTUBE_API_KEY"))
+    return _local.youtube
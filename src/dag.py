@@ -0,0 +1,190 @@
+# ==============================================
+# Executor de etapas em DAG com checkpoint
+# ==============================================
+# Cada etapa declara de quais outras depende; etapas independentes rodam ao
+# mesmo tempo (threads). A saída de cada etapa concluída é gravada em
+#   <checkpoint_dir>/<run_id>/<etapa>.parquet   (DataFrame)
+#   <checkpoint_dir>/<run_id>/<etapa>.pkl       (qualquer outro valor, inclusive None)
+# e registrada em manifest.json. Com resume, etapas que já têm checkpoint
+# não rodam de novo: a saída é lida do disco. Com only, só as etapas
+# pedidas rodam e as dependências vêm dos checkpoints do run retomado
+# (etapas posteriores não são refeitas: peça-as também em only).
+# ==============================================
+
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+class Stage:
+    """Uma etapa: fn recebe as saídas das dependências como argumentos nomeados."""
+
+    def __init__(self, name: str, fn, deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+
+class CheckpointStore:
+    """Saídas das etapas de um run em disco (escrita atômica: tmp + rename)."""
+
+    def __init__(self, base_dir: str, run_id: str):
+        self.base_dir = base_dir
+        self.run_id = run_id
+        self.directory = os.path.join(base_dir, run_id)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def latest_run(base_dir: str):
+        """run_id mais recente com manifest.json; None se não houver."""
+        if not os.path.isdir(base_dir):
+            return None
+        runs = [name for name in os.listdir(base_dir)
+                if os.path.exists(os.path.join(base_dir, name, "manifest.json"))]
+        return max(runs) if runs else None
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, "manifest.json")
+
+    def manifest(self) -> dict:
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def has(self, stage: str) -> bool:
+        return stage in self.manifest()
+
+    def save(self, stage: str, value):
+        os.makedirs(self.directory, exist_ok=True)
+        if isinstance(value, pd.DataFrame):
+            fmt, path = "parquet", os.path.join(self.directory, f"{stage}.parquet")
+            value.to_parquet(f"{path}.tmp", index=False)
+        else:
+            fmt, path = "pickle", os.path.join(self.directory, f"{stage}.pkl")
+            with open(f"{path}.tmp", "wb") as f:
+                pickle.dump(value, f)
+        os.replace(f"{path}.tmp", path)
+        with self._lock:
+            manifest = self.manifest()
+            manifest[stage] = {"format": fmt, "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            tmp_path = f"{self._manifest_path()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self._manifest_path())
+
+    def load(self, stage: str):
+        fmt = self.manifest()[stage]["format"]
+        if fmt == "parquet":
+            return pd.read_parquet(os.path.join(self.directory, f"{stage}.parquet"))
+        with open(os.path.join(self.directory, f"{stage}.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def discard(self, stage: str):
+        """Remove o checkpoint da etapa (ex.: antes de rodá-la de novo com --only)."""
+        with self._lock:
+            manifest = self.manifest()
+            if manifest.pop(stage, None) is None:
+                return
+            tmp_path = f"{self._manifest_path()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self._manifest_path())
+
+    def prune(self, keep: int):
+        """Apaga os checkpoints dos runs mais antigos, mantendo os keep mais recentes."""
+        if keep <= 0 or not os.path.isdir(self.base_dir):
+            return
+        runs = sorted(name for name in os.listdir(self.base_dir)
+                      if os.path.isdir(os.path.join(self.base_dir, name)))
+        for name in runs[:-keep]:
+            if name != self.run_id:
+                shutil.rmtree(os.path.join(self.base_dir, name), ignore_errors=True)
+
+class DagRunner:
+    """
+    Roda as etapas respeitando as dependências, até max_workers ao mesmo tempo.
+    Se uma etapa falha, nenhuma etapa nova começa; as que já estão rodando
+    terminam (e gravam checkpoint) e o primeiro erro é relançado.
+    """
+
+    def __init__(self, stages, store: CheckpointStore, max_workers: int = 4):
+        self.stages = {stage.name: stage for stage in stages}
+        self.store = store
+        self.max_workers = max_workers
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Etapa {stage.name} depende de etapas inexistentes: {missing}")
+
+    def _plan(self, resume: bool, only):
+        """Etapas a executar e etapas lidas do checkpoint."""
+        if only:
+            unknown = [name for name in only if name not in self.stages]
+            if unknown:
+                raise ValueError(f"Etapas desconhecidas: {unknown} (disponíveis: {list(self.stages)})")
+            to_run = set(only)
+        elif resume:
+            to_run = {name for name in self.stages if not self.store.has(name)}
+        else:
+            to_run = set(self.stages)
+
+        # dependências de quem roda (transitivas) vêm do checkpoint se não forem rodar
+        restored, pending = set(), [dep for name in to_run for dep in self.stages[name].deps]
+        while pending:
+            name = pending.pop()
+            if name in to_run or name in restored:
+                continue
+            if not self.store.has(name):
+                raise FileNotFoundError(f"Sem checkpoint da etapa {name} no run {self.store.run_id}; "
+                                        f"rode-a antes (ou sem --only)")
+            restored.add(name)
+        return to_run, restored
+
+    def run(self, resume: bool = False, only=None) -> dict:
+        """Executa o DAG e devolve {etapa: saída} das etapas executadas ou restauradas."""
+        to_run, restored = self._plan(resume, only)
+        outputs = {}
+        for name in sorted(restored):
+            outputs[name] = self.store.load(name)
+            print(f"♻️ {name}: saída lida do checkpoint ({self.store.run_id})")
+        for name in to_run:
+            self.store.discard(name)
+
+        remaining = {name: set(self.stages[name].deps) & to_run for name in to_run}
+        running, error = {}, None
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while remaining or running:
+                if error is None:
+                    for name in [n for n, deps in remaining.items() if not deps]:
+                        stage = self.stages[name]
+                        kwargs = {dep: outputs[dep] for dep in stage.deps}
+                        running[pool.submit(stage.fn, **kwargs)] = name
+                        del remaining[name]
+                elif not running:
+                    break
+                if not running:
+                    raise RuntimeError(f"Dependência circular entre as etapas: {sorted(remaining)}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        outputs[name] = future.result()
+                    except BaseException as e:
+                        print(f"❌ {name} falhou: {e.__class__.__name__}: {e}")
+                        error = error or e
+                        continue
+                    self.store.save(name, outputs[name])
+                    for deps in remaining.values():
+                        deps.discard(name)
+        if error is not None:
+            skipped = sorted(remaining)
+            if skipped:
+                print(f"⏭️ Não executadas: {', '.join(skipped)} (retome com --resume {self.store.run_id})")
+            raise error
+        return outputs
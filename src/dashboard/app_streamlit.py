@@ -5,111 +5,146 @@
 # permitindo análises comparativas com filtros interativos.
 # ==============================================
 
+import inspect
 import os
+import sys
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from sqlalchemy import create_engine
+from sqlalchemy.exc import ProgrammingError
 from dotenv import load_dotenv
 from rapidfuzz import process
 
+import queries
+import parquet_queries
+from dataset_cache import DatasetCache
+
+# clients.py fica em src/ (o streamlit só põe src/dashboard no sys.path)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from clients import get_engine
+
 # ================================
 # Configuração
 # ================================
 load_dotenv()
 
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "spotify_youtube")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+# De onde o dashboard lê: "postgres" (SQL no banco) ou "parquet" (snapshots do último run do ETL)
+DASHBOARD_SOURCE = os.getenv("DASHBOARD_SOURCE", "postgres")
 
-# Conexão com o PostgreSQL
-engine = create_engine(
-    f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
-
-# ================================
-# Funções auxiliares
-# ================================
-@st.cache_data
-def load_spotify():
-    """Carrega dados do Spotify do banco"""
-    return pd.read_sql("SELECT * FROM spotify_tracks", engine)
+@st.cache_resource
+def dataset_cache():
+    """Um DatasetCache por processo: todas as sessões compartilham as tabelas Arrow do último run."""
+    return DatasetCache()
 
-@st.cache_data
-def load_youtube():
-    """Carrega dados do YouTube do banco"""
-    return pd.read_sql("SELECT * FROM youtube_videos", engine)
+if DASHBOARD_SOURCE == "parquet":
+    backend = parquet_queries
+    # tabelas do último run em memória; run novo do ETL entra em até DASHBOARD_REFRESH_S segundos
+    source = dataset_cache().current()
+else:
+    # Conexão com o PostgreSQL (engine único do processo, criado no primeiro uso)
+    backend = queries
+    source = get_engine()
 
 # ================================
-# Carregar dados
+# Funções auxiliares
 # ================================
-spotify_df = load_spotify()
-youtube_df = load_youtube()
+def _version():
+    """Parte da chave do cache: versões dos snapshots Parquet (no PostgreSQL vale o ttl)."""
+    if DASHBOARD_SOURCE == "parquet":
+        return source.versions if source is not None else None
+    return None
+
+@st.cache_data(ttl=600)
+def load_filter_options(version=None):
+    """Valores dos filtros (DISTINCT/MIN/MAX calculados no banco ou nos snapshots)"""
+    return backend.filter_options(source)
+
+@st.cache_data(ttl=600)
+def run_query(name, filters, version=None, **kwargs):
+    """Executa uma consulta da camada queries.py; o cache é por filtro selecionado"""
+    query = getattr(backend, name)
+    try:
+        return query(source, filters, **kwargs)
+    except (ProgrammingError, FileNotFoundError):
+        # tabela ainda não criada pelo ETL (ex.: correlations): resultado vazio com o formato da consulta
+        if name == "youtube_kpis":
+            return pd.Series({"n_rows": 0, "videos": 0, "channels": 0, "views": 0, "comments": 0})
+        if name in ("spotify_rows", "youtube_rows"):
+            columns = kwargs.get("columns", inspect.signature(query).parameters["columns"].default)
+            return pd.DataFrame(columns=list(columns))
+        return pd.DataFrame()
 
 # ================================
 # Layout inicial
 # ================================
 st.set_page_config(page_title="Dashboard Spotify & YouTube",
                    layout="wide", initial_sidebar_state="expanded")
+
+# ================================
+# Carregar opções dos filtros
+# ================================
+try:
+    options = load_filter_options(_version())
+except (ProgrammingError, FileNotFoundError):
+    # sem spotify_tracks/youtube_videos (ETL ainda não rodou) não há como montar os filtros
+    st.info("⚠️ Nenhum dado carregado ainda: rode o ETL (python src/etl_runner.py) e recarregue a página.")
+    st.stop()
+
 st.sidebar.header("🎚️ Filtros")
 
 # ================================
 # Filtros globais
 # ================================
 # Região
-regions = sorted(list(set(spotify_df['region'].unique()) |
-                      set(youtube_df['region'].unique())))
+regions = options['regions']
 region_sel = st.sidebar.multiselect("🌍 Regiões", regions, default=regions)
 
 # Ano (Spotify)
-years = sorted(spotify_df['release_year'].dropna().unique())
-if years:
+if options['years']:
+    year_min, year_max = options['years']
     year_sel = st.sidebar.slider("📅 Intervalo de Anos",
-                                 int(min(years)), int(max(years)),
-                                 (int(min(years)), int(max(years))))
+                                 year_min, year_max, (year_min, year_max))
 else:
     year_sel = (2000, 2025)
 
 # Spotify - artistas
-artists = sorted(spotify_df['artist_name'].dropna().unique())
+artists = options['artists']
 artist_sel = st.sidebar.multiselect("👤 Artistas (Spotify)", artists, default=artists)
 
 # Spotify - popularidade
-pop_min, pop_max = int(spotify_df['popularity'].min()), int(spotify_df['popularity'].max())
+pop_min, pop_max = options['popularity']
 popularity_sel = st.sidebar.slider("🔥 Popularidade (Spotify)",
                                    pop_min, pop_max, (pop_min, pop_max))
 
 # YouTube - categorias
-categories = sorted(youtube_df['category'].dropna().unique())
+categories = options['categories']
 category_sel = st.sidebar.multiselect("🎬 Categorias (YouTube)", categories, default=categories)
 
 # YouTube - canais
-channels = sorted(youtube_df['channel_title'].dropna().unique())
+channels = options['channels']
 channel_sel = st.sidebar.multiselect("📺 Canais (YouTube)", channels, default=channels)
 
 # YouTube - engajamento
-views_min, views_max = int(youtube_df['view_count'].min()), int(youtube_df['view_count'].max())
+views_min, views_max = options['views']
 views_sel = st.sidebar.slider("👀 Views (YouTube)",
                               views_min, views_max, (views_min, views_max))
 
+# Correlação - por padrão lê a tabela do ETL; rematch ao vivo é opcional (lento)
+live_match = st.sidebar.checkbox("🔄 Recalcular correlação ao vivo", value=False)
+
 # ================================
-# Aplicar filtros
+# Aplicar filtros (viram WHERE no SQL)
 # ================================
-spotify_df = spotify_df[
-    (spotify_df['region'].isin(region_sel)) &
-    (spotify_df['release_year'].between(year_sel[0], year_sel[1])) &
-    (spotify_df['artist_name'].isin(artist_sel)) &
-    (spotify_df['popularity'].between(popularity_sel[0], popularity_sel[1]))
-]
-
-youtube_df = youtube_df[
-    (youtube_df['region'].isin(region_sel)) &
-    (youtube_df['category'].isin(category_sel)) &
-    (youtube_df['channel_title'].isin(channel_sel)) &
-    (youtube_df['view_count'].between(views_sel[0], views_sel[1]))
-]
+# intervalos inteiros e "tudo selecionado" viram None: sem cláusula e com os rollups do ETL
+filters = queries.Filters(
+    regions=queries.selection(region_sel, regions),
+    years=queries.bounds(year_sel, options['years']),
+    artists=queries.selection(artist_sel, artists),
+    popularity=queries.bounds(popularity_sel, options['popularity']),
+    categories=queries.selection(category_sel, categories),
+    channels=queries.selection(channel_sel, channels),
+    views=queries.bounds(views_sel, options['views']),
+)
 
 # ================================
 # Layout principal
@@ -122,11 +157,16 @@ st.markdown("Exploração interativa dos dados de músicas e vídeos com base no
 # ================================
 st.header("🎵 Spotify - Faixas e Popularidade")
 
+# histogramas já agrupados em bins (rollup do ETL quando os filtros permitem)
+pop_counts = run_query("spotify_histogram", filters, _version(), column="popularity")
+duration_counts = run_query("spotify_histogram", filters, _version(), column="duration_s")
+
 col1, col2 = st.columns(2)
 with col1:
-    if not spotify_df.empty:
+    if not pop_counts.empty:
         fig = px.histogram(
-            spotify_df, x="popularity", nbins=20,
+            pop_counts, x="value", y="n", histfunc="sum", nbins=20,
+            labels={"value": "popularity", "n": "count"},
             title="Distribuição da Popularidade",
             color_discrete_sequence=["green"]  # Spotify = verde
         )
@@ -135,9 +175,10 @@ with col1:
         st.info("⚠️ Nenhum dado após aplicar os filtros.")
 
 with col2:
-    if not spotify_df.empty:
+    if not duration_counts.empty:
         fig = px.histogram(
-            spotify_df, x="duration_s", nbins=20,
+            duration_counts, x="value", y="n", histfunc="sum", nbins=20,
+            labels={"value": "duration_s", "n": "count"},
             title="Distribuição da Duração (s)",
             color_discrete_sequence=["green"]
         )
@@ -150,12 +191,13 @@ with col2:
 # ================================
 st.header("📺 YouTube - Visão Geral")
 
-if not youtube_df.empty:
+kpis = run_query("youtube_kpis", filters, _version())
+if kpis['n_rows'] > 0:
     col1, col2, col3, col4 = st.columns(4)
-    col1.metric("Vídeos", youtube_df['video_id'].nunique())
-    col2.metric("Canais únicos", youtube_df['channel_id'].nunique())
-    col3.metric("Views total", f"{youtube_df['view_count'].sum():,}")
-    col4.metric("Comentários total", f"{youtube_df['comment_count'].sum():,}")
+    col1.metric("Vídeos", int(kpis['videos']))
+    col2.metric("Canais únicos", int(kpis['channels']))
+    col3.metric("Views total", f"{int(kpis['views']):,}")
+    col4.metric("Comentários total", f"{int(kpis['comments']):,}")
 else:
     st.info("⚠️ Nenhum dado de YouTube após aplicar os filtros.")
 
@@ -164,10 +206,8 @@ else:
 # ================================
 st.subheader("🎬 Top Categorias por Views")
 
-if not youtube_df.empty:
-    cat_df = youtube_df.groupby("category", as_index=False)['view_count'].sum()
-    cat_df = cat_df.sort_values(by="view_count", ascending=False).head(10)
-
+cat_df = run_query("youtube_top_categories", filters, _version(), limit=10)
+if not cat_df.empty:
     fig = px.bar(
         cat_df, x="category", y="view_count",
         title="Top Categorias (Views)", text_auto=True,
@@ -184,7 +224,7 @@ st.header("🌍 Análise por Região")
 
 col1, col2 = st.columns(2)
 with col1:
-    region_sp = spotify_df.groupby("region", as_index=False)['popularity'].mean()
+    region_sp = run_query("spotify_popularity_by_region", filters, _version())
     if not region_sp.empty:
         fig = px.bar(
             region_sp, x="region", y="popularity",
@@ -196,7 +236,7 @@ with col1:
         st.info("⚠️ Nenhum dado Spotify após aplicar os filtros.")
 
 with col2:
-    region_yt = youtube_df.groupby("region", as_index=False)['view_count'].sum()
+    region_yt = run_query("youtube_views_by_region", filters, _version())
     if not region_yt.empty:
         fig = px.bar(
             region_yt, x="region", y="view_count",
@@ -212,23 +252,29 @@ with col2:
 # ================================
 st.header("🔗 Correlação Spotify x YouTube")
 
-corr_data = []
-yt_titles = youtube_df['title'].dropna().unique().tolist()
-
-for _, row in spotify_df.iterrows():
-    match = process.extractOne(row['track_name'], yt_titles, score_cutoff=80)
-    if match:
-        yt_row = youtube_df[youtube_df['title'] == match[0]].iloc[0]
-        corr_data.append({
-            "track_name": row['track_name'],
-            "artist_name": row['artist_name'],
-            "popularity": row['popularity'],
-            "video_title": yt_row['title'],
-            "view_count": yt_row['view_count'],
-            "score": match[1]
-        })
-
-corr_df = pd.DataFrame(corr_data)
+if live_match:
+    corr_data = []
+    spotify_df = run_query("spotify_rows", filters, _version())
+    youtube_df = run_query("youtube_rows", filters, _version())
+    yt_by_title = youtube_df.dropna(subset=['title']).drop_duplicates('title').set_index('title')
+    yt_titles = yt_by_title.index.tolist()
+
+    for _, row in spotify_df.iterrows():
+        match = process.extractOne(row['track_name'], yt_titles, score_cutoff=80)
+        if match:
+            yt_row = yt_by_title.loc[match[0]]
+            corr_data.append({
+                "track_name": row['track_name'],
+                "artist_name": row['artist_name'],
+                "popularity": row['popularity'],
+                "video_title": match[0],
+                "view_count": yt_row['view_count'],
+                "score": match[1]
+            })
+    corr_df = pd.DataFrame(corr_data)
+else:
+    corr_df = run_query("correlations", filters, _version())
+
 if not corr_df.empty:
     fig = px.scatter(
         corr_df, x="popularity", y="view_count",
@@ -0,0 +1,94 @@
+# ==============================================
+# Cache de datasets Arrow do dashboard, único por processo
+# ==============================================
+# No modo parquet, as tabelas do último run do ETL ficam em memória uma vez
+# só, como pa.Table imutáveis: todas as sessões do streamlit leem os mesmos
+# buffers (filtros com pyarrow.compute; só o resultado filtrado vira pandas).
+# A cada DASHBOARD_REFRESH_S segundos a próxima leitura confere se alguma
+# tabela ganhou snapshot novo no parquet_store (o ETL grava uma tabela por
+# vez, então um run pode chegar em partes); se ganhou, as tabelas são lidas
+# por inteiro e só então trocadas de uma vez. Quem está no meio de uma consulta termina
+# com o run antigo, que sai da memória quando ninguém mais o referencia.
+# ==============================================
+
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import parquet_store
+from dtypes import apply_dtypes
+
+# Intervalo mínimo entre verificações de run novo (segundos)
+DASHBOARD_REFRESH_S = float(os.getenv("DASHBOARD_REFRESH_S", "5"))
+
+class RunDatasets:
+    """
+    Tabelas de um run (pa.Table imutáveis); uma tabela sem snapshot fica None.
+    versions: run de cada snapshot lido, na ordem de STORE_TABLES.
+    """
+
+    def __init__(self, run_id: str, tables: dict, versions: tuple = ()):
+        self.run_id = run_id
+        self.tables = tables
+        self.versions = versions
+
+    @property
+    def nbytes(self) -> int:
+        return sum(table.nbytes for table in self.tables.values() if table is not None)
+
+    def read_frame(self, table_name: str, columns=None, filters=None) -> pd.DataFrame:
+        """Mesmo contrato de parquet_store.read_frame, mas filtrando a tabela em memória."""
+        table = self.tables.get(table_name)
+        if table is None:
+            raise FileNotFoundError(f"Nenhum snapshot Parquet de {table_name} no run {self.run_id}")
+        if filters:
+            table = table.filter(pq.filters_to_expression(filters))
+        if columns:
+            table = table.select(list(columns))
+        return apply_dtypes(table.to_pandas(), table_name)
+
+def load_versions(versions: tuple, base_dir: str = None) -> RunDatasets:
+    """Lê exatamente os snapshots de versions (um por tabela de STORE_TABLES)."""
+    tables = {table_name: None if version is None else parquet_store.read_table(table_name, version, base_dir=base_dir)
+              for table_name, version in zip(parquet_store.STORE_TABLES, versions)}
+    return RunDatasets(max(v for v in versions if v is not None), tables, versions)
+
+def load_run(run_id: str, base_dir: str = None) -> RunDatasets:
+    return load_versions(parquet_store.table_versions(run_id, base_dir), base_dir)
+
+class DatasetCache:
+    """Guarda o RunDatasets do último run e troca por um novo quando o ETL grava outro snapshot."""
+
+    def __init__(self, base_dir: str = None, refresh_s: float = DASHBOARD_REFRESH_S):
+        self.base_dir = base_dir
+        self.refresh_s = refresh_s
+        self._current = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> RunDatasets:
+        """Datasets do run mais recente (None se ainda não há snapshot nenhum)."""
+        if time.monotonic() - self._checked_at < self.refresh_s:
+            return self._current
+        # uma sessão só recarrega; as outras seguem com o run atual enquanto isso
+        if not self._lock.acquire(blocking=self._current is None):
+            return self._current
+        try:
+            self._checked_at = time.monotonic()
+            # chave = versão de cada tabela, não só o run mais recente: a tabela
+            # que chega depois das outras no mesmo run também provoca a troca
+            versions = parquet_store.table_versions(base_dir=self.base_dir)
+            if any(versions) and (self._current is None or self._current.versions != versions):
+                start = time.perf_counter()
+                datasets = load_versions(versions, self.base_dir)
+                self._current = datasets
+                print(f"🧊 Dashboard: run {datasets.run_id} em memória ({datasets.nbytes / 2**20:.1f} MB, "
+                      f"{time.perf_counter() - start:.2f}s)")
+            return self._current
+        finally:
+            self._lock.release()
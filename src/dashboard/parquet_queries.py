@@ -0,0 +1,156 @@
+# ==============================================
+# Consultas do dashboard sobre os snapshots Parquet
+# ==============================================
+# Mesmas funções (e mesmos resultados) de queries.py, mas lendo os arquivos
+# do parquet_store em vez do PostgreSQL: os filtros da sidebar viram filtros
+# do pyarrow (descartam row groups) e só as colunas usadas são lidas.
+# O primeiro argumento é o run_id dos snapshots (None = o mais recente) ou
+# um RunDatasets do dataset_cache (tabelas já em memória, compartilhadas).
+# Região, categoria, canal e artista chegam como category (dtypes.py).
+# ==============================================
+
+import os
+import sys
+
+import pandas as pd
+
+_DASHBOARD_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(_DASHBOARD_DIR))
+sys.path.insert(0, _DASHBOARD_DIR)
+import parquet_store
+from load import HISTOGRAM_BINS
+from queries import Filters
+
+def _in(column, values):
+    return None if values is None else (column, "in", list(values))
+
+def _between(column, bounds):
+    return [] if bounds is None else [(column, ">=", bounds[0]), (column, "<=", bounds[1])]
+
+def _conditions(*parts):
+    conditions = []
+    for part in parts:
+        if isinstance(part, list):
+            conditions.extend(part)
+        elif part is not None:
+            conditions.append(part)
+    return conditions
+
+def spotify_filters(f: Filters):
+    return _conditions(
+        _in("region", f.regions),
+        _between("release_year", f.years),
+        _in("artist_name", f.artists),
+        _between("popularity", f.popularity),
+    )
+
+def youtube_filters(f: Filters):
+    return _conditions(
+        _in("region", f.regions),
+        _in("category", f.categories),
+        _in("channel_title", f.channels),
+        _between("view_count", f.views),
+    )
+
+def _grouped(df, key: str) -> pd.DataFrame:
+    """Resultado de um groupby com a chave de volta ao dtype dos valores (como vem do SQL)."""
+    if isinstance(df[key].dtype, pd.CategoricalDtype):
+        df[key] = df[key].astype(df[key].cat.categories.dtype)
+    return df
+
+def _read(source, table_name: str, columns, filters=None) -> pd.DataFrame:
+    # RunDatasets (dataset_cache) ou run_id
+    if hasattr(source, "read_frame"):
+        return source.read_frame(table_name, columns, filters)
+    return parquet_store.read_frame(table_name, source, columns, filters)
+
+def _spotify(run_id, f: Filters, columns):
+    return _read(run_id, "spotify_tracks", columns, spotify_filters(f))
+
+def _youtube(run_id, f: Filters, columns):
+    return _read(run_id, "youtube_videos", columns, youtube_filters(f))
+
+# ================================
+# Opções da sidebar
+# ================================
+def filter_options(run_id=None) -> dict:
+    sp = _read(run_id, "spotify_tracks", ["region", "release_year", "artist_name", "popularity"])
+    yt = _read(run_id, "youtube_videos", ["region", "category", "channel_title", "view_count"])
+    years = sp["release_year"].dropna()
+    return {
+        "regions": sorted(set(sp["region"].dropna()) | set(yt["region"].dropna())),
+        "years": None if years.empty else (int(years.min()), int(years.max())),
+        "artists": sorted(sp["artist_name"].dropna().unique().tolist()),
+        "popularity": (int(sp["popularity"].min()), int(sp["popularity"].max())),
+        "categories": sorted(yt["category"].dropna().unique().tolist()),
+        "channels": sorted(yt["channel_title"].dropna().unique().tolist()),
+        "views": (int(yt["view_count"].min()), int(yt["view_count"].max())),
+    }
+
+# ================================
+# Spotify
+# ================================
+def spotify_value_counts(run_id, f: Filters, column: str) -> pd.DataFrame:
+    if column not in ("popularity", "duration_s"):
+        raise ValueError(f"Coluna sem histograma: {column}")
+    values = _spotify(run_id, f, [column])[column]
+    counts = values.value_counts(dropna=False).sort_index()
+    return pd.DataFrame({"value": counts.index, "n": counts.to_numpy()})
+
+def spotify_histogram(run_id, f: Filters, column: str) -> pd.DataFrame:
+    """Mesmos bins do rollup do PostgreSQL (HISTOGRAM_BINS), calculados das linhas."""
+    if column not in HISTOGRAM_BINS:
+        raise ValueError(f"Coluna sem histograma: {column}")
+    width = HISTOGRAM_BINS[column]
+    values = _spotify(run_id, f, [column])[column]
+    counts = (values // width * width).value_counts(dropna=False).sort_index()
+    return pd.DataFrame({"value": counts.index, "n": counts.to_numpy()})
+
+def spotify_popularity_by_region(run_id, f: Filters) -> pd.DataFrame:
+    df = _spotify(run_id, f, ["region", "popularity"])
+    means = df.groupby("region", as_index=False, observed=True)["popularity"].mean()
+    return _grouped(means, "region").sort_values("region", ignore_index=True)
+
+def spotify_rows(run_id, f: Filters, columns=("track_name", "artist_name", "popularity")) -> pd.DataFrame:
+    return _spotify(run_id, f, columns)
+
+# ================================
+# YouTube
+# ================================
+def youtube_kpis(run_id, f: Filters) -> pd.Series:
+    df = _youtube(run_id, f, ["video_id", "channel_id", "view_count", "comment_count"])
+    return pd.Series({
+        "n_rows": len(df),
+        "videos": df["video_id"].nunique(),
+        "channels": df["channel_id"].nunique(),
+        "views": int(df["view_count"].sum()),
+        "comments": int(df["comment_count"].sum()),
+    })
+
+def youtube_top_categories(run_id, f: Filters, limit: int = 10) -> pd.DataFrame:
+    df = _youtube(run_id, f, ["category", "view_count"])
+    totals = _grouped(df.groupby("category", as_index=False, observed=True)["view_count"].sum(), "category")
+    return totals.sort_values("view_count", ascending=False, ignore_index=True).head(limit)
+
+def youtube_views_by_region(run_id, f: Filters) -> pd.DataFrame:
+    df = _youtube(run_id, f, ["region", "view_count"])
+    totals = df.groupby("region", as_index=False, observed=True)["view_count"].sum()
+    return _grouped(totals, "region").sort_values("region", ignore_index=True)
+
+def youtube_rows(run_id, f: Filters, columns=("title", "view_count")) -> pd.DataFrame:
+    return _youtube(run_id, f, columns)
+
+# ================================
+# Correlações
+# ================================
+def correlations(run_id, f: Filters) -> pd.DataFrame:
+    corr = _read(run_id, "correlations", [
+        "track_id", "track_name", "artist_name", "video_id", "video_title",
+        "similarity_score", "region_spotify", "region_youtube"])
+    sp = _spotify(run_id, f, ["track_id", "region", "popularity"])
+    yt = _youtube(run_id, f, ["video_id", "region", "view_count"])
+    df = (corr
+          .merge(sp, left_on=["track_id", "region_spotify"], right_on=["track_id", "region"])
+          .merge(yt, left_on=["video_id", "region_youtube"], right_on=["video_id", "region"]))
+    return df.rename(columns={"similarity_score": "score"})[
+        ["track_name", "artist_name", "video_title", "score", "popularity", "view_count"]]
@@ -0,0 +1,269 @@
+# ==============================================
+# Camada de consultas do dashboard
+# ==============================================
+# Converte as seleções da sidebar em SQL parametrizado (WHERE + GROUP BY),
+# para que cada gráfico busque do PostgreSQL só o que precisa.
+# Gráficos e KPIs leem dos rollups mantidos pelo ETL (load.refresh_rollups)
+# quando os filtros só usam dimensões do rollup (região, ano, categoria,
+# canal); com filtro de artista, popularidade ou views, das tabelas brutas.
+# ==============================================
+
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import DBAPIError
+
+# dtypes.py e load.py ficam em src/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dtypes import apply_dtypes
+from load import HISTOGRAM_BINS
+
+@dataclass(frozen=True)
+class Filters:
+    """Seleções da sidebar. None em uma lista significa "todos" (sem cláusula)."""
+    regions: Optional[Tuple[str, ...]] = None
+    years: Optional[Tuple[int, int]] = None
+    artists: Optional[Tuple[str, ...]] = None
+    popularity: Optional[Tuple[int, int]] = None
+    categories: Optional[Tuple[str, ...]] = None
+    channels: Optional[Tuple[str, ...]] = None
+    views: Optional[Tuple[int, int]] = None
+
+def selection(selected, options):
+    """Normaliza um multiselect: tudo selecionado vira None, para não gerar IN gigante."""
+    selected = tuple(selected)
+    return None if set(selected) >= set(options) else selected
+
+def bounds(selected, full):
+    """Normaliza um slider: o intervalo inteiro vira None (sem cláusula, permite usar os rollups)."""
+    selected = tuple(selected)
+    return None if full is None or (selected[0] <= full[0] and selected[1] >= full[1]) else selected
+
+def _where(conditions):
+    """Monta o WHERE e os parâmetros a partir de (sql, params, expanding) ignorando os vazios."""
+    clauses, params, expanding = [], {}, []
+    for sql, values, exp in conditions:
+        if values is None:
+            continue
+        clauses.append(sql)
+        params.update(values)
+        expanding.extend(exp)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params, expanding
+
+def _in(column, name, values):
+    return (f"{column} IN :{name}", None if values is None else {name: list(values)}, [name])
+
+def _between(column, name, bounds):
+    if bounds is None:
+        return (None, None, [])
+    return (f"{column} BETWEEN :{name}_min AND :{name}_max",
+            {f"{name}_min": bounds[0], f"{name}_max": bounds[1]}, [])
+
+def spotify_where(f: Filters, alias: str = ""):
+    p = f"{alias}." if alias else ""
+    return _where([
+        _in(f"{p}region", "sp_regions", f.regions),
+        _between(f"{p}release_year", "sp_year", f.years),
+        _in(f"{p}artist_name", "sp_artists", f.artists),
+        _between(f"{p}popularity", "sp_pop", f.popularity),
+    ])
+
+def youtube_where(f: Filters, alias: str = ""):
+    p = f"{alias}." if alias else ""
+    return _where([
+        _in(f"{p}region", "yt_regions", f.regions),
+        _in(f"{p}category", "yt_categories", f.categories),
+        _in(f"{p}channel_title", "yt_channels", f.channels),
+        _between(f"{p}view_count", "yt_views", f.views),
+    ])
+
+def _and(where: str, clause: str) -> str:
+    return f"{where} AND {clause}" if where else f"WHERE {clause}"
+
+def _read(engine, sql, params=None, expanding=()):
+    stmt = text(sql)
+    if expanding:
+        stmt = stmt.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    with engine.connect() as conn:
+        return pd.read_sql(stmt, conn, params=params or {})
+
+def spotify_rollup_ok(f: Filters) -> bool:
+    """Os rollups do Spotify têm região e ano; artista e popularidade exigem as linhas."""
+    return f.artists is None and f.popularity is None
+
+def youtube_rollup_ok(f: Filters) -> bool:
+    """Os rollups do YouTube têm região, categoria e canal; faixa de views exige as linhas."""
+    return f.views is None
+
+def _read_rollup(engine, sql, params=None, expanding=()):
+    """Lê um rollup; None se ele ainda não existe (banco carregado antes dos rollups)."""
+    try:
+        return _read(engine, sql, params, expanding)
+    except (DBAPIError, pd.errors.DatabaseError):  # o pandas embrulha o erro do driver
+        return None
+
+# ================================
+# Opções da sidebar
+# ================================
+def filter_options(engine) -> dict:
+    """Valores possíveis de cada filtro, calculados no banco (DISTINCT / MIN / MAX)."""
+    regions = _read(engine, """
+        SELECT region FROM spotify_tracks UNION SELECT region FROM youtube_videos
+    """)["region"].dropna()
+    sp = _read(engine, """
+        SELECT MIN(release_year) AS year_min, MAX(release_year) AS year_max,
+               MIN(popularity) AS pop_min, MAX(popularity) AS pop_max
+        FROM spotify_tracks
+    """).iloc[0]
+    yt = _read(engine, """
+        SELECT MIN(view_count) AS views_min, MAX(view_count) AS views_max FROM youtube_videos
+    """).iloc[0]
+    artists = _read(engine, "SELECT DISTINCT artist_name FROM spotify_tracks WHERE artist_name IS NOT NULL")
+    categories = _read(engine, "SELECT DISTINCT category FROM youtube_videos WHERE category IS NOT NULL")
+    channels = _read(engine, "SELECT DISTINCT channel_title FROM youtube_videos WHERE channel_title IS NOT NULL")
+    return {
+        "regions": sorted(regions.tolist()),
+        "years": None if pd.isna(sp["year_min"]) else (int(sp["year_min"]), int(sp["year_max"])),
+        "artists": sorted(artists["artist_name"].tolist()),
+        "popularity": (int(sp["pop_min"]), int(sp["pop_max"])),
+        "categories": sorted(categories["category"].tolist()),
+        "channels": sorted(channels["channel_title"].tolist()),
+        "views": (int(yt["views_min"]), int(yt["views_max"])),
+    }
+
+# ================================
+# Spotify
+# ================================
+def spotify_value_counts(engine, f: Filters, column: str) -> pd.DataFrame:
+    """Contagem por valor (popularity / duration_s), base dos histogramas."""
+    if column not in ("popularity", "duration_s"):
+        raise ValueError(f"Coluna sem histograma: {column}")
+    where, params, exp = spotify_where(f)
+    return _read(engine, f"""
+        SELECT {column} AS value, COUNT(*) AS n
+        FROM spotify_tracks {where}
+        GROUP BY {column} ORDER BY {column}
+    """, params, exp)
+
+def spotify_histogram(engine, f: Filters, column: str) -> pd.DataFrame:
+    """Histograma em bins de HISTOGRAM_BINS (value = início do bin), do rollup quando possível."""
+    if column not in HISTOGRAM_BINS:
+        raise ValueError(f"Coluna sem histograma: {column}")
+    where, params, exp = spotify_where(f)
+    if spotify_rollup_ok(f):
+        df = _read_rollup(engine, f"""
+            SELECT bin AS value, SUM(n) AS n
+            FROM spotify_histogram_rollup {_and(where, "column_name = :column")}
+            GROUP BY bin ORDER BY bin
+        """, {**params, "column": column}, exp)
+        if df is not None:
+            return df
+    width = HISTOGRAM_BINS[column]
+    return _read(engine, f"""
+        SELECT ({column} / {width}) * {width} AS value, COUNT(*) AS n
+        FROM spotify_tracks {where}
+        GROUP BY ({column} / {width}) * {width} ORDER BY value
+    """, params, exp)
+
+def spotify_popularity_by_region(engine, f: Filters) -> pd.DataFrame:
+    where, params, exp = spotify_where(f)
+    if spotify_rollup_ok(f):
+        df = _read_rollup(engine, f"""
+            SELECT region, CAST(SUM(popularity_sum) AS DOUBLE PRECISION) / NULLIF(SUM(popularity_n), 0) AS popularity
+            FROM spotify_region_rollup {where}
+            GROUP BY region ORDER BY region
+        """, params, exp)
+        if df is not None:
+            return df
+    return _read(engine, f"""
+        SELECT region, AVG(popularity) AS popularity
+        FROM spotify_tracks {where}
+        GROUP BY region ORDER BY region
+    """, params, exp)
+
+def spotify_rows(engine, f: Filters, columns=("track_name", "artist_name", "popularity")) -> pd.DataFrame:
+    """Linhas filtradas, só com as colunas pedidas (usado no rematch ao vivo)."""
+    where, params, exp = spotify_where(f)
+    df = _read(engine, f"SELECT {', '.join(columns)} FROM spotify_tracks {where}", params, exp)
+    return apply_dtypes(df, "spotify_tracks")
+
+# ================================
+# YouTube
+# ================================
+def youtube_kpis(engine, f: Filters) -> pd.Series:
+    where, params, exp = youtube_where(f)
+    # vídeos distintos saem do rollup com todas as regiões ou com uma só
+    if youtube_rollup_ok(f) and (f.regions is None or len(f.regions) == 1):
+        videos = "first_region_videos" if f.regions is None else "videos"
+        df = _read_rollup(engine, f"""
+            SELECT COALESCE(SUM(videos), 0) AS n_rows,
+                   COALESCE(SUM({videos}), 0) AS videos,
+                   COUNT(DISTINCT channel_id) AS channels,
+                   COALESCE(SUM(view_count), 0) AS views,
+                   COALESCE(SUM(comment_count), 0) AS comments
+            FROM youtube_rollup {where}
+        """, params, exp)
+        if df is not None:
+            return df.iloc[0]
+    return _read(engine, f"""
+        SELECT COUNT(*) AS n_rows,
+               COUNT(DISTINCT video_id) AS videos,
+               COUNT(DISTINCT channel_id) AS channels,
+               COALESCE(SUM(view_count), 0) AS views,
+               COALESCE(SUM(comment_count), 0) AS comments
+        FROM youtube_videos {where}
+    """, params, exp).iloc[0]
+
+def youtube_top_categories(engine, f: Filters, limit: int = 10) -> pd.DataFrame:
+    where, params, exp = youtube_where(f)
+    sql = """
+        SELECT category, SUM(view_count) AS view_count
+        FROM {table} {where}
+        GROUP BY category ORDER BY view_count DESC LIMIT :limit
+    """
+    if youtube_rollup_ok(f):
+        df = _read_rollup(engine, sql.format(table="youtube_rollup", where=where), {**params, "limit": limit}, exp)
+        if df is not None:
+            return df
+    return _read(engine, sql.format(table="youtube_videos", where=where), {**params, "limit": limit}, exp)
+
+def youtube_views_by_region(engine, f: Filters) -> pd.DataFrame:
+    where, params, exp = youtube_where(f)
+    sql = """
+        SELECT region, SUM(view_count) AS view_count
+        FROM {table} {where}
+        GROUP BY region ORDER BY region
+    """
+    if youtube_rollup_ok(f):
+        df = _read_rollup(engine, sql.format(table="youtube_rollup", where=where), params, exp)
+        if df is not None:
+            return df
+    return _read(engine, sql.format(table="youtube_videos", where=where), params, exp)
+
+def youtube_rows(engine, f: Filters, columns=("title", "view_count")) -> pd.DataFrame:
+    where, params, exp = youtube_where(f)
+    df = _read(engine, f"SELECT {', '.join(columns)} FROM youtube_videos {where}", params, exp)
+    return apply_dtypes(df, "youtube_videos")
+
+# ================================
+# Correlações
+# ================================
+def correlations(engine, f: Filters) -> pd.DataFrame:
+    """Correlações do ETL já filtradas pelos dois lados (Spotify e YouTube)."""
+    sp_where, sp_params, sp_exp = spotify_where(f, alias="s")
+    yt_where, yt_params, yt_exp = youtube_where(f, alias="y")
+    conditions = [w.replace("WHERE ", "", 1) for w in (sp_where, yt_where) if w]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return _read(engine, f"""
+        SELECT c.track_name, c.artist_name, c.video_title,
+               c.similarity_score AS score, s.popularity, y.view_count
+        FROM correlations c
+        JOIN spotify_tracks s ON s.track_id = c.track_id AND s.region = c.region_spotify
+        JOIN youtube_videos y ON y.video_id = c.video_id AND y.region = c.region_youtube
+        {where}
+    """, {**sp_params, **yt_params}, sp_exp + yt_exp)
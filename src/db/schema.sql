@@ -1,33 +1,141 @@
+-- Uma linha por faixa e região (a mesma faixa aparece em várias playlists Top 50)
 CREATE TABLE IF NOT EXISTS spotify_tracks (
-  track_id TEXT PRIMARY KEY,
-  name TEXT,
-  artist TEXT,
-  artists JSONB,
-  album TEXT,
+  track_id TEXT NOT NULL,
+  track_name TEXT,
+  artist_name TEXT,
+  album_name TEXT,
+  release_year INTEGER,
+  duration_s INTEGER,
   popularity INTEGER,
-  duration_ms INTEGER,
-  release_date DATE,
-  fetched_at TIMESTAMP DEFAULT NOW()
+  genre TEXT,
+  region TEXT NOT NULL,
+  fetched_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (track_id, region)
 );
 
+-- Uma linha por vídeo e região (chart mostPopular de cada país)
 CREATE TABLE IF NOT EXISTS youtube_videos (
-  video_id TEXT PRIMARY KEY,
+  video_id TEXT NOT NULL,
   title TEXT,
+  channel_id TEXT,
   channel_title TEXT,
-  category_id TEXT,
+  category TEXT,
+  published_at TIMESTAMP,
   view_count BIGINT,
   like_count BIGINT,
   comment_count BIGINT,
-  published_at TIMESTAMP,
-  description TEXT,
-  fetched_at TIMESTAMP DEFAULT NOW()
+  region TEXT NOT NULL,
+  fetched_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (video_id, region)
 );
 
 CREATE TABLE IF NOT EXISTS correlations (
   id SERIAL PRIMARY KEY,
   track_id TEXT,
+  track_name TEXT,
+  artist_name TEXT,
   video_id TEXT,
-  similarity_score NUMERIC,
-  reason TEXT,
+  video_title TEXT,
+  similarity_score DOUBLE PRECISION,
+  region_spotify TEXT,
+  region_youtube TEXT,
   created_at TIMESTAMP DEFAULT NOW()
 );
+
+-- Histórico append-only das métricas, uma partição por mês de coleta
+CREATE TABLE IF NOT EXISTS spotify_track_snapshots (
+  fetch_date DATE NOT NULL,
+  track_id TEXT NOT NULL,
+  region TEXT NOT NULL,
+  popularity INTEGER,
+  fetched_at TIMESTAMP DEFAULT NOW()
+) PARTITION BY RANGE (fetch_date);
+
+CREATE TABLE IF NOT EXISTS youtube_video_snapshots (
+  fetch_date DATE NOT NULL,
+  video_id TEXT NOT NULL,
+  region TEXT NOT NULL,
+  view_count BIGINT,
+  like_count BIGINT,
+  comment_count BIGINT,
+  fetched_at TIMESTAMP DEFAULT NOW()
+) PARTITION BY RANGE (fetch_date);
+
+-- Métricas de cada run do ETL e de cada etapa (extração, correlação, carga)
+CREATE TABLE IF NOT EXISTS etl_runs (
+  run_id TEXT PRIMARY KEY,
+  mode TEXT,
+  started_at TIMESTAMP,
+  finished_at TIMESTAMP,
+  status TEXT,
+  wall_s DOUBLE PRECISION,
+  peak_rss_mb DOUBLE PRECISION
+);
+
+CREATE TABLE IF NOT EXISTS etl_stage_metrics (
+  run_id TEXT NOT NULL,
+  stage TEXT NOT NULL,
+  started_at TIMESTAMP,
+  wall_s DOUBLE PRECISION,
+  cpu_s DOUBLE PRECISION,
+  rows_in BIGINT,
+  rows_out BIGINT,
+  rows_per_s DOUBLE PRECISION,
+  api_calls INTEGER,
+  api_retries INTEGER,
+  api_throttled_s DOUBLE PRECISION,
+  quota_used INTEGER,
+  peak_rss_mb DOUBLE PRECISION,
+  status TEXT,
+  error TEXT,
+  PRIMARY KEY (run_id, stage)
+);
+
+-- Rollups do dashboard, refeitos pelo ETL a cada carga (load.ROLLUP_TABLES / refresh_rollups)
+CREATE TABLE IF NOT EXISTS spotify_region_rollup (
+  region TEXT NOT NULL,
+  release_year INTEGER,
+  tracks BIGINT NOT NULL,
+  popularity_sum BIGINT,
+  popularity_n BIGINT
+);
+
+-- Histogramas pré-agregados: bin = início da faixa (popularity de 5 em 5, duration_s de 15 em 15)
+CREATE TABLE IF NOT EXISTS spotify_histogram_rollup (
+  region TEXT NOT NULL,
+  release_year INTEGER,
+  column_name TEXT NOT NULL,
+  bin INTEGER,
+  n BIGINT NOT NULL
+);
+
+-- first_region_videos conta o vídeo só na menor região em que aparece:
+-- somado sobre todas as regiões dá o número de vídeos distintos
+CREATE TABLE IF NOT EXISTS youtube_rollup (
+  region TEXT NOT NULL,
+  category TEXT,
+  channel_id TEXT,
+  channel_title TEXT,
+  day DATE,
+  videos BIGINT NOT NULL,
+  first_region_videos BIGINT NOT NULL,
+  view_count BIGINT,
+  like_count BIGINT,
+  comment_count BIGINT
+);
+
+-- Índices usados pelos filtros e agregações do dashboard
+CREATE INDEX IF NOT EXISTS idx_spotify_tracks_region ON spotify_tracks (region);
+CREATE INDEX IF NOT EXISTS idx_spotify_tracks_release_year ON spotify_tracks (release_year);
+CREATE INDEX IF NOT EXISTS idx_spotify_tracks_popularity ON spotify_tracks (popularity);
+CREATE INDEX IF NOT EXISTS idx_youtube_videos_region ON youtube_videos (region);
+CREATE INDEX IF NOT EXISTS idx_youtube_videos_category ON youtube_videos (category);
+CREATE INDEX IF NOT EXISTS idx_youtube_videos_view_count ON youtube_videos (view_count);
+CREATE INDEX IF NOT EXISTS idx_correlations_track ON correlations (track_id, region_spotify);
+CREATE INDEX IF NOT EXISTS idx_correlations_video ON correlations (video_id, region_youtube);
+CREATE INDEX IF NOT EXISTS idx_spotify_track_snapshots_track ON spotify_track_snapshots (track_id, fetch_date);
+CREATE INDEX IF NOT EXISTS idx_youtube_video_snapshots_video ON youtube_video_snapshots (video_id, fetch_date);
+CREATE INDEX IF NOT EXISTS idx_etl_runs_started_at ON etl_runs (started_at);
+CREATE INDEX IF NOT EXISTS idx_spotify_region_rollup_region ON spotify_region_rollup (region, release_year);
+CREATE INDEX IF NOT EXISTS idx_spotify_histogram_rollup_column ON spotify_histogram_rollup (column_name, region);
+CREATE INDEX IF NOT EXISTS idx_youtube_rollup_region ON youtube_rollup (region, category);
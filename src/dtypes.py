@@ -0,0 +1,114 @@
+# ==============================================
+# Tipos compactos dos DataFrames do projeto
+# ==============================================
+# Um único schema de dtypes por tabela, aplicado pelos extratores, pelo
+# load e pelas consultas do dashboard:
+#   - colunas de baixa cardinalidade (região, categoria, canal, artista...)
+#     viram category (no Parquet, dictionary encoding);
+#   - inteiros usam o menor tipo que cabe (popularity em int8, ano em int16);
+#   - published_at vira datetime UTC em vez de string ISO 8601.
+# Texto livre (títulos, ids) continua no dtype de string padrão do pandas.
+#
+#   python src/dtypes.py   → bytes antes/depois para cada tabela dos CSVs
+# ==============================================
+
+import os
+
+import numpy as np
+import pandas as pd
+
+TABLE_DTYPES = {
+    "spotify_tracks": {
+        "artist_name": "category",
+        "album_name": "category",
+        "release_year": "int16",
+        "duration_s": "int16",
+        "popularity": "int8",
+        "genre": "category",
+        "region": "category",
+    },
+    "youtube_videos": {
+        "channel_id": "category",
+        "channel_title": "category",
+        "category": "category",
+        "published_at": "datetime",
+        "view_count": "int64",
+        "like_count": "int32",
+        "comment_count": "int32",
+        "region": "category",
+    },
+    "correlations": {
+        "artist_name": "category",
+        "similarity_score": "float32",
+        "region_spotify": "category",
+        "region_youtube": "category",
+    },
+}
+
+def category_columns(table_name: str) -> list:
+    """Colunas da tabela guardadas como category (lidas do Parquet como dicionário)."""
+    return [column for column, dtype in TABLE_DTYPES.get(table_name, {}).items() if dtype == "category"]
+
+def _narrow_int(values: pd.Series, dtype: str) -> pd.Series:
+    if values.dtype == dtype:
+        return values
+    numbers = pd.to_numeric(values, errors="coerce")
+    info = np.iinfo(dtype)
+    if numbers.notna().any() and (numbers.min() < info.min or numbers.max() > info.max):
+        dtype = "int64"  # não cabe no tipo estreito: melhor largo do que truncado
+    if numbers.isna().any():
+        return numbers.astype(dtype.capitalize())  # Int16, Int64...: inteiro com nulos
+    return numbers.astype(dtype)
+
+def apply_dtypes(df: pd.DataFrame, table_name: str) -> pd.DataFrame:
+    """
+    Converte as colunas presentes de df para os dtypes de TABLE_DTYPES[table_name].
+    Colunas fora do schema ficam como estão; tabelas sem schema voltam inalteradas.
+    """
+    schema = TABLE_DTYPES.get(table_name)
+    if not schema or df is None or df.empty:
+        return df
+    df = df.copy(deep=False)
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        if dtype == "category":
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype("category")
+            elif not df[column].cat.categories.is_monotonic_increasing:
+                # dicionário do Arrow vem na ordem de aparição; ordenar mantém sort/groupby alfabéticos
+                df[column] = df[column].cat.reorder_categories(df[column].cat.categories.sort_values())
+        elif dtype == "datetime":
+            if not isinstance(df[column].dtype, pd.DatetimeTZDtype):
+                df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+        elif dtype.startswith("int"):
+            df[column] = _narrow_int(df[column], dtype)
+        elif df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    return df
+
+def memory_report(frames: dict) -> pd.DataFrame:
+    """
+    Bytes (memory_usage deep) de cada tabela antes e depois de apply_dtypes.
+    frames: {nome da tabela: DataFrame como veio da fonte}.
+    """
+    rows = []
+    for table_name, df in frames.items():
+        before = int(df.memory_usage(deep=True).sum())
+        after = int(apply_dtypes(df, table_name).memory_usage(deep=True).sum())
+        rows.append({"table": table_name, "rows": len(df), "bytes_before": before,
+                     "bytes_after": after, "ratio": round(after / before, 3) if before else None})
+    report = pd.DataFrame(rows)
+    for row in rows:
+        print(f"🧮 {row['table']}: {row['bytes_before'] / 2**20:.2f} MB → {row['bytes_after'] / 2**20:.2f} MB "
+              f"({row['rows']} linhas, {row['ratio'] or 0:.0%} do original)")
+    return report
+
+if __name__ == "__main__":
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    frames = {}
+    for table_name in TABLE_DTYPES:
+        path = os.path.join(root, f"{table_name}.csv")
+        if os.path.exists(path) and os.path.getsize(path) > 1:
+            frames[table_name] = pd.read_csv(path)
+    memory_report(frames)
@@ -1,53 +1,403 @@
+import argparse
 import pandas as pd
-from sqlalchemy import create_engine
 from dotenv import load_dotenv
 import os
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 
-from extract_spotify import extract_spotify_tracks
-from extract_youtube import extract_youtube_videos
+from extract_spotify import (extract_spotify_tracks, iter_spotify_tracks, refresh_spotify_stats,
+                             replay_spotify_tracks, iter_replay_spotify_tracks, scheduler as spotify_scheduler)
+from extract_youtube import (extract_youtube_videos, iter_youtube_videos, refresh_youtube_stats,
+                             replay_youtube_videos, iter_replay_youtube_videos, scheduler as youtube_scheduler)
 from transform import correlate_music_video  # já implementa as similaridades
+from match_cache import DEFAULT_MAX_BATCHES, MatchCache
+from lsh_index import LSHIndex, DEFAULT_BANDS, DEFAULT_ROWS, DEFAULT_MAX_KEYS
+from fetch_state import FetchState
+from rate_limit import QuotaExceeded
+from metrics import RunMetrics
+from clients import get_engine
+from dag import CheckpointStore, DagRunner, Stage
+from parquet_store import PARQUET_STORE_DIR, write_snapshot
+from landing import LANDING_DIR, LANDING_KEEP_RUNS, Landing, prune_runs, resolve_run as resolve_landing_run
+from load import (copy_load, upsert_load, stream_load, update_stats, append_snapshot, append_snapshot_from_table,
+                  append_loads, refresh_rollups, SNAPSHOT_TABLES, ROLLUP_TABLES, STATS_COLUMNS, DEFAULT_BATCH_SIZE)
 
 load_dotenv()
 
-# Conexão com PostgreSQL
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "spotify_youtube")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+# Motor de correlação: "batched" (matriz vetorizada), "lsh" (candidatos MinHash/LSH)
+# ou "legacy" (loop par a par). O pg_trgm (src/trgm_match.py) roda à parte, fora do ETL,
+# até ser validado contra o postgres:15 do docker-compose
+CORRELATION_METHOD = os.getenv("CORRELATION_METHOD", "batched")
 
-engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
+# Cache das assinaturas LSH dos títulos já vistos (modo "lsh"): a busca é sempre sobre
+# os vídeos do run; acima de LSH_MAX_TITLES títulos os usados há mais tempo saem
+LSH_INDEX_PATH = os.getenv("LSH_INDEX_PATH", ".cache/lsh_index.npz")
+LSH_BANDS = int(os.getenv("LSH_BANDS", str(DEFAULT_BANDS)))
+LSH_ROWS = int(os.getenv("LSH_ROWS", str(DEFAULT_ROWS)))
+LSH_MAX_TITLES = int(os.getenv("LSH_MAX_TITLES", str(DEFAULT_MAX_KEYS)))
 
-def safe_to_sql(df: pd.DataFrame, table_name: str):
+# Paralelismo da extração: threads por fonte (1 = sequencial, como antes)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))
+
+# Cache de scores entre runs (vazio = desativado) e quantos runs ele lembra (0 = todos)
+MATCH_CACHE_PATH = os.getenv("MATCH_CACHE_PATH", ".cache/match_cache.json.gz")
+MATCH_CACHE_KEEP_RUNS = int(os.getenv("MATCH_CACHE_KEEP_RUNS", str(DEFAULT_MAX_BATCHES)))
+
+# snapshot_id/ETag do último run carregado (vazio = sempre baixa tudo)
+FETCH_STATE_PATH = os.getenv("FETCH_STATE_PATH", ".cache/fetch_state.json")
+
+# Carga de spotify_tracks/youtube_videos: "replace" (COPY + troca) ou "upsert" (ON CONFLICT na PK)
+LOAD_MODE = os.getenv("LOAD_MODE", "replace")
+
+# Histórico append-only de popularidade/views/likes/comentários (0 = desativado)
+SNAPSHOT_HISTORY = os.getenv("SNAPSHOT_HISTORY", "1") == "1"
+
+# Modo streaming: páginas das APIs vão direto para o COPY em lotes (1 = ativado)
+ETL_STREAMING = os.getenv("ETL_STREAMING", "0") == "1"
+
+# Métricas por etapa de cada run (JSON-lines; também gravadas em etl_runs/etl_stage_metrics)
+ETL_METRICS_PATH = os.getenv("ETL_METRICS_PATH", ".cache/etl_metrics.jsonl")
+
+# Nome de uma etapa para rodar sob cProfile (ex.: "transform"); vazio = desativado
+ETL_PROFILE_STAGE = os.getenv("ETL_PROFILE_STAGE", "")
+
+# Saída de cada etapa do DAG (para --resume / --only) e quantos runs manter em disco
+ETL_CHECKPOINT_DIR = os.getenv("ETL_CHECKPOINT_DIR", ".cache/checkpoints")
+ETL_CHECKPOINT_KEEP = int(os.getenv("ETL_CHECKPOINT_KEEP", "3"))
+
+def safe_to_sql(df: pd.DataFrame, table_name: str, mode: str = "replace"):
     if df.empty:
         print(f"⚠️ Nenhum dado para {table_name}, ignorando.")
         return
-    df.to_sql(table_name, engine, if_exists="replace", index=False)
+    if mode == "upsert":
+        upsert_load(df, table_name, get_engine())
+    else:
+        copy_load(df, table_name, get_engine())
+    if SNAPSHOT_HISTORY and table_name in SNAPSHOT_TABLES:
+        append_snapshot(df, table_name, get_engine())
     print(f"✅ Tabela {table_name} carregada com {len(df)} registros.")
 
-def run():
-    # ======================
-    # Spotify
-    # ======================
-    print("🎵 Extraindo Spotify...")
-    spotify_df = extract_spotify_tracks()
-    safe_to_sql(spotify_df, "spotify_tracks")
-
-    # ======================
-    # YouTube
-    # ======================
-    print("📺 Extraindo YouTube...")
-    youtube_df = extract_youtube_videos()
-    safe_to_sql(youtube_df, "youtube_videos")
-
-    # ======================
-    # Correlação
-    # ======================
-    print("🔗 Calculando correlações...")
-    corr_df = correlate_music_video(spotify_df, youtube_df, threshold=85)
-    safe_to_sql(corr_df, "correlations")
+def _measured_extract(metrics: RunMetrics, stage: str, scheduler, extract, **kwargs):
+    """
+    Extração de uma fonte dentro de um span. Com state, uma fonte sem mudanças
+    volta como None; cota do run esgotada também (não derruba o ETL).
+    """
+    with metrics.stage(stage, schedulers=[scheduler]) as span:
+        try:
+            df = extract(**kwargs)
+        except QuotaExceeded as e:
+            print(f"⚠️ {e}; mantendo os dados já carregados desta fonte.")
+            df = None
+        span.rows_out = 0 if df is None else len(df)
+    return df
+
+def save_metrics(metrics: RunMetrics):
+    """Grava as métricas do run no JSON-lines e nas tabelas etl_runs/etl_stage_metrics."""
+    metrics.summary()
+    if ETL_METRICS_PATH:
+        metrics.write_jsonl(ETL_METRICS_PATH)
+    runs, stages = metrics.to_frames()
+    frames = {"etl_runs": runs, "etl_stage_metrics": stages} if not stages.empty else {"etl_runs": runs}
+    try:
+        # cabeçalho do run e etapas na mesma transação
+        append_loads(frames, get_engine())
+    except Exception as e:
+        # sem banco as métricas continuam no JSON-lines; não mascara o erro do run
+        print(f"⚠️ Métricas do run não gravadas no banco: {e.__class__.__name__}: {e}")
+
+def instrumented(mode: str):
+    """Decorator: cria o RunMetrics do run, passa como metrics= e grava as métricas no fim (mesmo com erro)."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            metrics = RunMetrics(mode=mode, profile_stage=ETL_PROFILE_STAGE or None)
+            print(f"🆔 Run {metrics.run_id}")
+            try:
+                result = fn(*args, metrics=metrics, **kwargs)
+            except BaseException:
+                metrics.finish("error")
+                save_metrics(metrics)
+                raise
+            metrics.finish("ok")
+            save_metrics(metrics)
+            return result
+        return wrapper
+    return decorator
+
+def _measured_load(metrics: RunMetrics, df: pd.DataFrame, table_name: str, mode: str = "replace"):
+    with metrics.stage(f"load_{table_name}", rows_in=len(df)) as span:
+        safe_to_sql(df, table_name, mode=mode)
+        span.rows_out = len(df)
+
+def _refresh_rollups(metrics: RunMetrics, table_name: str):
+    """Rollups do dashboard derivados da tabela recém-carregada."""
+    if table_name not in ROLLUP_TABLES:
+        return
+    with metrics.stage(f"rollup_{table_name}"):
+        refresh_rollups(table_name, get_engine())
+
+def _write_parquet(metrics: RunMetrics, data, table_name: str):
+    """Snapshot Parquet da tabela para este run (data: DataFrame ou iterador de DataFrames)."""
+    if not PARQUET_STORE_DIR:
+        return
+    with metrics.stage(f"parquet_{table_name}") as span:
+        span.rows_out = write_snapshot(data, table_name, metrics.run_id)
+
+def _landing(metrics: RunMetrics):
+    """Landing zone das respostas brutas deste run (None se LANDING_DIR estiver vazio)."""
+    return Landing(metrics.run_id) if LANDING_DIR else None
+
+def _prune_landing(metrics: RunMetrics):
+    """Retenção da landing zone ao fim de um run que gravou respostas (replay não grava)."""
+    if LANDING_DIR:
+        prune_runs(LANDING_KEEP_RUNS, current=metrics.run_id)
+
+def _replay_run(metrics: RunMetrics, replay) -> str:
+    """run_id das respostas a reler (True = o último gravado); marca o run como replay."""
+    run_id = resolve_landing_run(None if replay is True else replay)
+    metrics.mode = f"{metrics.mode}_replay"
+    print(f"⏪ Replay das respostas gravadas no run {run_id} (sem chamar as APIs)")
+    return run_id
+
+def batch_stages(metrics: RunMetrics, state: FetchState = None, max_workers: int = EXTRACT_WORKERS,
+                 replay: str = None) -> list:
+    """
+    Etapas do ETL em lote como DAG: Spotify (extração → carga) e YouTube
+    (extração → carga) correm em paralelo; a correlação espera as duas cargas.
+    Uma extração None (fonte inalterada) pula a carga e a correlação lê a
+    tabela do banco. Com replay (run_id), a extração relê as respostas
+    gravadas daquele run na landing zone em vez de chamar as APIs.
+    """
+    def extract_spotify():
+        if replay:
+            return _measured_extract(metrics, "extract_spotify", spotify_scheduler,
+                                     replay_spotify_tracks, run_id=replay, max_workers=max_workers)
+        return _measured_extract(metrics, "extract_spotify", spotify_scheduler, extract_spotify_tracks,
+                                 max_workers=max_workers, state=state, landing=_landing(metrics))
+
+    def extract_youtube():
+        if replay:
+            return _measured_extract(metrics, "extract_youtube", youtube_scheduler,
+                                     replay_youtube_videos, run_id=replay, max_workers=max_workers)
+        return _measured_extract(metrics, "extract_youtube", youtube_scheduler, extract_youtube_videos,
+                                 max_workers=max_workers, state=state, landing=_landing(metrics))
+
+    def load_source(df, table_name, source):
+        if df is None:
+            print(f"⏭️ {table_name}: fonte inalterada, carga ignorada.")
+            return None
+        _measured_load(metrics, df, table_name, mode=LOAD_MODE)
+        _refresh_rollups(metrics, table_name)
+        _write_parquet(metrics, df, table_name)
+        if state is not None:
+            # tokens de uma extração restaurada do checkpoint não estão em state.pending:
+            # o próximo run só baixa de novo, nunca pula dado não carregado
+            state.commit(source)
+        return len(df)
 
+    def load_spotify_tracks(extract_spotify):
+        return load_source(extract_spotify, "spotify_tracks", "spotify")
+
+    def load_youtube_videos(extract_youtube):
+        return load_source(extract_youtube, "youtube_videos", "youtube")
+
+    def transform(extract_spotify, extract_youtube, load_spotify_tracks, load_youtube_videos):
+        if extract_spotify is None and extract_youtube is None:
+            print("⏭️ Nada mudou no Spotify nem no YouTube, correlação ignorada.")
+            return None
+        # fonte inalterada: reaproveita o que já está no banco para a correlação
+        spotify_df = extract_spotify if extract_spotify is not None else read_match_columns("spotify_tracks")
+        youtube_df = extract_youtube if extract_youtube is not None else read_match_columns("youtube_videos")
+        return correlate(spotify_df, youtube_df, metrics)
+
+    def load_correlations(transform):
+        if transform is None:
+            return None
+        load_correlation_table(transform, metrics)
+        return len(transform)
+
+    return [
+        Stage("extract_spotify", extract_spotify),
+        Stage("extract_youtube", extract_youtube),
+        Stage("load_spotify_tracks", load_spotify_tracks, ["extract_spotify"]),
+        Stage("load_youtube_videos", load_youtube_videos, ["extract_youtube"]),
+        Stage("transform", transform,
+              ["extract_spotify", "extract_youtube", "load_spotify_tracks", "load_youtube_videos"]),
+        Stage("load_correlations", load_correlations, ["transform"]),
+    ]
+
+BATCH_STAGE_NAMES = [stage.name for stage in batch_stages(None)]
+
+def _checkpoint_store(metrics: RunMetrics, resume) -> CheckpointStore:
+    """Checkpoints do run atual ou, com resume (True = o mais recente), de um run anterior."""
+    if not resume:
+        return CheckpointStore(ETL_CHECKPOINT_DIR, metrics.run_id)
+    run_id = CheckpointStore.latest_run(ETL_CHECKPOINT_DIR) if resume is True else resume
+    if run_id is None or not os.path.isdir(os.path.join(ETL_CHECKPOINT_DIR, run_id)):
+        raise FileNotFoundError(f"Nenhum checkpoint para retomar em {ETL_CHECKPOINT_DIR}"
+                                + (f" (run {resume})" if resume is not True else ""))
+    print(f"♻️ Retomando os checkpoints do run {run_id}")
+    return CheckpointStore(ETL_CHECKPOINT_DIR, run_id)
+
+@instrumented("batch")
+def run(resume=None, only=None, replay=None, metrics: RunMetrics = None):
+    """
+    ETL em lote. resume (run_id ou True = o último) reaproveita as etapas já
+    concluídas daquele run; only roda só as etapas pedidas, com as entradas
+    vindas dos checkpoints (do run em resume ou do último). replay (run_id ou
+    True = o último) extrai das respostas gravadas na landing zone, sem APIs
+    nem snapshot_id/ETag (o estado de fetch não é lido nem atualizado).
+    """
+    if replay:
+        replay = _replay_run(metrics, replay)
+    state = FetchState.load(FETCH_STATE_PATH) if FETCH_STATE_PATH and not replay else None
+    store = _checkpoint_store(metrics, resume or bool(only))
+    DagRunner(batch_stages(metrics, state, replay=replay), store).run(resume=bool(resume), only=only)
+    store.prune(ETL_CHECKPOINT_KEEP)
+    if not replay:
+        _prune_landing(metrics)
     print("🚀 ETL finalizado com sucesso!")
 
+@instrumented("streaming")
+def run_streaming(batch_size: int = DEFAULT_BATCH_SIZE, replay=None, metrics: RunMetrics = None):
+    """
+    ETL com memória limitada: as páginas das APIs vão direto para o COPY em
+    lotes de batch_size linhas e a correlação lê do banco só as colunas que usa.
+    As duas fontes são carregadas em paralelo, cada uma na sua conexão.
+    Com replay, as páginas vêm das respostas gravadas daquele run.
+    """
+    print("🌊 ETL em modo streaming...")
+    if replay:
+        replay = _replay_run(metrics, replay)
+        spotify_pages, youtube_pages = iter_replay_spotify_tracks(replay), iter_replay_youtube_videos(replay)
+    else:
+        landing = _landing(metrics)
+        spotify_pages, youtube_pages = iter_spotify_tracks(landing=landing), iter_youtube_videos(landing=landing)
+
+    def measured_stream(pages, table_name, scheduler):
+        # extração e carga intercaladas: um span só por fonte
+        with metrics.stage(f"stream_{table_name}", schedulers=[scheduler]) as span:
+            span.rows_out = stream_load(pages, table_name, LOAD_MODE, batch_size, get_engine())
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        loads = [
+            pool.submit(measured_stream, spotify_pages, "spotify_tracks", spotify_scheduler),
+            pool.submit(measured_stream, youtube_pages, "youtube_videos", youtube_scheduler),
+        ]
+        for future in loads:
+            future.result()
+
+    if SNAPSHOT_HISTORY:
+        with metrics.stage("snapshot_history"):
+            for table_name in SNAPSHOT_TABLES:
+                append_snapshot_from_table(table_name, get_engine())
+    for table_name in ("spotify_tracks", "youtube_videos"):
+        _refresh_rollups(metrics, table_name)
+
+    # Parquet a partir do banco, em lotes (a tabela inteira nunca fica em memória)
+    for table_name in ("spotify_tracks", "youtube_videos"):
+        _write_parquet(metrics, pd.read_sql(f"SELECT * FROM {table_name}", get_engine(), chunksize=batch_size),
+                       table_name)
+
+    correlate_and_load(read_match_columns("spotify_tracks"), read_match_columns("youtube_videos"), metrics)
+    if not replay:
+        _prune_landing(metrics)
+    print("🚀 ETL finalizado com sucesso!")
+
+@instrumented("refresh_stats")
+def run_refresh_stats(metrics: RunMetrics = None):
+    """
+    Só métricas: relê popularidade/views/likes/comentários dos IDs que já
+    estão no banco pelos endpoints em lote (sp.tracks e videos().list(id=...),
+    50 IDs por chamada), sem reler playlists e charts nem refazer a correlação
+    (títulos e faixas não mudam).
+    """
+    print("🔄 ETL só de métricas (--refresh-stats)...")
+    sources = [
+        ("spotify_tracks", spotify_scheduler, refresh_spotify_stats),
+        ("youtube_videos", youtube_scheduler, refresh_youtube_stats),
+    ]
+
+    def refresh(table_name, scheduler, fetch):
+        key, _ = STATS_COLUMNS[table_name]
+        ids = pd.read_sql(f"SELECT DISTINCT {key} FROM {table_name}", get_engine())[key].tolist()
+        with metrics.stage(f"refresh_{table_name}", rows_in=len(ids), schedulers=[scheduler]) as span:
+            try:
+                stats = fetch(ids)
+            except QuotaExceeded as e:
+                print(f"⚠️ {e}; métricas de {table_name} não atualizadas.")
+                return
+            span.rows_out = update_stats(stats, table_name, get_engine())
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        for future in [pool.submit(refresh, *source) for source in sources]:
+            future.result()
+
+    for table_name, _, _ in sources:
+        if SNAPSHOT_HISTORY:
+            with metrics.stage(f"snapshot_{table_name}"):
+                append_snapshot_from_table(table_name, get_engine())
+        _refresh_rollups(metrics, table_name)
+        _write_parquet(metrics, pd.read_sql(f"SELECT * FROM {table_name}", get_engine(),
+                                            chunksize=DEFAULT_BATCH_SIZE), table_name)
+    print("🚀 Métricas atualizadas com sucesso!")
+
+def read_match_columns(table_name: str) -> pd.DataFrame:
+    """Lê do banco só as colunas usadas pela correlação."""
+    columns = {
+        "spotify_tracks": "track_id, track_name, artist_name, region",
+        "youtube_videos": "video_id, title, region",
+    }[table_name]
+    return pd.read_sql(f"SELECT {columns} FROM {table_name}", get_engine())
+
+def correlate(spotify_df: pd.DataFrame, youtube_df: pd.DataFrame, metrics: RunMetrics = None) -> pd.DataFrame:
+    metrics = metrics or RunMetrics()
+    print("🔗 Calculando correlações...")
+    with metrics.stage("transform", rows_in=len(spotify_df) + len(youtube_df)) as span:
+        use_lsh = CORRELATION_METHOD == "lsh"
+        cache = MatchCache.load(MATCH_CACHE_PATH, max_batches=MATCH_CACHE_KEEP_RUNS) if MATCH_CACHE_PATH and not use_lsh else None
+        lsh_index = LSHIndex.load(LSH_INDEX_PATH, LSH_BANDS, LSH_ROWS, max_keys=LSH_MAX_TITLES) if use_lsh else None
+        corr_df = correlate_music_video(spotify_df, youtube_df, threshold=85,
+                                        method=CORRELATION_METHOD, cache=cache, lsh_index=lsh_index)
+        span.rows_out = len(corr_df)
+    if cache is not None:
+        cache.save()
+    if lsh_index is not None and LSH_INDEX_PATH:
+        lsh_index.save()
+    return corr_df
+
+def load_correlation_table(corr_df: pd.DataFrame, metrics: RunMetrics = None):
+    metrics = metrics or RunMetrics()
+    _measured_load(metrics, corr_df, "correlations")
+    _write_parquet(metrics, corr_df, "correlations")
+
+def correlate_and_load(spotify_df: pd.DataFrame, youtube_df: pd.DataFrame, metrics: RunMetrics = None):
+    load_correlation_table(correlate(spotify_df, youtube_df, metrics), metrics)
+
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="ETL Spotify/YouTube → PostgreSQL.")
+    parser.add_argument("--resume", nargs="?", const=True, metavar="RUN_ID",
+                        help="retoma um run (padrão: o último), pulando as etapas com checkpoint")
+    parser.add_argument("--only", action="append", choices=BATCH_STAGE_NAMES, metavar="STAGE",
+                        help=f"roda só esta etapa (repetível): {', '.join(BATCH_STAGE_NAMES)}")
+    parser.add_argument("--streaming", action="store_true", default=ETL_STREAMING,
+                        help="modo streaming (sem DAG nem checkpoints)")
+    parser.add_argument("--refresh-stats", action="store_true",
+                        help="só atualiza popularidade/views/likes/comentários dos IDs já carregados")
+    parser.add_argument("--replay", nargs="?", const=True, metavar="RUN_ID",
+                        help="extrai das respostas gravadas de um run (padrão: o último), sem chamar as APIs")
+    args = parser.parse_args()
+    if CORRELATION_METHOD not in ("batched", "lsh", "legacy"):
+        # falha antes de extrair e carregar, não só na etapa de correlação
+        parser.error(f"CORRELATION_METHOD={CORRELATION_METHOD} não vale no ETL (batched, lsh ou legacy); "
+                     "o pg_trgm roda à parte: python src/trgm_match.py")
+    if args.refresh_stats:
+        if args.resume or args.only or args.replay:
+            parser.error("--resume/--only/--replay não valem com --refresh-stats")
+        run_refresh_stats()
+    elif args.streaming:
+        if args.resume or args.only:
+            parser.error("--resume/--only valem só para o modo em lote")
+        run_streaming(replay=args.replay)
+    else:
+        run(resume=args.resume, only=args.only, replay=args.replay)
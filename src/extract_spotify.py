@@ -1,17 +1,27 @@
 # src/extract_spotify.py
+import argparse
 import os
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 import pandas as pd
 from dotenv import load_dotenv
 
+from clients import get_spotify
+from dtypes import apply_dtypes
+from fetch_state import FetchState
+from landing import Landing, iter_replay_pages, replay_rows, unique_pages
+from rate_limit import RequestScheduler
+
 load_dotenv()
 
-# Autenticação
-sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-    client_id=os.getenv("SPOTIFY_CLIENT_ID"),
-    client_secret=os.getenv("SPOTIFY_CLIENT_SECRET")
-))
+# Limite de taxa e retries das chamadas ao Spotify (429 + Retry-After)
+scheduler = RequestScheduler(
+    "Spotify",
+    rate=float(os.getenv("SPOTIFY_RATE", "10")),
+    burst=int(os.getenv("SPOTIFY_BURST", "10")),
+    max_retries=int(os.getenv("API_MAX_RETRIES", "5"))
+)
 
 # 🔥 Playlists oficiais do Spotify (Top 50 Global + regionais)
 REGIONS = {
@@ -22,28 +32,121 @@ REGIONS = {
     "PT": "0iXCcDOlT2OeRzbOujXdGH"       # Top 50 Portugal
 }
 
-def extract_spotify_tracks():
-    all_data = []
-    for region, playlist_id in REGIONS.items():
+def _track_record(track: dict, region: str) -> dict:
+    return {
+        "track_id": track["id"],
+        "track_name": track["name"],
+        "artist_name": ", ".join([a["name"] for a in track["artists"]]),
+        "album_name": track["album"]["name"],
+        "release_year": int(track["album"]["release_date"][:4]),
+        "duration_s": track["duration_ms"] // 1000,
+        "popularity": track["popularity"],
+        "region": region
+    }
+
+# PRIMARY KEY de spotify_tracks: uma linha por faixa e região
+TRACK_KEY = ("track_id", "region")
+
+# Máximo de IDs por chamada de sp.tracks (limite da API)
+TRACKS_BATCH_SIZE = 50
+
+def _page_records(results: dict, region: str) -> list:
+    """Faixas de uma página de playlist_tracks (resposta bruta da API)."""
+    return [_track_record(item["track"], region) for item in results["items"] if item["track"]]
+
+def iter_playlist_pages(region: str, playlist_id: str, landing: Landing = None):
+    """
+    Gera as faixas da playlist página a página (uma lista de dicts por página),
+    seguindo "next". Com landing, cada resposta bruta vai para a landing zone.
+    """
+    sp = get_spotify()
+    with landing.partition("spotify", region) if landing else nullcontext() as land:
+        results = scheduler.call(sp.playlist_tracks, playlist_id, additional_types=["track"])
+        while results:
+            if land:
+                land(results)
+            yield _page_records(results, region)
+            results = scheduler.call(sp.next, results) if results.get("next") else None
+
+def iter_spotify_tracks(regions: dict = None, landing: Landing = None):
+    """
+    Versão streaming da extração: gera páginas de faixas de cada região, na
+    ordem de REGIONS, sem montar o DataFrame completo em memória.
+    """
+    for region, playlist_id in (regions or REGIONS).items():
         print(f"🎶 Extraindo playlist {region}...")
-        results = sp.playlist_tracks(playlist_id, additional_types=["track"])
-        for item in results["items"]:
-            track = item["track"]
-            if not track:
-                continue
-            all_data.append({
-                "track_id": track["id"],
-                "track_name": track["name"],
-                "artist_name": ", ".join([a["name"] for a in track["artists"]]),
-                "album_name": track["album"]["name"],
-                "release_year": int(track["album"]["release_date"][:4]),
-                "duration_s": track["duration_ms"] // 1000,
-                "popularity": track["popularity"],
-                "region": region
-            })
-    return pd.DataFrame(all_data)
+        yield from unique_pages(iter_playlist_pages(region, playlist_id, landing), TRACK_KEY)
+
+def extract_spotify_region(region: str, playlist_id: str, landing: Landing = None) -> list:
+    """Extrai as faixas de uma playlist (uma região) como lista de dicts."""
+    start = time.perf_counter()
+    print(f"🎶 Extraindo playlist {region}...")
+    data = [row for page in unique_pages(iter_playlist_pages(region, playlist_id, landing), TRACK_KEY)
+            for row in page]
+    print(f"⏱️ Spotify {region}: {len(data)} faixas em {time.perf_counter() - start:.2f}s")
+    return data
+
+def playlist_snapshot(playlist_id: str) -> str:
+    """snapshot_id atual da playlist (muda sempre que a playlist é alterada)."""
+    return scheduler.call(get_spotify().playlist, playlist_id, fields="snapshot_id")["snapshot_id"]
+
+def extract_spotify_tracks(max_workers: int = 1, state: FetchState = None, landing: Landing = None):
+    """
+    Extrai todas as playlists de REGIONS. Com max_workers > 1 as regiões são
+    buscadas em paralelo (threads); a ordem das linhas é a mesma do modo sequencial.
+
+    Com state, compara o snapshot_id de cada playlist com o último carregado e
+    devolve None sem baixar as faixas se nenhuma playlist mudou.
+    Com landing, as respostas das playlists são gravadas na landing zone.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        if state is not None:
+            snapshots = dict(zip(REGIONS, pool.map(playlist_snapshot, REGIONS.values())))
+            if all(state.get("spotify", r) == snap for r, snap in snapshots.items()):
+                print("⏭️ Spotify: nenhuma playlist mudou desde o último run.")
+                return None
+            for region, snapshot in snapshots.items():
+                state.stage("spotify", region, snapshot)
+
+        chunks = pool.map(lambda item: extract_spotify_region(*item, landing), REGIONS.items())
+        all_data = [row for chunk in chunks for row in chunk]
+    return apply_dtypes(pd.DataFrame(all_data), "spotify_tracks")
+
+def iter_replay_spotify_tracks(run_id: str, base_dir: str = None):
+    """Como iter_spotify_tracks, mas lendo as respostas gravadas do run (sem API)."""
+    return iter_replay_pages("spotify", run_id, REGIONS, _page_records, TRACK_KEY, base_dir)
+
+def replay_spotify_tracks(run_id: str, max_workers: int = 1, base_dir: str = None):
+    """
+    Remonta o DataFrame da extração de um run a partir da landing zone, uma
+    região por thread. None se o run não baixou as playlists (nenhuma mudou).
+    """
+    rows = replay_rows("spotify", run_id, REGIONS, _page_records, TRACK_KEY, max_workers, base_dir)
+    return None if rows is None else apply_dtypes(pd.DataFrame(rows), "spotify_tracks")
+
+def refresh_spotify_stats(track_ids) -> pd.DataFrame:
+    """
+    Modo "só métricas": popularidade atual das faixas já conhecidas via
+    sp.tracks, TRACKS_BATCH_SIZE IDs por chamada (em vez de reler as playlists).
+    Faixas que sumiram do catálogo ficam de fora.
+    """
+    start = time.perf_counter()
+    track_ids = list(dict.fromkeys(track_ids))
+    sp = get_spotify()
+    rows = []
+    for i in range(0, len(track_ids), TRACKS_BATCH_SIZE):
+        batch = track_ids[i:i + TRACKS_BATCH_SIZE]
+        for track in scheduler.call(sp.tracks, batch)["tracks"]:
+            if track:
+                rows.append({"track_id": track["id"], "popularity": track["popularity"]})
+    print(f"⏱️ Spotify: popularidade de {len(rows)} faixas em {time.perf_counter() - start:.2f}s "
+          f"({-(-len(track_ids) // TRACKS_BATCH_SIZE)} chamadas)")
+    return apply_dtypes(pd.DataFrame(rows, columns=["track_id", "popularity"]), "spotify_tracks")
 
 if __name__ == "__main__":
-    df = extract_spotify_tracks()
+    parser = argparse.ArgumentParser(description="Extrai as playlists do Spotify para CSV.")
+    parser.add_argument("--replay", metavar="RUN_ID", help="lê as respostas gravadas do run, sem chamar a API")
+    args = parser.parse_args()
+    df = replay_spotify_tracks(args.replay, max_workers=4) if args.replay else extract_spotify_tracks()
     print(df.groupby("region")["track_id"].count())
     df.to_csv("spotify_tracks.csv", index=False, encoding="utf-8")
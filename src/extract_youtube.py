@@ -1,13 +1,32 @@
+import argparse
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 import pandas as pd
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from dotenv import load_dotenv
 
+from clients import get_youtube
+from dtypes import apply_dtypes
+from fetch_state import FetchState
+from landing import Landing, iter_replay_pages, replay_rows, unique_pages
+from rate_limit import RequestScheduler
+
 load_dotenv()
 
-# Autenticação
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-youtube = build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+# Limite de taxa, cota por run (videos().list custa 1 unidade) e retries das chamadas ao YouTube
+scheduler = RequestScheduler(
+    "YouTube",
+    rate=float(os.getenv("YOUTUBE_RATE", "10")),
+    burst=int(os.getenv("YOUTUBE_BURST", "10")),
+    quota=int(os.getenv("YOUTUBE_QUOTA_BUDGET", "10000")),
+    max_retries=int(os.getenv("API_MAX_RETRIES", "5"))
+)
+VIDEOS_LIST_COST = 1
+
+# Máximo de resultados por página do chart e de IDs por chamada de videos().list(id=...)
+VIDEOS_PAGE_SIZE = 50
 
 # Regiões que vamos capturar
 REGIONS = ["BR", "US", "MX", "PT"]
@@ -29,37 +48,154 @@ YOUTUBE_CATEGORIES = {
     "28": "Science & Technology"
 }
 
-def extract_youtube_videos():
-    all_data = []
-    for region in REGIONS:
-        request = youtube.videos().list(
-            part="snippet,statistics",
-            chart="mostPopular",
-            regionCode=region,
-            maxResults=50
-        )
-        response = request.execute()
-
-        for item in response["items"]:
+def _video_record(item: dict, region: str) -> dict:
+    stats = item["statistics"]
+    cat_id = str(item["snippet"].get("categoryId", ""))
+    cat_name = YOUTUBE_CATEGORIES.get(cat_id, cat_id)
+    return {
+        "video_id": item["id"],
+        "title": item["snippet"]["title"],
+        "channel_id": item["snippet"]["channelId"],
+        "channel_title": item["snippet"]["channelTitle"],
+        "category": cat_name,  # 🔥 já salva com nome legível
+        "published_at": item["snippet"]["publishedAt"],
+        "view_count": int(stats.get("viewCount", 0)),
+        "like_count": int(stats.get("likeCount", 0)),
+        "comment_count": int(stats.get("commentCount", 0)),
+        "region": region
+    }
+
+def _chart_page(region: str, etag: str = None, page_token: str = None):
+    """Uma página do chart mostPopular; None se o ETag ainda vale (HTTP 304)."""
+    params = {"pageToken": page_token} if page_token else {}
+    request = get_youtube().videos().list(
+        part="snippet,statistics",
+        chart="mostPopular",
+        regionCode=region,
+        maxResults=VIDEOS_PAGE_SIZE,
+        **params
+    )
+    if etag:
+        request.headers["If-None-Match"] = etag
+    try:
+        return scheduler.call(request.execute, cost=VIDEOS_LIST_COST)
+    except HttpError as e:
+        if e.resp.status == 304:
+            return None
+        raise
+
+# PRIMARY KEY de youtube_videos: uma linha por vídeo e região
+VIDEO_KEY = ("video_id", "region")
+
+def _page_records(response: dict, region: str) -> list:
+    """Vídeos de uma página do chart (resposta bruta da API)."""
+    return [_video_record(item, region) for item in response["items"]]
+
+def iter_chart_pages(region: str, first_page: dict = None, landing: Landing = None):
+    """
+    Gera os vídeos do chart de uma região página a página (uma lista de dicts
+    por página), seguindo nextPageToken. first_page: primeira página já buscada.
+    Com landing, cada resposta bruta vai para a landing zone.
+    """
+    with landing.partition("youtube", region) if landing else nullcontext() as land:
+        response = first_page or _chart_page(region)
+        while response:
+            if land:
+                land(response)
+            yield _page_records(response, region)
+            token = response.get("nextPageToken")
+            response = _chart_page(region, page_token=token) if token else None
+
+def iter_youtube_videos(regions: list = None, landing: Landing = None):
+    """
+    Versão streaming da extração: gera páginas de vídeos de cada região, na
+    ordem de REGIONS, sem montar o DataFrame completo em memória.
+    """
+    for region in regions or REGIONS:
+        yield from unique_pages(iter_chart_pages(region, landing=landing), VIDEO_KEY)
+
+def extract_youtube_region(region: str, etag: str = None, landing: Landing = None):
+    """
+    Extrai o chart mostPopular de uma região como lista de dicts.
+
+    Retorna (linhas, etag). Com etag, a primeira página leva If-None-Match e
+    linhas é None quando o chart não mudou (HTTP 304); o ETag guardado é o
+    da primeira página. Um chart inalterado não grava nada na landing zone.
+    """
+    start = time.perf_counter()
+    response = _chart_page(region, etag)
+    if response is None:
+        print(f"⏭️ YouTube {region}: chart não mudou ({time.perf_counter() - start:.2f}s)")
+        return None, etag
+
+    data = [row for page in unique_pages(iter_chart_pages(region, response, landing), VIDEO_KEY) for row in page]
+    print(f"⏱️ YouTube {region}: {len(data)} vídeos em {time.perf_counter() - start:.2f}s")
+    return data, response.get("etag")
+
+def extract_youtube_videos(max_workers: int = 1, state: FetchState = None, landing: Landing = None):
+    """
+    Extrai o chart de cada região em REGIONS. Com max_workers > 1 as regiões são
+    buscadas em paralelo (threads); a ordem das linhas é a mesma do modo sequencial.
+
+    Com state, usa o último ETag de cada região (If-None-Match) e devolve None
+    se nenhum chart mudou. Se só parte mudou, as regiões inalteradas são
+    buscadas de novo sem ETag, para a tabela continuar completa.
+    Com landing, as respostas dos charts são gravadas na landing zone.
+    """
+    etags = {r: state.get("youtube", r) if state is not None else None for r in REGIONS}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = dict(zip(REGIONS, pool.map(lambda r: extract_youtube_region(r, etags[r], landing), REGIONS)))
+        unchanged = [r for r, (data, _) in results.items() if data is None]
+        if len(unchanged) == len(REGIONS):
+            print("⏭️ YouTube: nenhum chart mudou desde o último run.")
+            return None
+        results.update(zip(unchanged, pool.map(lambda r: extract_youtube_region(r, landing=landing), unchanged)))
+
+    if state is not None:
+        for region, (_, etag) in results.items():
+            if etag:
+                state.stage("youtube", region, etag)
+    all_data = [row for r in REGIONS for row in results[r][0]]
+    return apply_dtypes(pd.DataFrame(all_data), "youtube_videos")
+
+def iter_replay_youtube_videos(run_id: str, base_dir: str = None):
+    """Como iter_youtube_videos, mas lendo as respostas gravadas do run (sem API)."""
+    return iter_replay_pages("youtube", run_id, REGIONS, _page_records, VIDEO_KEY, base_dir)
+
+def replay_youtube_videos(run_id: str, max_workers: int = 1, base_dir: str = None):
+    """
+    Remonta o DataFrame da extração de um run a partir da landing zone, uma
+    região por thread. None se o run não baixou os charts (nenhum mudou).
+    """
+    rows = replay_rows("youtube", run_id, REGIONS, _page_records, VIDEO_KEY, max_workers, base_dir)
+    return None if rows is None else apply_dtypes(pd.DataFrame(rows), "youtube_videos")
+
+def refresh_youtube_stats(video_ids) -> pd.DataFrame:
+    """
+    Modo "só métricas": views/likes/comentários atuais dos vídeos já
+    conhecidos via videos().list(id=...), VIDEOS_PAGE_SIZE IDs por chamada
+    (1 unidade de cota cada, só part=statistics). Vídeos removidos ficam de fora.
+    """
+    start = time.perf_counter()
+    video_ids = list(dict.fromkeys(video_ids))
+    columns = ["video_id", "view_count", "like_count", "comment_count"]
+    rows = []
+    for i in range(0, len(video_ids), VIDEOS_PAGE_SIZE):
+        batch = video_ids[i:i + VIDEOS_PAGE_SIZE]
+        request = get_youtube().videos().list(part="statistics", id=",".join(batch), maxResults=VIDEOS_PAGE_SIZE)
+        for item in scheduler.call(request.execute, cost=VIDEOS_LIST_COST)["items"]:
             stats = item["statistics"]
-            cat_id = str(item["snippet"].get("categoryId", ""))
-            cat_name = YOUTUBE_CATEGORIES.get(cat_id, cat_id)
-
-            all_data.append({
-                "video_id": item["id"],
-                "title": item["snippet"]["title"],
-                "channel_id": item["snippet"]["channelId"],
-                "channel_title": item["snippet"]["channelTitle"],
-                "category": cat_name,  # 🔥 já salva com nome legível
-                "published_at": item["snippet"]["publishedAt"],
-                "view_count": int(stats.get("viewCount", 0)),
-                "like_count": int(stats.get("likeCount", 0)),
-                "comment_count": int(stats.get("commentCount", 0)),
-                "region": region
-            })
-    return pd.DataFrame(all_data)
+            rows.append({"video_id": item["id"], "view_count": int(stats.get("viewCount", 0)),
+                         "like_count": int(stats.get("likeCount", 0)),
+                         "comment_count": int(stats.get("commentCount", 0))})
+    print(f"⏱️ YouTube: métricas de {len(rows)} vídeos em {time.perf_counter() - start:.2f}s "
+          f"({-(-len(video_ids) // VIDEOS_PAGE_SIZE)} chamadas)")
+    return apply_dtypes(pd.DataFrame(rows, columns=columns), "youtube_videos")
 
 if __name__ == "__main__":
-    df = extract_youtube_videos()
+    parser = argparse.ArgumentParser(description="Extrai os charts do YouTube para CSV.")
+    parser.add_argument("--replay", metavar="RUN_ID", help="lê as respostas gravadas do run, sem chamar a API")
+    args = parser.parse_args()
+    df = replay_youtube_videos(args.replay, max_workers=4) if args.replay else extract_youtube_videos()
     print(df.head())
     df.to_csv("youtube_videos.csv", index=False, encoding="utf-8")
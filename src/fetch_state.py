@@ -0,0 +1,48 @@
+import json
+import os
+import threading
+
+class FetchState:
+    """
+    Último snapshot_id (Spotify) / ETag (YouTube) visto para cada região.
+
+    Os extratores registram os tokens novos com stage(); eles só passam a valer
+    depois de commit(), que o etl_runner chama quando a carga da fonte termina.
+    Assim um run que falha no meio não marca playlists/charts como já carregados.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tokens = {}   # fonte -> {região: token}
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "FetchState":
+        state = cls(path)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state.tokens = json.load(f)
+        return state
+
+    def get(self, source: str, region: str):
+        return self.tokens.get(source, {}).get(region)
+
+    def stage(self, source: str, region: str, token: str):
+        with self._lock:
+            self.pending.setdefault(source, {})[region] = token
+
+    def commit(self, source: str):
+        # save() dentro do lock: Spotify e YouTube podem ser carregados em paralelo
+        with self._lock:
+            self.tokens.setdefault(source, {}).update(self.pending.pop(source, {}))
+            self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.tokens, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
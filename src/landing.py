@@ -0,0 +1,211 @@
+# ==============================================
+# Landing zone das respostas brutas das APIs
+# ==============================================
+# Cada página devolvida pelo Spotify (playlist_tracks / next) e pelo YouTube
+# (videos().list do chart) é gravada como está, uma resposta JSON por linha,
+# em arquivos gzip particionados por fonte, região e run:
+#   <LANDING_DIR>/<fonte>/region=<região>/run=<run_id>/part-0.jsonl.gz
+# Com --replay <run_id>, extratores e etl_runner remontam os DataFrames a
+# partir desses arquivos (em streaming, uma partição por thread), sem
+# credenciais nem cota: reprocessamentos e backfills determinísticos.
+# Ao fim de cada run o etl_runner apaga os runs além dos LANDING_KEEP_RUNS
+# mais recentes.
+# ==============================================
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Diretório da landing zone (vazio = respostas não são gravadas)
+LANDING_DIR = os.getenv("LANDING_DIR", "data/landing")
+
+# Quantos runs manter na landing zone (0 = todos)
+LANDING_KEEP_RUNS = int(os.getenv("LANDING_KEEP_RUNS", "7"))
+
+# Nível do gzip: as páginas são pequenas e gravadas durante a extração
+LANDING_COMPRESSLEVEL = 6
+
+LANDING_SOURCES = ("spotify", "youtube")
+
+def _partition_path(source: str, region: str, run_id: str, base_dir: str) -> str:
+    return os.path.join(base_dir, source, f"region={region}", f"run={run_id}", "part-0.jsonl.gz")
+
+class Landing:
+    """Destino das respostas brutas de um run (passado aos extratores como landing=)."""
+
+    def __init__(self, run_id: str, base_dir: str = None):
+        self.run_id = run_id
+        self.base_dir = base_dir or LANDING_DIR
+
+    @contextmanager
+    def partition(self, source: str, region: str):
+        """
+        Abre a partição (fonte, região) do run e devolve uma função que grava
+        uma resposta. O arquivo só aparece no caminho final se a extração da
+        região terminar (tmp + rename); uma partição antiga do mesmo run é
+        substituída.
+        """
+        path = _partition_path(source, region, self.run_id, self.base_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        f = gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=LANDING_COMPRESSLEVEL)
+        try:
+            yield lambda response: f.write(json.dumps(response, ensure_ascii=False) + "\n")
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+        f.close()
+        os.replace(tmp_path, path)
+
+# ================================
+# Leitura (replay)
+# ================================
+def list_regions(source: str, run_id: str, base_dir: str = None) -> list:
+    """Regiões com partição completa da fonte no run."""
+    directory = os.path.join(base_dir or LANDING_DIR, source)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[len("region="):] for name in os.listdir(directory)
+                  if name.startswith("region=")
+                  and os.path.exists(os.path.join(directory, name, f"run={run_id}", "part-0.jsonl.gz")))
+
+def list_runs(base_dir: str = None) -> list:
+    """run_ids com alguma partição, do mais antigo ao mais recente."""
+    base_dir = base_dir or LANDING_DIR
+    runs = set()
+    for source in LANDING_SOURCES:
+        directory = os.path.join(base_dir, source)
+        if not os.path.isdir(directory):
+            continue
+        for region_dir in os.listdir(directory):
+            for name in os.listdir(os.path.join(directory, region_dir)):
+                if name.startswith("run=") and os.path.exists(
+                        os.path.join(directory, region_dir, name, "part-0.jsonl.gz")):
+                    runs.add(name[len("run="):])
+    return sorted(runs)
+
+def latest_run(base_dir: str = None):
+    runs = list_runs(base_dir)
+    return runs[-1] if runs else None
+
+def resolve_run(run_id: str = None, base_dir: str = None) -> str:
+    """run_id pedido (ou o mais recente), conferindo que há respostas gravadas dele."""
+    runs = list_runs(base_dir)
+    if not runs or (run_id is not None and run_id not in runs):
+        raise FileNotFoundError(f"Nenhuma resposta gravada em {base_dir or LANDING_DIR}"
+                                + (f" para o run {run_id}" if run_id else ""))
+    return run_id or runs[-1]
+
+def iter_responses(source: str, region: str, run_id: str, base_dir: str = None):
+    """Gera as respostas da partição na ordem em que chegaram (uma linha por vez)."""
+    with gzip.open(_partition_path(source, region, run_id, base_dir or LANDING_DIR), "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+def ordered_regions(source: str, run_id: str, regions, base_dir: str = None) -> list:
+    """
+    Regiões gravadas no run, na ordem de regions (a do extrator) e depois as
+    que não estão mais lá, para o replay ter a mesma ordem de linhas do run.
+    """
+    landed = list_regions(source, run_id, base_dir)
+    return [r for r in regions if r in landed] + [r for r in landed if r not in regions]
+
+def unique_pages(pages, key):
+    """
+    Repassa as páginas de linhas sem as que repetem uma chave (tupla de colunas)
+    já vista. Se a playlist/chart muda durante a paginação, um item pode descer
+    para a página seguinte e vir duas vezes; a PRIMARY KEY não aceita a repetição.
+    Fica a primeira ocorrência; só as chaves ficam em memória, não as linhas.
+    """
+    seen = set()
+    for page in pages:
+        rows = []
+        for row in page:
+            row_key = tuple(row[column] for column in key)
+            if row_key not in seen:
+                seen.add(row_key)
+                rows.append(row)
+        yield rows
+
+def iter_replay_pages(source: str, run_id: str, regions, to_rows, key, base_dir: str = None):
+    """Versão streaming do replay: páginas de linhas (to_rows(resposta, região)), região a região."""
+    pages = (to_rows(response, region)
+             for region in ordered_regions(source, run_id, regions, base_dir)
+             for response in iter_responses(source, region, run_id, base_dir))
+    return unique_pages(pages, key)
+
+def replay_rows(source: str, run_id: str, regions, to_rows, key, max_workers: int = 4, base_dir: str = None) -> list:
+    """
+    Todas as linhas da fonte no run, uma partição por thread (descompressão
+    em paralelo); a ordem é a mesma do replay sequencial.
+    Devolve None se o run não gravou nada da fonte (fonte inalterada naquele run).
+    """
+    start = time.perf_counter()
+    partitions = ordered_regions(source, run_id, regions, base_dir)
+    if not partitions:
+        print(f"⏭️ Replay {source} (run {run_id}): nenhuma resposta gravada.")
+        return None
+
+    def read(region):
+        # a chave inclui a região: repetição só existe dentro da partição
+        pages = (to_rows(response, region) for response in iter_responses(source, region, run_id, base_dir))
+        return [row for page in unique_pages(pages, key) for row in page]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        rows = [row for chunk in pool.map(read, partitions) for row in chunk]
+    print(f"⏪ Replay {source} (run {run_id}): {len(rows)} linhas de {len(partitions)} partições "
+          f"em {time.perf_counter() - start:.2f}s")
+    return rows
+
+# ================================
+# Retenção
+# ================================
+def prune_runs(keep: int, current: str = None, base_dir: str = None) -> list:
+    """
+    Apaga as partições dos runs mais antigos, mantendo os keep mais recentes
+    com alguma partição completa (e o run current, mesmo que incompleto).
+    Diretórios run= sem partição completa (run interrompido) também saem.
+    Devolve os run_ids apagados.
+    """
+    base_dir = base_dir or LANDING_DIR
+    if keep <= 0:
+        return []
+    kept = set(list_runs(base_dir)[-keep:]) | {current}
+    removed = set()
+    for source in LANDING_SOURCES:
+        directory = os.path.join(base_dir, source)
+        if not os.path.isdir(directory):
+            continue
+        for region_dir in os.listdir(directory):
+            region_path = os.path.join(directory, region_dir)
+            for name in os.listdir(region_path):
+                run_id = name[len("run="):]
+                if name.startswith("run=") and run_id not in kept:
+                    shutil.rmtree(os.path.join(region_path, name), ignore_errors=True)
+                    removed.add(run_id)
+            if not os.listdir(region_path):
+                os.rmdir(region_path)
+    if removed:
+        print(f"🧹 Landing zone: {len(removed)} runs antigos apagados (mantidos os {keep} mais recentes)")
+    return sorted(removed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lista as respostas brutas gravadas na landing zone.")
+    parser.add_argument("--run", help="run_id (padrão: todos)")
+    args = parser.parse_args()
+    for run_id in [args.run] if args.run else list_runs():
+        for source in LANDING_SOURCES:
+            for region in list_regions(source, run_id):
+                path = _partition_path(source, region, run_id, LANDING_DIR)
+                pages = sum(1 for _ in iter_responses(source, region, run_id))
+                print(f"📦 run={run_id} {source} {region}: {pages} páginas, {os.path.getsize(path) / 1024:.1f} KB")
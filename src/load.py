@@ -1,23 +1,397 @@
+import io
 import os
+import re
+import time
+from datetime import date, datetime, timezone
 import pandas as pd
-from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
+from clients import get_engine
+from dtypes import apply_dtypes
+
 load_dotenv()
 
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "spotify_youtube")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
+# Linhas por COPY na carga streaming (stream_load)
+DEFAULT_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "5000"))
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "schema.sql")
+
+# Tabelas de histórico (append-only) e as métricas copiadas de cada tabela principal
+SNAPSHOT_TABLES = {
+    "spotify_tracks": ("spotify_track_snapshots", ["track_id", "region", "popularity"]),
+    "youtube_videos": ("youtube_video_snapshots",
+                       ["video_id", "region", "view_count", "like_count", "comment_count"]),
+}
+
+# Métricas que o modo --refresh-stats atualiza em cada tabela: (chave do ID, colunas)
+STATS_COLUMNS = {
+    "spotify_tracks": ("track_id", ["popularity"]),
+    "youtube_videos": ("video_id", ["view_count", "like_count", "comment_count"]),
+}
+
+# Largura dos bins dos histogramas pré-agregados (o bin é o início da faixa)
+HISTOGRAM_BINS = {"popularity": 5, "duration_s": 15}
+
+def _histogram_select(column: str) -> str:
+    width = HISTOGRAM_BINS[column]
+    return f"""
+        SELECT region, release_year, '{column}', ({column} / {width}) * {width}, COUNT(*)
+        FROM spotify_tracks
+        GROUP BY region, release_year, ({column} / {width}) * {width}
+    """
+
+# Rollups do dashboard derivados de cada tabela principal, refeitos no banco a cada carga
+ROLLUP_TABLES = {
+    "spotify_tracks": {
+        "spotify_region_rollup": """
+            INSERT INTO spotify_region_rollup (region, release_year, tracks, popularity_sum, popularity_n)
+            SELECT region, release_year, COUNT(*), SUM(popularity), COUNT(popularity)
+            FROM spotify_tracks
+            GROUP BY region, release_year
+        """,
+        "spotify_histogram_rollup": "INSERT INTO spotify_histogram_rollup (region, release_year, column_name, bin, n)"
+                                    + " UNION ALL ".join(_histogram_select(column) for column in HISTOGRAM_BINS),
+    },
+    "youtube_videos": {
+        # date(): cast para DATE no PostgreSQL, função de data no SQLite (testes e benchmarks)
+        "youtube_rollup": """
+            INSERT INTO youtube_rollup (region, category, channel_id, channel_title, day, videos,
+                                        first_region_videos, view_count, like_count, comment_count)
+            SELECT region, category, channel_id, channel_title, date(published_at), COUNT(*),
+                   SUM(CASE WHEN region = first_region THEN 1 ELSE 0 END),
+                   SUM(view_count), SUM(like_count), SUM(comment_count)
+            FROM (
+                SELECT *, MIN(region) OVER (PARTITION BY video_id) AS first_region
+                FROM youtube_videos
+            ) v
+            GROUP BY region, category, channel_id, channel_title, date(published_at)
+        """,
+    },
+}
+
+def schema_statements(table_name: str):
+    """
+    Lê do schema.sql o CREATE TABLE e os CREATE INDEX de uma tabela.
+
+    Returns:
+        (create_table, [(nome_indice, create_index), ...])
+    """
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        lines = [line for line in f if not line.lstrip().startswith("--")]
+    statements = [stmt.strip() for stmt in "".join(lines).split(";") if stmt.strip()]
+
+    create_table, indexes = None, []
+    for stmt in statements:
+        if re.match(rf"CREATE TABLE IF NOT EXISTS {table_name}\s*\(", stmt):
+            create_table = stmt
+        match = re.match(rf"CREATE INDEX IF NOT EXISTS (\w+) ON {table_name}\s", stmt)
+        if match:
+            indexes.append((match.group(1), stmt))
+    if create_table is None:
+        raise ValueError(f"Tabela {table_name} não declarada em {SCHEMA_PATH}")
+    return create_table, indexes
+
+def primary_key(table_name: str) -> list:
+    """Colunas da PRIMARY KEY declarada no schema.sql."""
+    create_table, _ = schema_statements(table_name)
+    match = re.search(r"PRIMARY KEY \(([^)]*)\)", create_table)
+    if match:
+        return [c.strip() for c in match.group(1).split(",")]
+    match = re.search(r"^\s*(\w+)\s+[^,\n]*PRIMARY KEY", create_table, re.MULTILINE)
+    if match:
+        return [match.group(1)]
+    raise ValueError(f"Tabela {table_name} sem PRIMARY KEY em {SCHEMA_PATH}")
+
+def _ensure_table(cur, table_name: str):
+    """Cria a tabela e os índices do schema.sql se ainda não existirem."""
+    create_table, indexes = schema_statements(table_name)
+    cur.execute(create_table)
+    for _, stmt in indexes:
+        cur.execute(stmt)
+
+def _copy_into(cur, df: pd.DataFrame, table_name: str):
+    """COPY FROM STDIN (CSV) das colunas do DataFrame para a tabela."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    columns = ", ".join(df.columns)
+    cur.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def _run_in_transaction(db_engine, fn):
+    conn = db_engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            fn(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _staging_ddl(table_name: str, staging: str):
+    """DDL da tabela de staging (mesmos tipos/PK do schema) e os renames para a troca."""
+    create_table, indexes = schema_statements(table_name)
+    create_staging = create_table.replace(
+        f"CREATE TABLE IF NOT EXISTS {table_name}", f"CREATE TABLE {staging}", 1)
+    create_indexes, renames = [], []
+    for name, stmt in indexes:
+        create_indexes.append(re.sub(
+            rf"CREATE INDEX IF NOT EXISTS {name} ON {table_name}\s",
+            f"CREATE INDEX {name}__staging ON {staging} ", stmt))
+        renames.append(f"ALTER INDEX {name}__staging RENAME TO {name}")
+    if "PRIMARY KEY" in create_table:
+        renames.append(f"ALTER TABLE {table_name} RENAME CONSTRAINT {staging}_pkey TO {table_name}_pkey")
+    for column in re.findall(r"(\w+)\s+SERIAL", create_table):
+        renames.append(f"ALTER SEQUENCE {staging}_{column}_seq RENAME TO {table_name}_{column}_seq")
+    return create_staging, create_indexes, renames
+
+def _replace_table(table_name: str, fill, db_engine):
+    """
+    Cria a staging a partir do schema.sql, preenche com fill(cur, tabela) e troca
+    pela original na mesma transação. fill devolve o número de linhas copiadas;
+    com 0 linhas a tabela original fica intacta.
+    """
+    staging = f"{table_name}__staging"
+    create_staging, create_indexes, renames = _staging_ddl(table_name, staging)
+    copied = {}
+
+    def swap(cur):
+        cur.execute(f"DROP TABLE IF EXISTS {staging}")
+        cur.execute(create_staging)
+        copied["rows"] = fill(cur, staging)
+        if not copied["rows"]:
+            cur.execute(f"DROP TABLE {staging}")
+            return
+        # índices criados depois do COPY: mais rápido que manter durante a carga
+        for stmt in create_indexes:
+            cur.execute(stmt)
+        cur.execute(f"DROP TABLE IF EXISTS {table_name}")
+        cur.execute(f"ALTER TABLE {staging} RENAME TO {table_name}")
+        for stmt in renames:
+            cur.execute(stmt)
+
+    _run_in_transaction(db_engine, swap)
+    return copied["rows"]
+
+def _upsert_table(table_name: str, fill, db_engine):
+    """
+    COPY para uma tabela temporária (fill(cur, tabela) devolve (linhas, colunas))
+    e INSERT ... ON CONFLICT na PRIMARY KEY do schema.sql.
+    """
+    key = primary_key(table_name)
+    has_fetched_at = "fetched_at" in schema_statements(table_name)[0]
+    tmp = f"{table_name}__upsert"
+    copied = {}
+
+    def upsert(cur):
+        _ensure_table(cur, table_name)
+        cur.execute(f"CREATE TEMP TABLE {tmp} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP")
+        copied["rows"], columns = fill(cur, tmp)
+        if not copied["rows"]:
+            return
+        updates = [f"{c} = EXCLUDED.{c}" for c in columns if c not in key]
+        if has_fetched_at and "fetched_at" not in columns:
+            updates.append("fetched_at = NOW()")
+        conflict = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+        cur.execute(f"""
+            INSERT INTO {table_name} ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM {tmp}
+            ON CONFLICT ({', '.join(key)}) {conflict}
+        """)
+
+    _run_in_transaction(db_engine, upsert)
+    return copied["rows"]
+
+def copy_load(df: pd.DataFrame, table_name: str, db_engine=None):
+    """
+    Substitui o conteúdo da tabela via COPY FROM STDIN (CSV) em uma tabela de
+    staging criada a partir do schema.sql, trocada pela original na mesma
+    transação. Quem lê a tabela vê a versão anterior completa até o COMMIT.
+    """
+    def fill(cur, target):
+        _copy_into(cur, df, target)
+        return len(df)
+
+    start = time.perf_counter()
+    _replace_table(table_name, fill, db_engine or get_engine())
+    print(f"📦 COPY {table_name}: {len(df)} registros em {time.perf_counter() - start:.2f}s")
+
+def upsert_load(df: pd.DataFrame, table_name: str, db_engine=None):
+    """
+    Carga incremental: COPY para uma tabela temporária e INSERT ... ON CONFLICT
+    na PRIMARY KEY do schema.sql. Linhas novas entram, as existentes são
+    atualizadas e as que sumiram da extração continuam na tabela.
+    """
+    def fill(cur, target):
+        _copy_into(cur, df, target)
+        return len(df), list(df.columns)
+
+    start = time.perf_counter()
+    _upsert_table(table_name, fill, db_engine or get_engine())
+    print(f"🔁 UPSERT {table_name}: {len(df)} registros em {time.perf_counter() - start:.2f}s")
+
+def _copy_batches(cur, chunks, table_name: str, batch_size: int):
+    """
+    Consome as páginas (listas de dicts) conforme chegam e faz um COPY a cada
+    batch_size linhas: o pico de memória depende do lote, não do total.
+    """
+    batch, rows, columns = [], 0, None
+    for chunk in chunks:
+        batch.extend(chunk)
+        while len(batch) >= batch_size:
+            df = pd.DataFrame(batch[:batch_size])
+            columns = columns or list(df.columns)
+            _copy_into(cur, df[columns], table_name)
+            rows += len(df)
+            del batch[:batch_size]
+    if batch:
+        df = pd.DataFrame(batch)
+        columns = columns or list(df.columns)
+        _copy_into(cur, df[columns], table_name)
+        rows += len(df)
+    return rows, columns
+
+def stream_load(chunks, table_name: str, mode: str = "replace",
+                batch_size: int = DEFAULT_BATCH_SIZE, db_engine=None) -> int:
+    """
+    Carga a partir de um iterador de páginas (ex.: iter_spotify_tracks()),
+    em lotes de tamanho fixo, com a mesma semântica de copy_load/upsert_load.
+    """
+    start = time.perf_counter()
+    if mode == "upsert":
+        rows = _upsert_table(table_name, lambda cur, target: _copy_batches(cur, chunks, target, batch_size),
+                             db_engine or get_engine())
+    else:
+        rows = _replace_table(table_name, lambda cur, target: _copy_batches(cur, chunks, target, batch_size)[0],
+                              db_engine or get_engine())
+    if not rows:
+        print(f"⚠️ Nenhum dado para {table_name}, ignorando.")
+    else:
+        print(f"📦 Stream {table_name}: {rows} registros em lotes de {batch_size} "
+              f"({time.perf_counter() - start:.2f}s)")
+    return rows
+
+def _month_partition(table_name: str, day: date):
+    first = day.replace(day=1)
+    following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    partition = f"{table_name}_{first:%Y%m}"
+    return partition, (f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table_name} "
+                       f"FOR VALUES FROM ('{first}') TO ('{following}')")
+
+def append_snapshot(df: pd.DataFrame, table_name: str, db_engine=None, fetch_date: date = None):
+    """
+    Acrescenta as métricas da extração (popularidade, views, likes, comentários)
+    na tabela de histórico da tabela principal, particionada por mês de fetch_date.
+    Consultas de tendência com filtro em fetch_date só leem as partições do período.
+    """
+    db_engine = db_engine or get_engine()
+    snapshot_table, columns = SNAPSHOT_TABLES[table_name]
+    fetch_date = fetch_date or datetime.now(timezone.utc).date()
+    partition, create_partition = _month_partition(snapshot_table, fetch_date)
+    rows = df[columns].assign(fetch_date=fetch_date)
+
+    def append(cur):
+        _ensure_table(cur, snapshot_table)
+        cur.execute(create_partition)
+        _copy_into(cur, rows, snapshot_table)
+
+    _run_in_transaction(db_engine, append)
+    print(f"🕓 Histórico {partition}: +{len(rows)} registros.")
+
+def append_snapshot_from_table(table_name: str, db_engine=None, fetch_date: date = None):
+    """Igual a append_snapshot, mas copia as métricas direto da tabela já carregada (sem passar pelo Python)."""
+    db_engine = db_engine or get_engine()
+    snapshot_table, columns = SNAPSHOT_TABLES[table_name]
+    fetch_date = fetch_date or datetime.now(timezone.utc).date()
+    partition, create_partition = _month_partition(snapshot_table, fetch_date)
+    column_list = ", ".join(columns)
+
+    def append(cur):
+        _ensure_table(cur, snapshot_table)
+        cur.execute(create_partition)
+        cur.execute(f"""
+            INSERT INTO {snapshot_table} (fetch_date, {column_list})
+            SELECT %s, {column_list} FROM {table_name}
+        """, (fetch_date,))
+
+    _run_in_transaction(db_engine, append)
+    print(f"🕓 Histórico {partition}: métricas de {table_name} acrescentadas.")
+
+def refresh_rollups(table_name: str, db_engine=None):
+    """
+    Refaz os rollups do dashboard derivados de table_name (INSERT ... SELECT
+    GROUP BY no banco). Apagar e reinserir na mesma transação: quem lê vê o
+    rollup antigo ou o novo, nunca vazio.
+    """
+    rollups = ROLLUP_TABLES.get(table_name)
+    if not rollups:
+        return
+    start = time.perf_counter()
+    # via SQLAlchemy (não COPY): o mesmo código roda no SQLite dos testes e benchmarks
+    with (db_engine or get_engine()).begin() as conn:
+        for rollup, insert in rollups.items():
+            create_table, indexes = schema_statements(rollup)
+            conn.exec_driver_sql(create_table)
+            for _, stmt in indexes:
+                conn.exec_driver_sql(stmt)
+            conn.exec_driver_sql(f"DELETE FROM {rollup}")
+            conn.exec_driver_sql(insert)
+    print(f"🧮 Rollups de {table_name} ({', '.join(rollups)}) em {time.perf_counter() - start:.2f}s")
+
+def update_stats(df: pd.DataFrame, table_name: str, db_engine=None) -> int:
+    """
+    Atualiza só as métricas (STATS_COLUMNS) das linhas já carregadas: COPY
+    para uma tabela temporária e UPDATE ... FROM pelo ID, em todas as regiões
+    em que o ID aparece. Devolve o número de linhas atualizadas.
+    """
+    if df.empty:
+        print(f"⚠️ Nenhuma métrica para {table_name}, ignorando.")
+        return 0
+    db_engine = db_engine or get_engine()
+    key, columns = STATS_COLUMNS[table_name]
+    staging = f"{table_name}_stats_tmp"
+    assignments = ", ".join(f"{c} = s.{c}" for c in columns)
+    updated = []
+
+    def update(cur):
+        cur.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                    f"SELECT {key}, {', '.join(columns)} FROM {table_name} WITH NO DATA")
+        _copy_into(cur, df[[key] + columns], staging)
+        cur.execute(f"UPDATE {table_name} t SET {assignments}, fetched_at = NOW() "
+                    f"FROM {staging} s WHERE t.{key} = s.{key}")
+        updated.append(cur.rowcount)
+
+    start = time.perf_counter()
+    _run_in_transaction(db_engine, update)
+    print(f"🔄 {table_name}: métricas de {len(df)} IDs atualizadas em {updated[0]} linhas "
+          f"({time.perf_counter() - start:.2f}s)")
+    return updated[0]
+
+def append_load(df: pd.DataFrame, table_name: str, db_engine=None):
+    """Acrescenta as linhas via COPY, criando a tabela do schema.sql se preciso (ex.: métricas do ETL)."""
+    append_loads({table_name: df}, db_engine)
+
+def append_loads(frames: dict, db_engine=None):
+    """Como append_load para várias tabelas ({tabela: df}) numa transação só: entram todas ou nenhuma."""
+    def append(cur):
+        for table_name, df in frames.items():
+            _ensure_table(cur, table_name)
+            _copy_into(cur, df, table_name)
 
-engine = create_engine(
-    f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-)
+    _run_in_transaction(db_engine or get_engine(), append)
 
 def load_table(file, table_name, if_exists="replace"):
-    df = pd.read_csv(file)
-    df.to_sql(table_name, engine, if_exists=if_exists, index=False)
+    # snapshots Parquet já vêm tipados: sem reparsear CSV
+    df = pd.read_parquet(file, memory_map=True) if str(file).endswith(".parquet") else pd.read_csv(file)
+    df = apply_dtypes(df, table_name)
+    if if_exists == "replace":
+        copy_load(df, table_name)
+    elif if_exists == "upsert":
+        upsert_load(df, table_name)
+    else:
+        df.to_sql(table_name, get_engine(), if_exists=if_exists, index=False)
+    refresh_rollups(table_name)
     print(f"Tabela `{table_name}` carregada com {len(df)} registros.")
 
 if __name__ == "__main__":
@@ -0,0 +1,322 @@
+# ==============================================
+# Índice MinHash/LSH de títulos de vídeo
+# ==============================================
+# Gera candidatos para correlate_music_video(method="lsh") sem pontuar a
+# faixa contra todo o histórico de vídeos:
+#   - cada título (chave normalizada) vira o conjunto dos shingles de
+#     caracteres de cada palavra (a ordem das palavras não importa, como no
+#     token_set_ratio) e uma assinatura MinHash de bands * rows valores;
+#   - a assinatura é cortada em bands faixas de rows valores; títulos com
+#     alguma faixa idêntica à da consulta são candidatos (LSH banding);
+#   - só os candidatos vão para o token_set_ratio exato.
+# Um título com similaridade de Jaccard s vira candidato com probabilidade
+# 1 - (1 - s^rows)^bands: mais bands / menos rows = mais recall e mais
+# candidatos. measure_recall() compara com o matcher exaustivo.
+# O LSH não acha matches por contenção em títulos curtos ("of" está contido
+# em qualquer faixa com "of" e dá token_set_ratio 100, mas Jaccard baixo);
+# por isso o recall também é medido só nos títulos com mais de uma palavra.
+#
+# A busca é sempre sobre o corpus da carga atual (build(): os títulos de
+# youtube_videos deste run); o que persiste entre runs (save/load em .npz)
+# é só o cache das assinaturas, para um título já visto não ser refeito.
+# O cache guarda em que build cada título foi usado por último e, acima de
+# max_keys títulos, save() descarta os usados há mais tempo.
+#
+#   python src/lsh_index.py --scale medium --sweep   → recall x candidatos por configuração
+# ==============================================
+
+import argparse
+import os
+import time
+import zlib
+
+import numpy as np
+
+DEFAULT_BANDS = 64
+DEFAULT_ROWS = 3
+DEFAULT_SHINGLE = 3
+
+# Títulos no cache de assinaturas (os usados há mais tempo saem primeiro)
+DEFAULT_MAX_KEYS = 200_000
+
+# Títulos por lote no cálculo vetorizado das assinaturas
+# (cada lote gera uma matriz bands*rows × shingles de uint64)
+SIGNATURE_CHUNK = 1024
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+def shingles(key: str, size: int = DEFAULT_SHINGLE) -> set:
+    """Shingles de caracteres de cada palavra da chave (com espaço nas pontas, para palavras curtas contarem)."""
+    result = set()
+    for token in key.split():
+        padded = f" {token} "
+        result.update(padded[i:i + size] for i in range(max(1, len(padded) - size + 1)))
+    return result
+
+class LSHIndex:
+    """
+    Índice MinHash/LSH sobre o corpus de build(), com cache de assinaturas.
+
+    self.keys / self._band_keys são o cache (ordem de inserção, persistido);
+    os ids devolvidos por candidate_pairs são as posições nas chaves do
+    último build().
+    """
+
+    def __init__(self, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS,
+                 shingle: int = DEFAULT_SHINGLE, seed: int = 1, path: str = None,
+                 max_keys: int = DEFAULT_MAX_KEYS):
+        self.bands = bands
+        self.rows = rows
+        self.shingle = shingle
+        self.seed = seed
+        self.path = path
+        self.max_keys = max_keys
+        rng = np.random.default_rng(seed)
+        num_perm = bands * rows
+        # hash multiply-shift: (a * h + b) >> 32, com a ímpar
+        self._a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self.keys = []
+        self.key_id = {}
+        self._band_keys = np.empty((0, bands), dtype=np.uint64)
+        self._last_used = np.empty(0, dtype=np.int64)  # build em que cada título foi usado por último
+        self.generation = 0
+        self._corpus = 0
+        self._tables = None  # por faixa: (chaves ordenadas, posições no corpus na mesma ordem)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ================================
+    # Assinaturas
+    # ================================
+    def signatures(self, keys: list) -> np.ndarray:
+        """Assinaturas MinHash (len(keys) x bands*rows, uint32); chave vazia = tudo 0xFFFFFFFF."""
+        num_perm = self.bands * self.rows
+        out = np.full((len(keys), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        for start in range(0, len(keys), SIGNATURE_CHUNK):
+            chunk = keys[start:start + SIGNATURE_CHUNK]
+            hashes, owners = [], []
+            for i, key in enumerate(chunk):
+                for sh in shingles(key, self.shingle):
+                    hashes.append(zlib.crc32(sh.encode("utf-8")))
+                    owners.append(i)
+            if not hashes:
+                continue
+            hv = np.array(hashes, dtype=np.uint64)
+            owners = np.array(owners, dtype=np.int64)
+            # (num_perm x shingles): o uint64 dá a volta de propósito, os 32 bits altos são o hash
+            values = ((self._a[:, None] * hv[None, :] + self._b[:, None]) >> np.uint64(32)).astype(np.uint32)
+            starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+            out[start + owners[starts]] = np.minimum.reduceat(values, starts, axis=1).T
+        return out
+
+    def band_keys(self, keys: list) -> np.ndarray:
+        """Uma chave uint64 por faixa (len(keys) x bands), combinando os rows valores da faixa."""
+        sig = self.signatures(keys).astype(np.uint64).reshape(len(keys), self.bands, self.rows)
+        combined = np.zeros((len(keys), self.bands), dtype=np.uint64)
+        for r in range(self.rows):
+            combined = combined * _MIX + sig[:, :, r]
+        return combined
+
+    # ================================
+    # Cache de assinaturas e corpus
+    # ================================
+    def add(self, keys) -> int:
+        """Calcula e guarda as assinaturas das chaves ainda não vistas (vazias são ignoradas). Devolve quantas eram novas."""
+        new = []
+        for key in keys:
+            if key and key not in self.key_id:
+                self.key_id[key] = len(self.keys) + len(new)
+                new.append(key)
+        if new:
+            self.keys.extend(new)
+            self._band_keys = np.vstack([self._band_keys, self.band_keys(new)])
+            self._last_used = np.concatenate([self._last_used, np.full(len(new), self.generation, dtype=np.int64)])
+        return len(new)
+
+    def build(self, keys: list):
+        """
+        Monta as tabelas de busca só com keys (o corpus da carga atual; ids
+        de candidate_pairs = posições em keys). Assinaturas já vistas vêm do cache.
+        """
+        self.add(keys)
+        self.generation += 1
+        present = [i for i, key in enumerate(keys) if key]
+        ids = np.array([self.key_id[keys[i]] for i in present], dtype=np.int64)
+        self._last_used[ids] = self.generation
+        positions = np.array(present, dtype=np.int64)
+        corpus = self._band_keys[ids]
+        self._corpus = len(keys)
+        self._tables = []
+        for band in range(self.bands):
+            order = np.argsort(corpus[:, band], kind="stable")
+            self._tables.append((corpus[order, band], positions[order]))
+
+    def prune(self, max_keys: int = None) -> int:
+        """Mantém no cache só os max_keys títulos usados mais recentemente. Devolve quantos saíram."""
+        max_keys = self.max_keys if max_keys is None else max_keys
+        if max_keys is None or len(self.keys) <= max_keys:
+            return 0
+        # mais recente primeiro; empate: o inserido depois
+        order = np.lexsort((-np.arange(len(self.keys)), -self._last_used))
+        keep = np.sort(order[:max_keys])
+        removed = len(self.keys) - len(keep)
+        self.keys = [self.keys[i] for i in keep]
+        self.key_id = {key: i for i, key in enumerate(self.keys)}
+        self._band_keys = self._band_keys[keep]
+        self._last_used = self._last_used[keep]
+        return removed
+
+    def candidate_pairs(self, queries: list):
+        """
+        Pares (consulta, posição no corpus do último build) com alguma faixa
+        em comum, sem repetição, ordenados por consulta e depois por posição.
+        """
+        empty = np.empty(0, dtype=np.int64)
+        if not queries or not self._corpus:
+            return empty, empty
+        qkeys = self.band_keys(queries)
+        valid = np.array([bool(q) for q in queries], dtype=bool)
+        pair_q, pair_id = [], []
+        for band, (sorted_keys, order) in enumerate(self._tables):
+            lo = np.searchsorted(sorted_keys, qkeys[:, band], side="left")
+            hi = np.searchsorted(sorted_keys, qkeys[:, band], side="right")
+            counts = np.where(valid, hi - lo, 0)
+            total = int(counts.sum())
+            if not total:
+                continue
+            # posição de cada par dentro do bucket: lo da consulta + deslocamento 0..count-1
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            pair_q.append(np.repeat(np.arange(len(queries)), counts))
+            pair_id.append(order[np.repeat(lo, counts) + offsets])
+        if not pair_q:
+            return empty, empty
+        combined = np.unique(np.concatenate(pair_q) * self._corpus + np.concatenate(pair_id))
+        return combined // self._corpus, combined % self._corpus
+
+    def candidates(self, queries: list) -> list:
+        """Para cada consulta, as posições (ordenadas) dos títulos do corpus com alguma faixa em comum."""
+        pair_q, pair_id = self.candidate_pairs(queries)
+        return np.split(pair_id, np.searchsorted(pair_q, np.arange(1, len(queries))))
+
+    # ================================
+    # Persistência
+    # ================================
+    def save(self, path: str = None):
+        """Grava o cache de assinaturas (já podado para max_keys títulos)."""
+        path = path or self.path
+        removed = self.prune()
+        if removed:
+            print(f"🧹 Índice LSH: {removed} títulos usados há mais tempo descartados do cache")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # chaves normalizadas não têm "\n": um buffer UTF-8 só, sem pickle
+        blob = np.frombuffer("\n".join(self.keys).encode("utf-8"), dtype=np.uint8)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, keys=blob, band_keys=self._band_keys, last_used=self._last_used,
+                 generation=np.array(self.generation, dtype=np.int64),
+                 params=np.array([self.bands, self.rows, self.shingle, self.seed], dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS,
+             shingle: int = DEFAULT_SHINGLE, seed: int = 1, max_keys: int = DEFAULT_MAX_KEYS) -> "LSHIndex":
+        """Lê o cache de assinaturas do disco; se não existir começa vazio, e se os parâmetros mudaram é refeito."""
+        index = cls(bands, rows, shingle, seed, path=path, max_keys=max_keys)
+        if not os.path.exists(path):
+            return index
+        with np.load(path) as data:
+            keys = bytes(data["keys"]).decode("utf-8").split("\n") if data["keys"].size else []
+            saved = data["params"].tolist()
+            if saved == [bands, rows, shingle, seed]:
+                index.keys = keys
+                index.key_id = {key: i for i, key in enumerate(keys)}
+                index._band_keys = data["band_keys"]
+                if "last_used" in data:
+                    index._last_used = data["last_used"]
+                    index.generation = int(data["generation"])
+                else:
+                    index._last_used = np.zeros(len(keys), dtype=np.int64)
+                return index
+        print(f"♻️ Índice LSH com parâmetros {saved} ≠ {[bands, rows, shingle, seed]}: refazendo {len(keys)} títulos")
+        index.add(keys)
+        return index
+
+def measure_recall(queries: list, choices: list, threshold: float = 85, bands: int = DEFAULT_BANDS,
+                   rows: int = DEFAULT_ROWS, shingle: int = DEFAULT_SHINGLE, workers: int = -1,
+                   exact: tuple = None) -> dict:
+    """
+    Recall do LSH contra o matcher exaustivo: entre as consultas cujo melhor
+    score exaustivo passa do threshold, a fração em que o LSH acha um vídeo
+    com o mesmo score. Consultas e escolhas já normalizadas e únicas.
+
+    exact: (índices, scores) do matcher exaustivo já calculados, para
+    comparar várias configurações sem refazer o cdist completo.
+    """
+    from transform import DEFAULT_BLOCK_SIZE, _best_matches, _best_matches_lsh
+
+    exhaustive_s = None
+    if exact is None:
+        start = time.perf_counter()
+        exact = _best_matches(queries, choices, DEFAULT_BLOCK_SIZE, workers)
+        exhaustive_s = round(time.perf_counter() - start, 3)
+    exact_idx, exact_score = exact
+
+    start = time.perf_counter()
+    index = LSHIndex(bands, rows, shingle)
+    index.build(choices)
+    build_s = time.perf_counter() - start
+    start = time.perf_counter()
+    _, approx, n_candidates = _best_matches_lsh(queries, choices, index, workers, return_counts=True)
+    query_s = time.perf_counter() - start
+
+    relevant = exact_score >= threshold
+    found = relevant & (approx >= exact_score)
+    multi = relevant & np.array([" " in choices[i] for i in exact_idx], dtype=bool)
+    return {
+        "bands": bands,
+        "rows": rows,
+        "queries": len(queries),
+        "choices": len(choices),
+        "relevant": int(relevant.sum()),
+        "recall": round(found.sum() / relevant.sum(), 4) if relevant.any() else None,
+        "recall_multi_word": round((found & multi).sum() / multi.sum(), 4) if multi.any() else None,
+        "mean_candidates": round(float(n_candidates.mean()), 1) if len(queries) else 0.0,
+        "candidate_share": round(float(n_candidates.mean()) / max(1, len(choices)), 5),
+        "exhaustive_s": exhaustive_s,
+        "build_s": round(build_s, 3),
+        "lsh_s": round(query_s, 3),
+    }
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+    from synthetic import SCALES, make_dataset
+    from transform import DEFAULT_BLOCK_SIZE, _best_matches, normalize_key
+
+    parser = argparse.ArgumentParser(description="Recall do índice LSH contra o matcher exaustivo.")
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--threshold", type=float, default=85)
+    parser.add_argument("--bands", type=int, default=DEFAULT_BANDS)
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+    parser.add_argument("--shingle", type=int, default=DEFAULT_SHINGLE)
+    parser.add_argument("--sweep", action="store_true", help="testa várias combinações de bands x rows")
+    args = parser.parse_args()
+
+    tracks, videos = make_dataset(args.scale)
+    queries = sorted({normalize_key(f"{t} {a}") for t, a in zip(tracks["track_name"], tracks["artist_name"])} - {""})
+    choices = sorted({normalize_key(t) for t in videos["title"]} - {""})
+    configs = ([(16, 2), (32, 2), (64, 2), (32, 3), (64, 3), (32, 4), (64, 4)] if args.sweep
+               else [(args.bands, args.rows)])
+    print(f"🔎 {len(queries)} faixas x {len(choices)} títulos únicos, threshold {args.threshold}")
+    start = time.perf_counter()
+    exact = _best_matches(queries, choices, DEFAULT_BLOCK_SIZE, -1)
+    print(f"⏱️ Exaustivo: {time.perf_counter() - start:.2f}s, {int((exact[1] >= args.threshold).sum())} faixas com match")
+    for bands, rows in configs:
+        r = measure_recall(queries, choices, args.threshold, bands, rows, args.shingle, exact=exact)
+        print(f"  bands={bands:<3} rows={rows}  recall {r['recall'] or 0:.1%} "
+              f"(títulos com 2+ palavras {r['recall_multi_word'] or 0:.1%})  "
+              f"candidatos/faixa {r['mean_candidates']:>8.1f} ({r['candidate_share']:.2%})  "
+              f"LSH {r['build_s']:.2f}s índice + {r['lsh_s']:.2f}s consulta")
@@ -0,0 +1,150 @@
+import gzip
+import json
+import os
+
+import numpy as np
+
+# Scores abaixo deste piso não são guardados: um par (faixa, vídeo) já visto
+# e ausente do cache tem score < piso, o que basta enquanto threshold >= piso.
+DEFAULT_FLOOR = 50
+
+# Lotes (um por run) mantidos no arquivo; os mais antigos saem no save()
+DEFAULT_MAX_BATCHES = 30
+
+# Versão do formato do arquivo (1: faixas e títulos vistos em conjuntos separados,
+# sem saber quais pares foram de fato comparados; descartado ao carregar)
+CACHE_FORMAT = 2
+
+class MatchCache:
+    """
+    Cache persistente de scores de similaridade entre faixas e vídeos.
+
+    As chaves são a string normalizada da faixa e o título do vídeo. Além dos
+    pares com score >= floor, o cache guarda quais pares já foram pontuados,
+    para que o próximo run só compare o que é novo: cada merge() registra um
+    lote (os ids dos títulos daquela carga) e cada faixa guarda os lotes
+    contra os quais foi pontuada. Um par só é "já visto" se o título está em
+    um lote da faixa, não basta faixa e título terem aparecido em runs diferentes.
+    Ao salvar, só os max_batches lotes mais recentes ficam (None = todos).
+    """
+
+    def __init__(self, path: str, floor: float = DEFAULT_FLOOR, max_batches: int = DEFAULT_MAX_BATCHES):
+        self.path = path
+        self.floor = floor
+        self.max_batches = max_batches
+        self.key_version = None
+        self.videos = {}   # video_title -> id
+        self.batches = []  # lote -> np.array de ids de títulos pontuados juntos
+        self.tracks = {}   # track_key -> frozenset de lotes
+        self.pairs = {}    # track_key -> {video_title: score}
+        self.last_stats = {"hits": 0, "recomputed": 0}
+
+    @classmethod
+    def load(cls, path: str, floor: float = DEFAULT_FLOOR, max_batches: int = DEFAULT_MAX_BATCHES) -> "MatchCache":
+        """Lê o cache do disco; se não existir, começa vazio."""
+        cache = cls(path, floor=floor, max_batches=max_batches)
+        if not os.path.exists(path):
+            return cache
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != CACHE_FORMAT:
+            print(f"⚠️ Cache de correlação em formato antigo ({path}), recomeçando do zero.")
+            return cache
+        cache.key_version = data.get("key_version")
+        cache.floor = data["floor"]
+        cache.videos = {title: i for i, title in enumerate(data["videos"])}
+        cache.batches = [np.array(ids, dtype=np.int64) for ids in data["batches"]]
+        cache.tracks = {key: frozenset(batches) for key, batches in data["tracks"].items()}
+        for track_key, title, score in data["pairs"]:
+            cache.pairs.setdefault(track_key, {})[title] = score
+        return cache
+
+    def save(self):
+        self.prune()
+        data = {
+            "format": CACHE_FORMAT,
+            "key_version": self.key_version,
+            "floor": self.floor,
+            "videos": list(self.videos),
+            "batches": [ids.tolist() for ids in self.batches],
+            "tracks": {key: sorted(batches) for key, batches in self.tracks.items()},
+            "pairs": [[t, v, s] for t, scores in self.pairs.items() for v, s in scores.items()],
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def ensure_compatible(self, threshold: float, key_version: int):
+        """
+        Zera o cache se as chaves foram geradas por outra versão da normalização
+        ou se o threshold pede scores abaixo do piso, que não foram guardados.
+        """
+        if self.key_version not in (None, key_version):
+            print(f"⚠️ Cache de correlação com chaves v{self.key_version} (atual v{key_version}), recomeçando do zero.")
+            self.clear()
+        if threshold < self.floor:
+            print(f"⚠️ threshold {threshold} abaixo do piso do cache ({self.floor}), recomeçando do zero.")
+            self.floor = threshold
+            self.clear()
+        self.key_version = key_version
+
+    def clear(self):
+        self.tracks.clear()
+        self.videos.clear()
+        self.batches.clear()
+        self.pairs.clear()
+
+    def prune(self, max_batches: int = None) -> int:
+        """
+        Mantém só os max_batches lotes mais recentes. Títulos fora desses lotes,
+        faixas sem nenhum deles e os pares correspondentes saem junto: um par
+        descartado volta a ser pontuado no próximo run. Devolve quantos lotes saíram.
+        """
+        max_batches = self.max_batches if max_batches is None else max_batches
+        if not max_batches or len(self.batches) <= max_batches:
+            return 0
+        dropped = len(self.batches) - max_batches
+        kept = self.batches[dropped:]
+        # ids renumerados na ordem antiga (o id de um título é a sua posição em videos)
+        old_ids = np.unique(np.concatenate(kept))
+        titles = list(self.videos)
+        self.videos = {titles[i]: new_id for new_id, i in enumerate(old_ids)}
+        self.batches = [np.searchsorted(old_ids, ids) for ids in kept]
+        tracks = {key: frozenset(b - dropped for b in batches if b >= dropped) for key, batches in self.tracks.items()}
+        self.tracks = {key: batches for key, batches in tracks.items() if batches}
+        pairs = {key: {title: score for title, score in scores.items() if title in self.videos}
+                 for key, scores in self.pairs.items() if key in self.tracks}
+        self.pairs = {key: scores for key, scores in pairs.items() if scores}
+        return dropped
+
+    def video_ids(self, video_titles) -> np.ndarray:
+        """Ids dos títulos (títulos novos ganham id no fim)."""
+        return np.array([self.videos.setdefault(title, len(self.videos)) for title in video_titles],
+                        dtype=np.int64)
+
+    def covered(self, batches, video_ids: np.ndarray) -> np.ndarray:
+        """Máscara de video_ids já pontuados contra uma faixa com estes lotes."""
+        if not batches:
+            return np.zeros(len(video_ids), dtype=bool)
+        return np.isin(video_ids, np.concatenate([self.batches[b] for b in batches]))
+
+    def merge(self, track_keys, video_titles, new_pairs):
+        """
+        Registra que cada faixa de track_keys foi pontuada contra todos os
+        video_titles (um lote novo) e incorpora os novos pares acima do piso.
+        """
+        self.batches.append(np.unique(self.video_ids(video_titles)))
+        batch = len(self.batches) - 1
+        for track_key in track_keys:
+            self.tracks[track_key] = self.tracks.get(track_key, frozenset()) | {batch}
+        for track_key, title, score in new_pairs:
+            if score >= self.floor:
+                self.pairs.setdefault(track_key, {})[title] = float(score)
+
+    def report(self, hits: int, recomputed: int):
+        self.last_stats = {"hits": hits, "recomputed": recomputed}
+        print(f"♻️ Cache de correlação: {hits} pares reaproveitados, {recomputed} recalculados.")
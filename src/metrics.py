@@ -0,0 +1,185 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+try:
+    import resource  # só existe em Unix
+except ImportError:
+    resource = None
+
+def new_run_id() -> str:
+    """Identificador do run: data/hora UTC + sufixo aleatório (ordena cronologicamente)."""
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:6]}"
+
+def peak_rss_mb():
+    """Pico de memória residente do processo até agora (None fora de Unix)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devolve KB, macOS devolve bytes
+    return round(peak / 2**20 if os.uname().sysname == "Darwin" else peak / 2**10, 1)
+
+class StageSpan:
+    """Medições de uma etapa; quem está dentro do `with` preenche rows_in/rows_out."""
+
+    def __init__(self, name: str, rows_in: int = 0):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = 0
+        self.started_at = None
+        self.wall_s = None
+        self.cpu_s = None
+        self.api_calls = 0
+        self.api_retries = 0
+        self.api_throttled_s = 0.0
+        self.quota_used = None
+        self.peak_rss_mb = None
+        self.status = "running"
+        self.error = None
+
+    @property
+    def rows_per_s(self):
+        rows = self.rows_in or self.rows_out
+        return round(rows / self.wall_s, 1) if self.wall_s else None
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "started_at": self.started_at,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_s": self.rows_per_s,
+            "api_calls": self.api_calls,
+            "api_retries": self.api_retries,
+            "api_throttled_s": self.api_throttled_s,
+            "quota_used": self.quota_used,
+            "peak_rss_mb": self.peak_rss_mb,
+            "status": self.status,
+            "error": self.error,
+        }
+
+# Colunas inteiras de etl_stage_metrics (com nulos)
+STAGE_INT_COLUMNS = ["rows_in", "rows_out", "api_calls", "api_retries", "quota_used"]
+
+class RunMetrics:
+    """
+    Spans por etapa de um run do ETL: tempo de parede e de CPU, linhas de
+    entrada/saída, linhas/s, chamadas às APIs (deltas dos RequestScheduler
+    passados em schedulers) e pico de RSS.
+
+    Etapas podem rodar em threads diferentes ao mesmo tempo (ex.: extração do
+    Spotify e do YouTube); o tempo de CPU é do processo inteiro, então spans
+    simultâneos se sobrepõem. Com profile_stage, a etapa com esse nome roda
+    sob cProfile e o .pstats fica em profile_dir.
+    """
+
+    def __init__(self, run_id: str = None, mode: str = "batch",
+                 profile_stage: str = None, profile_dir: str = ".cache/profiles"):
+        self.run_id = run_id or new_run_id()
+        self.mode = mode
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self.status = "running"
+        self.wall_s = None
+        self.spans = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = 0, schedulers=()):
+        span = StageSpan(name, rows_in)
+        span.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._lock:
+            self.spans.append(span)
+        before = [s.stats() for s in schedulers]
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield span
+            span.status = "ok"
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{e.__class__.__name__}: {e}"[:500]
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            span.wall_s = round(time.perf_counter() - wall, 3)
+            span.cpu_s = round(time.process_time() - cpu, 3)
+            span.peak_rss_mb = peak_rss_mb()
+            for scheduler, old in zip(schedulers, before):
+                new = scheduler.stats()
+                span.api_calls += new["calls"] - old["calls"]
+                span.api_retries += new["retries"] - old["retries"]
+                span.api_throttled_s = round(span.api_throttled_s + new["throttled_s"] - old["throttled_s"], 3)
+                if new["quota_used"] is not None:
+                    span.quota_used = (span.quota_used or 0) + new["quota_used"] - old["quota_used"]
+            print(f"📏 {name}: {span.wall_s:.2f}s parede, {span.cpu_s:.2f}s CPU, "
+                  f"{span.rows_in} → {span.rows_out} linhas, {span.api_calls} chamadas de API")
+            if profiler:
+                self._dump_profile(name, profiler)
+
+    def _dump_profile(self, name: str, profiler: cProfile.Profile):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{self.run_id}-{name}.pstats")
+        profiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+        print(f"🔬 Perfil de {name} salvo em {path}\n{out.getvalue()}")
+
+    def finish(self, status: str = "ok"):
+        self.status = status
+        self.finished_at = datetime.now(timezone.utc)
+        self.wall_s = round(time.perf_counter() - self._start, 3)
+
+    def run_record(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "mode": self.mode,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "finished_at": self.finished_at.isoformat(timespec="seconds") if self.finished_at else None,
+            "status": self.status,
+            "wall_s": self.wall_s if self.wall_s is not None else round(time.perf_counter() - self._start, 3),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def to_frames(self):
+        """(etl_runs, etl_stage_metrics) como DataFrames, nas colunas do schema.sql."""
+        runs = pd.DataFrame([self.run_record()])
+        stages = pd.DataFrame([{"run_id": self.run_id, **span.to_dict()} for span in self.spans])
+        # quota_used é None fora da extração do YouTube: sem Int64 a coluna vira float
+        # e o COPY manda "4.0" para uma coluna INTEGER
+        if not stages.empty:
+            stages = stages.astype({column: "Int64" for column in STAGE_INT_COLUMNS})
+        return runs, stages
+
+    def write_jsonl(self, path: str):
+        """Acrescenta o run (com os spans) como uma linha JSON em path."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        record = {**self.run_record(), "stages": [span.to_dict() for span in self.spans]}
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self):
+        print(f"📊 Run {self.run_id} ({self.status}):")
+        for span in self.spans:
+            print(f"   {span.name:<24} {span.wall_s or 0:>8.2f}s  CPU {span.cpu_s or 0:>7.2f}s  "
+                  f"{span.rows_out:>8} linhas  {span.rows_per_s or 0:>10,.0f}/s  "
+                  f"API {span.api_calls:>4}  RSS {span.peak_rss_mb or 0:>7.1f} MB  {span.status}")
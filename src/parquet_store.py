@@ -0,0 +1,188 @@
+# ==============================================
+# Snapshots Parquet (Arrow) das tabelas processadas
+# ==============================================
+# Cada run do ETL grava spotify_tracks, youtube_videos e correlations em
+#   <PARQUET_STORE_DIR>/<tabela>/run=<run_id>/part-0.parquet
+# com os tipos do db/schema.sql, estreitados pelos de dtypes.py (dicionário
+# para as colunas category, inteiros pequenos). Uma tabela que não mudou no run não ganha
+# arquivo novo: a leitura de um run usa a versão mais recente até ele.
+# A leitura é memory-mapped, com projeção de colunas e filtros empurrados
+# para o Parquet (row groups descartados pelas estatísticas).
+# ==============================================
+
+import argparse
+import os
+import re
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+from dtypes import TABLE_DTYPES, apply_dtypes, category_columns
+from load import schema_statements
+
+load_dotenv()
+
+# Diretório dos snapshots (vazio = desativado no etl_runner)
+PARQUET_STORE_DIR = os.getenv("PARQUET_STORE_DIR", "data/parquet")
+
+STORE_TABLES = ["spotify_tracks", "youtube_videos", "correlations"]
+
+ROW_GROUP_SIZE = 64_000
+
+# Tipos SQL do schema.sql → tipos Arrow
+SQL_TO_ARROW = {
+    "TEXT": pa.string(),
+    "INTEGER": pa.int32(),
+    "SERIAL": pa.int32(),
+    "BIGINT": pa.int64(),
+    "DOUBLE PRECISION": pa.float64(),
+    "DATE": pa.date32(),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+}
+
+# dtypes compactos de dtypes.py → tipos Arrow (datetime fica com o TIMESTAMP do SQL)
+DTYPE_TO_ARROW = {
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "int8": pa.int8(),
+    "int16": pa.int16(),
+    "int32": pa.int32(),
+    "int64": pa.int64(),
+    "float32": pa.float32(),
+}
+
+_COLUMN = re.compile(rf"^\s*(\w+)\s+({'|'.join(SQL_TO_ARROW)})\b", re.MULTILINE)
+
+def arrow_schema(table_name: str) -> pa.Schema:
+    """Schema Arrow com as colunas do schema.sql e os tipos compactos de dtypes.py."""
+    create_table, _ = schema_statements(table_name)
+    compact = TABLE_DTYPES.get(table_name, {})
+    return pa.schema([(name, DTYPE_TO_ARROW.get(compact.get(name), SQL_TO_ARROW[sql_type]))
+                      for name, sql_type in _COLUMN.findall(create_table)])
+
+def _to_arrow(df: pd.DataFrame, table_name: str, schema: pa.Schema) -> pa.Table:
+    """Converte as colunas do DataFrame presentes no schema para os tipos dele."""
+    if df.empty:
+        # ex.: correlate_music_video sem nenhum match devolve DataFrame sem colunas
+        return schema.empty_table()
+    fields = [field for field in schema if field.name in df.columns]
+    df = apply_dtypes(df[[field.name for field in fields]], table_name)
+    for field in fields:
+        if pa.types.is_timestamp(field.type):
+            # ISO 8601 das APIs ou TIMESTAMP sem fuso do banco: tudo vira UTC
+            df[field.name] = pd.to_datetime(df[field.name], utc=True, format="ISO8601")
+    return pa.Table.from_pandas(df, schema=pa.schema(fields), preserve_index=False)
+
+def _run_path(table_name: str, run_id: str, base_dir: str) -> str:
+    return os.path.join(base_dir, table_name, f"run={run_id}", "part-0.parquet")
+
+def write_snapshot(chunks, table_name: str, run_id: str, base_dir: str = None) -> int:
+    """
+    Grava o snapshot de uma tabela para o run. chunks é um DataFrame ou um
+    iterador de DataFrames (ex.: pd.read_sql(..., chunksize=...)), escritos
+    um a um: a memória depende do chunk, não da tabela.
+
+    O arquivo só aparece no caminho final completo (tmp + rename).
+    """
+    base_dir = base_dir or PARQUET_STORE_DIR
+    if isinstance(chunks, pd.DataFrame):
+        chunks = [chunks]
+    path = _run_path(table_name, run_id, base_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    schema = arrow_schema(table_name)
+
+    start = time.perf_counter()
+    rows, writer = 0, None
+    try:
+        for chunk in chunks:
+            table = _to_arrow(chunk, table_name, schema)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression="zstd")
+            writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+            rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        return 0
+    os.replace(tmp_path, path)
+    print(f"🧊 Parquet {table_name} (run {run_id}): {rows} registros em {time.perf_counter() - start:.2f}s")
+    return rows
+
+def list_runs(table_name: str, base_dir: str = None) -> list:
+    """run_ids com snapshot da tabela, do mais antigo ao mais recente."""
+    directory = os.path.join(base_dir or PARQUET_STORE_DIR, table_name)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[len("run="):] for name in os.listdir(directory)
+                  if name.startswith("run=") and os.path.exists(os.path.join(directory, name, "part-0.parquet")))
+
+def latest_run(base_dir: str = None):
+    """Run mais recente com algum snapshot (de qualquer tabela); None se não houver."""
+    runs = [run for table in STORE_TABLES for run in list_runs(table, base_dir)]
+    return max(runs) if runs else None
+
+def resolve_run(table_name: str, run_id: str = None, base_dir: str = None) -> str:
+    """Versão da tabela vista pelo run: o snapshot mais recente até run_id (ou o último)."""
+    runs = [run for run in list_runs(table_name, base_dir) if run_id is None or run <= run_id]
+    if not runs:
+        raise FileNotFoundError(f"Nenhum snapshot Parquet de {table_name}"
+                                + (f" até o run {run_id}" if run_id else ""))
+    return runs[-1]
+
+def table_versions(run_id: str = None, base_dir: str = None) -> tuple:
+    """
+    Versão de cada tabela de STORE_TABLES vista pelo run (None = sem snapshot).
+    As tabelas de um run são gravadas uma a uma: o run_id mais recente só diz
+    que o run começou, a tupla muda a cada tabela que chega.
+    """
+    versions = []
+    for table_name in STORE_TABLES:
+        try:
+            versions.append(resolve_run(table_name, run_id, base_dir))
+        except FileNotFoundError:
+            versions.append(None)
+    return tuple(versions)
+
+def read_table(table_name: str, run_id: str = None, columns=None, filters=None,
+               base_dir: str = None) -> pa.Table:
+    """
+    Lê o snapshot (memory-mapped) só com as colunas pedidas. filters segue o
+    formato do pyarrow, ex.: [("region", "in", ["BR", "US"]), ("popularity", ">=", 70)].
+    As colunas category de dtypes.py chegam como dicionário (viram category no pandas).
+    """
+    base_dir = base_dir or PARQUET_STORE_DIR
+    path = _run_path(table_name, resolve_run(table_name, run_id, base_dir), base_dir)
+    return pq.read_table(path, columns=list(columns) if columns else None,
+                         filters=filters or None, memory_map=True,
+                         read_dictionary=category_columns(table_name))
+
+def read_frame(table_name: str, run_id: str = None, columns=None, filters=None,
+               base_dir: str = None) -> pd.DataFrame:
+    """read_table como DataFrame, já com os dtypes compactos de dtypes.py."""
+    return apply_dtypes(read_table(table_name, run_id, columns, filters, base_dir).to_pandas(), table_name)
+
+def reprocess_correlations(threshold: int = 85, run_id: str = None, base_dir: str = None, **kwargs) -> pd.DataFrame:
+    """Refaz correlate_music_video a partir dos snapshots, sem API nem banco."""
+    from transform import correlate_music_video
+
+    spotify_df = read_frame("spotify_tracks", run_id, ["track_id", "track_name", "artist_name", "region"], base_dir=base_dir)
+    youtube_df = read_frame("youtube_videos", run_id, ["video_id", "title", "region"], base_dir=base_dir)
+    return correlate_music_video(spotify_df, youtube_df, threshold=threshold, **kwargs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reprocessa as correlações a partir dos snapshots Parquet.")
+    parser.add_argument("--threshold", type=int, default=85)
+    parser.add_argument("--run", help="run_id (padrão: o mais recente)")
+    parser.add_argument("--method", default="batched")
+    parser.add_argument("--output", help="grava o resultado como snapshot deste run_id")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    corr = reprocess_correlations(args.threshold, args.run, method=args.method)
+    print(f"🔗 {len(corr)} correlações com threshold {args.threshold} em {time.perf_counter() - start:.2f}s")
+    if args.output:
+        write_snapshot(corr, "correlations", args.output)
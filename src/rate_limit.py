@@ -0,0 +1,165 @@
+import random
+import socket
+import threading
+import time
+
+import httplib2
+import requests
+
+# Status HTTP que valem nova tentativa (throttling e falhas transitórias do servidor)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Motivos de 403 do YouTube que são limite de taxa (quotaExceeded é a cota diária: não adianta repetir)
+RETRYABLE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+# Falhas de rede que valem nova tentativa: as do spotipy (requests) e as do
+# googleapiclient (httplib2/socket) não herdam de ConnectionError/TimeoutError
+RETRYABLE_ERRORS = (
+    ConnectionError, TimeoutError, socket.timeout,
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+    httplib2.HttpLib2Error,
+)
+
+class QuotaExceeded(Exception):
+    """Orçamento de cota do run esgotado; a chamada nem chega a ser feita."""
+
+class TokenBucket:
+    """
+    Token bucket thread-safe: até `burst` chamadas seguidas e `rate` por segundo
+    em regime. pause() bloqueia todas as threads (ex.: Retry-After do servidor).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Espera até haver tokens; devolve o tempo total de espera em segundos."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = max(self.paused_until - now, 0.0)
+                if not wait:
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        return waited
+                    wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class QuotaBudget:
+    """Unidades de cota que um run pode gastar (ex.: cada videos().list custa 1 no YouTube)."""
+
+    def __init__(self, units: int):
+        self.units = units
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def consume(self, cost: int):
+        with self._lock:
+            if self.used + cost > self.units:
+                raise QuotaExceeded(f"cota do run esgotada ({self.used}/{self.units} unidades)")
+            self.used += cost
+
+    @property
+    def remaining(self) -> int:
+        return self.units - self.used
+
+def retry_info(error: Exception):
+    """
+    Classifica um erro dos clientes de API. Retorna (repetir?, retry_after em s ou None).
+
+    Funciona por duck typing: SpotifyException tem http_status/headers,
+    HttpError do googleapiclient tem resp (status + headers em minúsculas).
+    """
+    status, headers, reason = None, {}, ""
+    if hasattr(error, "http_status"):
+        status, headers = error.http_status, error.headers or {}
+    elif getattr(error, "resp", None) is not None:
+        status, headers = error.resp.status, error.resp
+        reason = getattr(error, "reason", "") or ""
+        if status == 403:
+            details = getattr(error, "error_details", None) or []
+            reason = " ".join([str(d.get("reason", "")) for d in details if isinstance(d, dict)] + [reason])
+    elif isinstance(error, RETRYABLE_ERRORS):
+        return True, None
+    else:
+        return False, None
+
+    retry_after = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        retry_after = float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        retry_after = None
+
+    if status in RETRYABLE_STATUS:
+        return True, retry_after
+    if status == 403 and any(r in reason for r in RETRYABLE_REASONS):
+        return True, retry_after
+    return False, None
+
+class RequestScheduler:
+    """
+    Agendador compartilhado das chamadas a uma API: token bucket para a taxa,
+    orçamento de cota por run e retry com backoff exponencial + jitter que
+    respeita Retry-After. Use call(fn, *args, cost=..., **kwargs).
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, quota: int = None,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.budget = QuotaBudget(quota) if quota else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.calls = 0
+        self.retries = 0
+        self.throttled_s = 0.0
+        self._lock = threading.Lock()
+
+    def call(self, fn, *args, cost: int = 1, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            waited = self.bucket.acquire()
+            if self.budget is not None:
+                self.budget.consume(cost)
+            with self._lock:
+                self.calls += 1
+                self.throttled_s += waited
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                retryable, retry_after = retry_info(e)
+                if not retryable or attempt == self.max_retries:
+                    raise
+                if retry_after is not None:
+                    # o servidor pediu pausa: vale para todas as threads desta API
+                    delay = retry_after
+                    self.bucket.pause(delay)
+                else:
+                    # backoff exponencial com "full jitter"
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                with self._lock:
+                    self.retries += 1
+                print(f"🔁 {self.name}: tentativa {attempt + 1} falhou ({e.__class__.__name__}), "
+                      f"nova tentativa em {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "throttled_s": round(self.throttled_s, 3),
+            "quota_used": self.budget.used if self.budget else None,
+        }
@@ -2,25 +2,20 @@ import pandas as pd
 from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 import os
+import sys
 
 # Importar funções do projeto
 from extract_spotify import extract_spotify_tracks
 from extract_youtube import extract_youtube_videos
-from transform import correlate_music_video
+from transform import correlate_music_video, normalize_key
+from match_cache import MatchCache
+from clients import get_engine
 
 # ========================
 # Configuração
 # ========================
 load_dotenv()
 
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "spotify_youtube")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
-
-engine = create_engine(f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-
 # ========================
 # Testes
 # ========================
@@ -40,6 +35,66 @@ def test_youtube_extraction():
     assert df["view_count"].ge(0).all(), "❌ Views inválidos encontrados"
     print("✅ Teste YouTube passou")
 
+def test_paginated_extraction():
+    import tempfile
+    import clients
+    import extract_spotify
+    import extract_youtube
+    from landing import Landing, list_regions, list_runs, prune_runs
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+    from fakes import FakeSpotify, FakeYouTube
+    from synthetic import make_dataset
+
+    # ~200 faixas por playlist (2 páginas de 100) e ~250 vídeos por chart (5 páginas de 50);
+    # cada página repete os 3 últimos itens da anterior, como numa lista que muda no meio da leitura
+    tracks, videos = make_dataset(n_tracks=1000, n_videos=1000)
+    fake_sp = FakeSpotify.from_tracks(tracks, extract_spotify.REGIONS, overlap=3)
+    fake_yt = FakeYouTube(videos, overlap=3)
+    clients.use_clients(spotify=fake_sp, youtube=fake_yt)
+    try:
+        landing = Landing("run-1", tempfile.mkdtemp())
+        sp = extract_spotify.extract_spotify_tracks(max_workers=2, landing=landing)
+        yt = extract_youtube.extract_youtube_videos(max_workers=2, landing=landing)
+        assert len(sp) == tracks["region"].isin(list(extract_spotify.REGIONS)).sum(), "❌ Faltaram páginas do Spotify"
+        assert len(yt) == videos["region"].isin(extract_youtube.REGIONS).sum(), "❌ Faltaram páginas do YouTube"
+        assert not sp.duplicated(list(extract_spotify.TRACK_KEY)).any(), "❌ Faixa repetida entre páginas"
+        assert not yt.duplicated(list(extract_youtube.VIDEO_KEY)).any(), "❌ Vídeo repetido entre páginas"
+        streamed = [row for page in extract_spotify.iter_spotify_tracks() for row in page]
+        assert len(streamed) == len(sp), "❌ Extração em streaming repetiu faixas"
+
+        # replay da landing zone: mesmos DataFrames, sem nenhuma chamada às APIs
+        assert list_regions("youtube", "run-1", landing.base_dir) == sorted(extract_youtube.REGIONS)
+        fake_sp.calls = fake_yt.calls = 0
+        replay_sp = extract_spotify.replay_spotify_tracks("run-1", max_workers=4, base_dir=landing.base_dir)
+        replay_yt = extract_youtube.replay_youtube_videos("run-1", max_workers=4, base_dir=landing.base_dir)
+        pd.testing.assert_frame_equal(replay_sp, sp)
+        pd.testing.assert_frame_equal(replay_yt, yt)
+        streamed = extract_youtube.iter_replay_youtube_videos("run-1", landing.base_dir)
+        assert sum(len(page) for page in streamed) == len(yt), "❌ Replay em streaming incompleto"
+        assert fake_sp.calls == fake_yt.calls == 0, "❌ Replay chamou as APIs"
+        assert extract_spotify.replay_spotify_tracks("run-2", base_dir=landing.base_dir) is None, \
+            "❌ Run sem respostas gravadas deveria voltar None"
+
+        # retenção: um run mais antigo e um interrompido (só o .tmp) saem, o atual fica
+        with Landing("run-0", landing.base_dir).partition("youtube", "BR") as land:
+            land({"items": []})
+        os.makedirs(os.path.join(landing.base_dir, "youtube", "region=XX", "run=run-05"))
+        assert prune_runs(1, current="run-1", base_dir=landing.base_dir) == ["run-0", "run-05"], \
+            "❌ Retenção da landing zone não apagou os runs antigos"
+        assert list_runs(landing.base_dir) == ["run-1"] and prune_runs(1, "run-1", landing.base_dir) == []
+        assert not os.path.exists(os.path.join(landing.base_dir, "youtube", "region=XX"))
+
+        fake_sp.calls = fake_yt.calls = 0
+        popularity = extract_spotify.refresh_spotify_stats(sp["track_id"])
+        stats = extract_youtube.refresh_youtube_stats(yt["video_id"])
+        assert set(popularity["track_id"]) == set(sp["track_id"]), "❌ Refresh de popularidade incompleto"
+        assert set(stats["video_id"]) == set(yt["video_id"]), "❌ Refresh de métricas do YouTube incompleto"
+        assert fake_sp.calls == -(-sp["track_id"].nunique() // 50), "❌ sp.tracks não foi chamado em lotes de 50"
+        assert fake_yt.calls == -(-yt["video_id"].nunique() // 50), "❌ videos().list(id=...) não usou lotes de 50"
+    finally:
+        clients.reset_clients()
+    print("✅ Teste extração paginada, landing zone/replay e refresh de métricas passou")
+
 def test_correlation():
     sp = extract_spotify_tracks()
     yt = extract_youtube_videos()
@@ -56,8 +111,269 @@ def test_correlation():
     assert corr["similarity_score"].between(0, 100).all(), "❌ Similaridade fora da faixa (0-100)"
     print("✅ Teste Correlação passou")
 
+def test_correlation_engines():
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sp = pd.read_csv(os.path.join(base, "spotify_tracks.csv"))
+    yt = pd.read_csv(os.path.join(base, "youtube_videos.csv"))
+    for threshold in (0, 50, 85):
+        legacy = correlate_music_video(sp, yt, threshold=threshold, method="legacy")
+        batched = correlate_music_video(sp, yt, threshold=threshold, method="batched", normalize=False)
+        pd.testing.assert_frame_equal(legacy, batched)
+    print("✅ Teste motores de correlação passou")
+
+def test_match_key_normalization():
+    assert normalize_key("Proibido Terminar (Ao Vivo) | BraZa") == "proibido terminar"
+    assert normalize_key("Canção ft. Anitta (Official Video)") == "cancao anitta"
+    # mesma faixa em várias regiões resolve pelo hash join com o mesmo vídeo
+    sp = pd.DataFrame({
+        "track_id": ["t1", "t1"], "track_name": ["Canção", "Canção"],
+        "artist_name": ["Anitta", "Anitta"], "region": ["BR", "PT"]
+    })
+    yt = pd.DataFrame({
+        "video_id": ["v1"], "title": ["Anitta - Cançao (Official Video) | Anitta"], "region": ["BR"]
+    })
+    corr = correlate_music_video(sp, yt, threshold=85)
+    assert corr["video_id"].tolist() == ["v1", "v1"], "❌ Match normalizado não encontrado"
+    assert corr["region_spotify"].tolist() == ["BR", "PT"], "❌ Regiões não replicadas"
+    print("✅ Teste normalização de chaves passou")
+
+def test_correlation_cache():
+    import tempfile
+
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sp = pd.read_csv(os.path.join(base, "spotify_tracks.csv"))
+    yt = pd.read_csv(os.path.join(base, "youtube_videos.csv"))
+    tmp = tempfile.TemporaryDirectory()
+    cache = MatchCache(os.path.join(tmp.name, "match_cache.json.gz"))
+    # segundo run com metade dos vídeos novos: só esses pares são recalculados
+    runs = [(sp, yt.iloc[:100]), (sp, yt)]
+    for s, y in runs:
+        cached = correlate_music_video(s, y, threshold=60, cache=cache)
+        pd.testing.assert_frame_equal(cached, correlate_music_video(s, y, threshold=60))
+    assert cache.last_stats["hits"] > 0, "❌ Cache de correlação não foi reaproveitado"
+
+    # faixa e vídeo vistos em runs diferentes não formam um par já pontuado
+    def tracks(name):
+        return pd.DataFrame({"track_id": [name], "track_name": [name], "artist_name": ["Banda"], "region": ["BR"]})
+
+    def videos(title):
+        return pd.DataFrame({"video_id": [title], "title": [title], "region": ["BR"]})
+
+    cache = MatchCache(os.path.join(tmp.name, "match_cache_pairs.json.gz"))
+    for s, y in [(tracks("Aurora Boreal"), videos("Xadrez Antigo")),
+                 (tracks("Brisa do Mar"), videos("Aurora Boreal Banda Clipe Novo")),
+                 (tracks("Aurora Boreal"), videos("Aurora Boreal Banda Clipe Novo"))]:
+        cached = correlate_music_video(s, y, threshold=60, cache=cache)
+        pd.testing.assert_frame_equal(cached, correlate_music_video(s, y, threshold=60))
+    assert len(cached) == 1, "❌ Par nunca comparado foi tratado como já pontuado"
+
+    # retenção: ao salvar só ficam os max_batches runs mais recentes
+    path = os.path.join(tmp.name, "match_cache_keep.json.gz")
+    cache = MatchCache(path, max_batches=1)
+    correlate_music_video(tracks("Aurora Boreal"), videos("Xadrez Antigo"), threshold=60, cache=cache)
+    correlate_music_video(tracks("Brisa do Mar"), videos("Brisa do Mar Banda Ao Vivo"), threshold=60, cache=cache)
+    cache.save()
+    loaded = MatchCache.load(path, max_batches=1)
+    kept = list(loaded.videos) + list(loaded.tracks)
+    assert len(loaded.batches) == 1 and len(kept) == 2 and all(key.startswith("brisa do mar") for key in kept), \
+        "❌ Cache de correlação manteve runs além de max_batches"
+    cached = correlate_music_video(tracks("Brisa do Mar"), videos("Brisa do Mar Banda Ao Vivo"), threshold=60, cache=loaded)
+    assert loaded.last_stats["hits"] == 1 and len(cached) == 1, "❌ Poda descartou o run mais recente"
+    tmp.cleanup()
+    print("✅ Teste cache de correlação passou")
+
+def test_lsh_index():
+    import tempfile
+    from lsh_index import LSHIndex
+
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sp = pd.read_csv(os.path.join(base, "spotify_tracks.csv"))
+    yt = pd.read_csv(os.path.join(base, "youtube_videos.csv"))
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "lsh_index.npz")
+    index = LSHIndex(path=path)
+    correlate_music_video(sp, yt.iloc[:100], threshold=60, method="lsh", lsh_index=index)
+    before = len(index)
+    assert index.add(yt["title"].iloc[:100].map(normalize_key)) == 0, "❌ Índice LSH reindexou títulos já vistos"
+    index.save()
+    loaded = LSHIndex.load(path)
+    approx = correlate_music_video(sp, yt, threshold=60, method="lsh", lsh_index=loaded)
+    assert len(loaded) > before, "❌ Índice LSH não recebeu os vídeos novos"
+    # títulos de runs antigos não entram na busca, e o cache é podado pelos usados há mais tempo
+    current = yt["title"].iloc[100:].map(normalize_key).tolist()
+    loaded.build(current)
+    assert loaded.candidate_pairs(current)[1].max() < len(current), "❌ Busca LSH fora do corpus atual"
+    assert loaded.prune(len(set(current))) > 0 and set(current) - {""} <= set(loaded.keys), \
+        "❌ Poda do cache LSH descartou títulos em uso"
+    # o LSH só pontua um subconjunto dos vídeos: nunca supera o score do exaustivo
+    exact = correlate_music_video(sp, yt, threshold=60)
+    both = approx.merge(exact, on=["track_id", "region_spotify"], suffixes=("_lsh", "_exact"))
+    assert len(both) == len(approx), "❌ LSH achou match que o matcher exaustivo não acha"
+    assert (both["similarity_score_lsh"] <= both["similarity_score_exact"]).all(), "❌ Score LSH acima do exaustivo"
+    tmp.cleanup()
+    print(f"✅ Teste índice LSH passou ({len(approx)} de {len(exact)} correlações)")
+
+def test_compact_dtypes():
+    from dtypes import apply_dtypes, memory_report
+
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sp = pd.read_csv(os.path.join(base, "spotify_tracks.csv"))
+    yt = pd.read_csv(os.path.join(base, "youtube_videos.csv"))
+    sp_compact, yt_compact = apply_dtypes(sp, "spotify_tracks"), apply_dtypes(yt, "youtube_videos")
+    assert sp_compact["region"].dtype == "category" and sp_compact["popularity"].dtype == "int8"
+    assert str(yt_compact["published_at"].dt.tz) == "UTC", "❌ published_at não virou datetime UTC"
+    report = memory_report({"spotify_tracks": sp, "youtube_videos": yt})
+    assert (report["bytes_after"] < report["bytes_before"]).all(), "❌ Tipos compactos não reduziram memória"
+    # a correlação não muda com os tipos compactos
+    pd.testing.assert_frame_equal(correlate_music_video(sp_compact, yt_compact, threshold=60),
+                                  correlate_music_video(sp, yt, threshold=60), check_dtype=False)
+    print("✅ Teste tipos compactos passou")
+
+def test_dashboard_queries():
+    from dashboard import queries
+
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sp = pd.read_csv(os.path.join(base, "spotify_tracks.csv"))
+    yt = pd.read_csv(os.path.join(base, "youtube_videos.csv"))
+    mem = create_engine("sqlite://")
+    sp.to_sql("spotify_tracks", mem, index=False)
+    yt.to_sql("youtube_videos", mem, index=False)
+
+    f = queries.Filters(regions=("BR", "US"), categories=("Music",), views=(0, 10**7))
+    expected = yt[yt["region"].isin(["BR", "US"]) & (yt["category"] == "Music") & yt["view_count"].between(0, 10**7)]
+    by_region = queries.youtube_views_by_region(mem, f).set_index("region")["view_count"]
+    assert by_region.to_dict() == expected.groupby("region")["view_count"].sum().to_dict(), "❌ Agregação SQL divergente"
+    assert queries.youtube_kpis(mem, f)["videos"] == expected["video_id"].nunique(), "❌ KPI SQL divergente"
+
+    # rollups do ETL respondem igual às tabelas brutas
+    from load import refresh_rollups
+    raw = create_engine("sqlite://")
+    sp.to_sql("spotify_tracks", raw, index=False)
+    yt.to_sql("youtube_videos", raw, index=False)
+    refresh_rollups("spotify_tracks", mem)
+    refresh_rollups("youtube_videos", mem)
+    for f in (queries.Filters(), queries.Filters(regions=("BR",), categories=("Music",), years=(2020, 2025))):
+        assert queries.spotify_rollup_ok(f) and queries.youtube_rollup_ok(f)
+        pd.testing.assert_frame_equal(queries.spotify_histogram(mem, f, "popularity"),
+                                      queries.spotify_histogram(raw, f, "popularity"), check_dtype=False)
+        pd.testing.assert_frame_equal(queries.youtube_views_by_region(mem, f),
+                                      queries.youtube_views_by_region(raw, f), check_dtype=False)
+        assert (queries.youtube_kpis(mem, f).astype(int) == queries.youtube_kpis(raw, f).astype(int)).all(), \
+            "❌ KPI do rollup divergente"
+    print("✅ Teste consultas do dashboard passou")
+
+def test_parquet_store():
+    import tempfile
+    import parquet_store
+    from dashboard import queries, parquet_queries
+
+    base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sp = pd.read_csv(os.path.join(base, "spotify_tracks.csv"))
+    yt = pd.read_csv(os.path.join(base, "youtube_videos.csv"))
+    store = tempfile.mkdtemp()
+    parquet_store.write_snapshot(sp, "spotify_tracks", "run-1", base_dir=store)
+    parquet_store.write_snapshot(yt, "youtube_videos", "run-1", base_dir=store)
+    # run sem mudança no Spotify: continua lendo o snapshot do run anterior
+    parquet_store.write_snapshot(yt.iloc[:100], "youtube_videos", "run-2", base_dir=store)
+    assert parquet_store.resolve_run("spotify_tracks", "run-2", base_dir=store) == "run-1"
+
+    filtered = parquet_store.read_frame("youtube_videos", "run-1", ["video_id", "view_count"],
+                                        [("region", "in", ["BR"]), ("view_count", ">=", 10**5)], base_dir=store)
+    expected = yt[(yt["region"] == "BR") & (yt["view_count"] >= 10**5)]
+    assert list(filtered.columns) == ["video_id", "view_count"], "❌ Projeção de colunas ignorada"
+    assert sorted(filtered["video_id"]) == sorted(expected["video_id"]), "❌ Filtro do Parquet divergente"
+
+    # backend Parquet do dashboard devolve o mesmo que o SQL
+    mem = create_engine("sqlite://")
+    sp.to_sql("spotify_tracks", mem, index=False)
+    yt.to_sql("youtube_videos", mem, index=False)
+    # parquet_queries com run_id lê do diretório padrão do parquet_store
+    default_dir, parquet_store.PARQUET_STORE_DIR = parquet_store.PARQUET_STORE_DIR, store
+    try:
+        f = queries.Filters(regions=("BR", "US"), categories=("Music",), views=(0, 10**7))
+        pd.testing.assert_frame_equal(queries.youtube_views_by_region(mem, f),
+                                      parquet_queries.youtube_views_by_region("run-1", f), check_dtype=False)
+        assert queries.filter_options(mem) == parquet_queries.filter_options("run-1"), "❌ Opções dos filtros divergentes"
+
+        # cache Arrow do dashboard: mesmos resultados, troca de run sem perder o anterior
+        from dashboard.dataset_cache import DatasetCache
+        cache = DatasetCache(base_dir=store, refresh_s=0)
+        old = cache.current()
+        assert old.run_id == "run-2" and cache.current() is old, "❌ Cache Arrow recarregou sem run novo"
+        pd.testing.assert_frame_equal(parquet_queries.youtube_views_by_region(old, f),
+                                      parquet_queries.youtube_views_by_region("run-2", f))
+        parquet_store.write_snapshot(yt, "youtube_videos", "run-3", base_dir=store)
+        new = cache.current()
+        assert new.run_id == "run-3", "❌ Cache Arrow não trocou para o run novo"
+        assert len(old.read_frame("youtube_videos")) == 100, "❌ Run antigo mudou depois da troca"
+        pd.testing.assert_frame_equal(parquet_queries.youtube_views_by_region(new, f),
+                                      parquet_queries.youtube_views_by_region("run-1", f))
+        # o ETL grava uma tabela por vez: a que chega depois no mesmo run também troca o cache
+        parquet_store.write_snapshot(sp, "spotify_tracks", "run-4", base_dir=store)
+        partial = cache.current()
+        assert partial.run_id == "run-4" and len(partial.read_frame("youtube_videos")) == len(yt)
+        parquet_store.write_snapshot(yt.iloc[:10], "youtube_videos", "run-4", base_dir=store)
+        assert len(cache.current().read_frame("youtube_videos")) == 10, \
+            "❌ Cache Arrow ficou com a tabela do run anterior"
+    finally:
+        parquet_store.PARQUET_STORE_DIR = default_dir
+    print("✅ Teste snapshots Parquet passou")
+
+def test_run_metrics():
+    from metrics import RunMetrics
+    from rate_limit import RequestScheduler
+
+    scheduler = RequestScheduler("Teste", rate=1000, burst=1000, quota=100)
+    metrics = RunMetrics(mode="test")
+    with metrics.stage("extract", schedulers=[scheduler]) as span:
+        for _ in range(3):
+            scheduler.call(lambda: None, cost=2)
+        span.rows_out = 10
+    try:
+        with metrics.stage("load", rows_in=10):
+            raise RuntimeError("falha simulada")
+    except RuntimeError:
+        pass
+    metrics.finish("error")
+    runs, stages = metrics.to_frames()
+    extract, load = stages.to_dict("records")
+    assert (extract["api_calls"], extract["quota_used"], extract["rows_out"]) == (3, 6, 10), "❌ Span de extração incorreto"
+    assert load["status"] == "error" and "falha simulada" in load["error"], "❌ Erro da etapa não registrado"
+    assert runs.loc[0, "status"] == "error"
+    # COPY para colunas INTEGER: sem "6.0" quando outra etapa não tem quota_used
+    assert ",6," in stages.to_csv(index=False), "❌ quota_used não saiu como inteiro"
+    print("✅ Teste métricas do run passou")
+
+def test_dag_resume():
+    import tempfile
+    from dag import CheckpointStore, DagRunner, Stage
+
+    calls = []
+    def stage(name, fail=False):
+        def fn(**inputs):
+            calls.append(name)
+            if fail:
+                raise RuntimeError(f"falha em {name}")
+            return pd.DataFrame({"n": [len(inputs)]})
+        return fn
+
+    store = CheckpointStore(tempfile.mkdtemp(), "run-1")
+    dag = [Stage("a", stage("a")), Stage("b", stage("b")), Stage("c", stage("c", fail=True), ["a", "b"])]
+    try:
+        DagRunner(dag, store).run()
+        raise AssertionError("❌ Falha da etapa não foi propagada")
+    except RuntimeError:
+        pass
+    # retomada: a e b vêm do checkpoint, só c roda de novo
+    calls.clear()
+    dag[2] = Stage("c", stage("c"), ["a", "b"])
+    outputs = DagRunner(dag, store).run(resume=True)
+    assert calls == ["c"], f"❌ Etapas refeitas na retomada: {calls}"
+    assert outputs["c"]["n"].tolist() == [2], "❌ Entradas do checkpoint não chegaram à etapa"
+    print("✅ Teste DAG com checkpoint passou")
+
 def test_database_load():
-    with engine.connect() as conn:
+    with get_engine().connect() as conn:
         tables = ["spotify_tracks", "youtube_videos", "correlations"]
         for table in tables:
             result = conn.execute(text(f"SELECT COUNT(*) FROM {table}"))
@@ -65,6 +381,19 @@ def test_database_load():
             assert count > 0, f"❌ Tabela {table} está vazia"
             print(f"✅ Tabela {table} carregada com {count} registros")
 
+def test_trgm_match_key():
+    from trgm_match import ensure_trgm
+
+    # match_key (SQL) tem que gerar a mesma chave que normalize_key
+    samples = ["Anitta - Envolver (Official Video)", "Pedro Sampaio | Canal", "Ela É Demais [Ao Vivo]",
+               "Bad Bunny ft. Jhay Cortez - Dákiti", "AURORA_Runaway (Lyrics)"]
+    with get_engine().begin() as conn:
+        ensure_trgm(conn)
+        for sample in samples:
+            key = conn.execute(text("SELECT match_key(:s)"), {"s": sample}).scalar()
+            assert key == normalize_key(sample), f"❌ match_key({sample!r}) = {key!r} ≠ {normalize_key(sample)!r}"
+    print("✅ Teste match_key do pg_trgm passou")
+
 # ========================
 # Runner
 # ========================
@@ -73,8 +402,19 @@ def run_all_tests():
     print("🚀 Iniciando testes...\n")
     test_spotify_extraction()
     test_youtube_extraction()
+    test_paginated_extraction()
     test_correlation()
+    test_correlation_engines()
+    test_match_key_normalization()
+    test_correlation_cache()
+    test_lsh_index()
+    test_compact_dtypes()
+    test_dashboard_queries()
+    test_parquet_store()
+    test_run_metrics()
+    test_dag_resume()
     test_database_load()
+    test_trgm_match_key()
     print("\n🎉 Todos os testes passaram com sucesso!")
 
 if __name__ == "__main__":
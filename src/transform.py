@@ -1,23 +1,88 @@
+import re
+import unicodedata
+
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
+
+from lsh_index import LSHIndex
+from match_cache import MatchCache
+
+# Quantidade de faixas pontuadas por vez no motor em lote
+# (cada bloco gera uma matriz block_size × n_videos de float64)
+DEFAULT_BLOCK_SIZE = 512
 
-def correlate_music_video(spotify_df: pd.DataFrame, youtube_df: pd.DataFrame, threshold: int = 85) -> pd.DataFrame:
+# Versão das chaves de match; muda sempre que normalize_key mudar,
+# para invalidar caches com scores calculados sobre chaves antigas
+MATCH_KEY_VERSION = 2
+RAW_KEY_VERSION = 1
+
+# Ruído comum em títulos de vídeo: "(Official Video)", "[Ao Vivo]", "(Com Letra)"...
+_NOISE_BRACKETS = re.compile(
+    r"[\(\[][^\)\]]*\b(official|oficial|video|videoclipe|clipe|lyrics?|letra|ao vivo|en vivo|"
+    r"live|audio|visualizer|mv)\b[^\)\]]*[\)\]]"
+)
+_FEAT = re.compile(r"\b(ft|feat|featuring)\b\.?")
+_NON_WORD = re.compile(r"[\W_]+")
+
+def normalize_key(text) -> str:
+    """
+    Chave de match normalizada: sem acentos, casefold, sem sufixo "| Canal",
+    sem marcações como "(Official Video)"/"(Ao Vivo)" e sem "ft."/"feat.".
+    """
+    if not isinstance(text, str):
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = text.split("|", 1)[0]
+    text = _NOISE_BRACKETS.sub(" ", text)
+    text = _FEAT.sub(" ", text)
+    return _NON_WORD.sub(" ", text).strip()
+
+def _join_key(key: str) -> str:
+    """Conjunto de tokens ordenado: duas chaves iguais aqui têm token_set_ratio 100."""
+    return " ".join(sorted(set(key.split())))
+
+def correlate_music_video(spotify_df: pd.DataFrame, youtube_df: pd.DataFrame, threshold: int = 85,
+                          method: str = "batched", block_size: int = DEFAULT_BLOCK_SIZE,
+                          workers: int = -1, cache: MatchCache = None,
+                          normalize: bool = True, lsh_index: LSHIndex = None) -> pd.DataFrame:
     """
     Cria correlações entre faixas do Spotify e vídeos do YouTube
     com base em similaridade de nomes (fuzzy matching).
-    
+
     Args:
         spotify_df: DataFrame de faixas do Spotify
         youtube_df: DataFrame de vídeos do YouTube
         threshold: nível mínimo de similaridade (0-100)
+        method: "batched" (matriz de scores vetorizada), "lsh" (só candidatos do
+            índice MinHash/LSH são pontuados) ou "legacy" (loop par a par)
+        block_size: faixas pontuadas por bloco no modo "batched"
+        workers: núcleos usados pelo RapidFuzz no modo "batched" (-1 = todos)
+        cache: MatchCache opcional; só os pares com faixas ou vídeos novos são pontuados
+        normalize: no modo "batched", compara chaves normalizadas (normalize_key) e
+            resolve matches exatos por hash join; False reproduz o modo legado
+        lsh_index: LSHIndex do modo "lsh" (cache das assinaturas dos títulos entre runs);
+            sem ele um índice novo é montado com os parâmetros padrão
 
     Returns:
         DataFrame com as correlações encontradas
     """
-    results = []
     if spotify_df.empty or youtube_df.empty:
         return pd.DataFrame()
 
+    if method == "legacy":
+        return _correlate_legacy(spotify_df, youtube_df, threshold)
+    if method == "batched":
+        return _correlate_batched(spotify_df, youtube_df, threshold, block_size, workers, cache, normalize)
+    if method == "lsh":
+        return _correlate_batched(spotify_df, youtube_df, threshold, block_size, workers,
+                                  lsh_index=lsh_index if lsh_index is not None else LSHIndex())
+    raise ValueError(f"Método de correlação desconhecido: {method}")
+
+def _correlate_legacy(spotify_df: pd.DataFrame, youtube_df: pd.DataFrame, threshold: int) -> pd.DataFrame:
+    """Implementação original: compara cada faixa com cada vídeo via iterrows()."""
+    results = []
     for _, s_row in spotify_df.iterrows():
         track_name = f"{s_row['track_name']} {s_row['artist_name']}"
         best_match = None
@@ -46,3 +111,188 @@ def correlate_music_video(spotify_df: pd.DataFrame, youtube_df: pd.DataFrame, th
             })
 
     return pd.DataFrame(results)
+
+def _best_matches(queries: list, choices: list, block_size: int, workers: int):
+    """
+    Pontua as consultas contra todas as escolhas em blocos (process.cdist)
+    e devolve, para cada consulta, o índice e o score do melhor candidato.
+
+    O argmax devolve a primeira ocorrência do maior score, o mesmo
+    desempate do loop legado (que só troca o melhor quando score > best).
+    """
+    best_idx = np.empty(len(queries), dtype=np.int64)
+    best_score = np.empty(len(queries), dtype=np.float64)
+    for start in range(0, len(queries), block_size):
+        block = queries[start:start + block_size]
+        scores = process.cdist(block, choices, scorer=fuzz.token_set_ratio,
+                               dtype=np.float64, workers=workers)
+        idx = scores.argmax(axis=1)
+        best_idx[start:start + len(block)] = idx
+        best_score[start:start + len(block)] = scores[np.arange(len(block)), idx]
+    return best_idx, best_score
+
+def _best_matches_cached(queries: list, choices: list, cache: MatchCache,
+                         block_size: int, workers: int):
+    """
+    Igual a _best_matches, mas reaproveita os scores do cache e só chama o
+    RapidFuzz para os pares (faixa, escolha) que ainda não foram pontuados.
+    Consultas e escolhas devem ser únicas.
+    """
+    choice_pos = {c: i for i, c in enumerate(choices)}
+    choice_ids = cache.video_ids(choices)
+    # faixas pontuadas nos mesmos runs têm os mesmos lotes: uma máscara por grupo
+    masks = {}
+
+    best_idx = np.empty(len(queries), dtype=np.int64)
+    best_score = np.empty(len(queries), dtype=np.float64)
+    new_pairs = []
+    hits = recomputed = 0
+
+    def collect(rows_queries, cols_choices, scores):
+        for r, c in zip(*np.nonzero(scores >= cache.floor)):
+            new_pairs.append((rows_queries[r], cols_choices[c], scores[r, c]))
+
+    for start in range(0, len(queries), block_size):
+        block = queries[start:start + block_size]
+        scores = np.zeros((len(block), len(choices)), dtype=np.float64)
+        groups = {}
+        for r, query in enumerate(block):
+            groups.setdefault(cache.tracks.get(query, frozenset()), []).append(r)
+
+        for batches, rows in groups.items():
+            if batches not in masks:
+                masks[batches] = cache.covered(batches, choice_ids)
+            covered = masks[batches]
+            rows = np.array(rows)
+            rows_queries = [block[r] for r in rows]
+            missing = np.flatnonzero(~covered)
+            if missing.size:
+                missing_choices = [choices[i] for i in missing]
+                sub = process.cdist(rows_queries, missing_choices, scorer=fuzz.token_set_ratio,
+                                    dtype=np.float64, workers=workers)
+                scores[np.ix_(rows, missing)] = sub
+                recomputed += sub.size
+                collect(rows_queries, missing_choices, sub)
+            if missing.size < len(choices):
+                hits += len(rows) * (len(choices) - missing.size)
+                # pares já pontuados: o que não está no cache ficou abaixo do piso (score 0 aqui)
+                for r, query in zip(rows, rows_queries):
+                    for choice, score in cache.pairs.get(query, {}).items():
+                        pos = choice_pos.get(choice)
+                        if pos is not None and covered[pos]:
+                            scores[r, pos] = score
+
+        idx = scores.argmax(axis=1)
+        best_idx[start:start + len(block)] = idx
+        best_score[start:start + len(block)] = scores[np.arange(len(block)), idx]
+
+    cache.merge(queries, choices, new_pairs)
+    cache.report(hits, recomputed)
+    return best_idx, best_score
+
+def _best_matches_lsh(queries: list, choices: list, index: LSHIndex, workers: int,
+                      return_counts: bool = False):
+    """
+    Como _best_matches, mas cada consulta só é pontuada contra os candidatos
+    do índice LSH (pares avaliados de uma vez com process.cpdist). Consulta
+    sem candidato fica com score 0. A busca é montada só sobre choices; os
+    títulos já vistos em runs anteriores só reaproveitam a assinatura.
+    """
+    index.build(choices)
+    # posições em choices, já ordenadas por (consulta, posição)
+    pair_query, pair_choice = index.candidate_pairs(queries)
+    counts = np.bincount(pair_query, minlength=len(queries))
+
+    best_idx = np.zeros(len(queries), dtype=np.int64)
+    best_score = np.zeros(len(queries), dtype=np.float64)
+    if pair_query.size:
+        scores = process.cpdist([queries[q] for q in pair_query], [choices[c] for c in pair_choice],
+                                scorer=fuzz.token_set_ratio, dtype=np.float64, workers=workers)
+        has = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[has]
+        seg_max = np.maximum.reduceat(scores, starts)
+        # candidatos em ordem crescente: o primeiro com o score máximo mantém o desempate do argmax
+        is_max = scores == np.repeat(seg_max, counts[has])
+        first = np.minimum.reduceat(np.where(is_max, np.arange(len(scores)), len(scores)), starts)
+        best_idx[has] = pair_choice[first]
+        best_score[has] = seg_max
+    if return_counts:
+        return best_idx, best_score, counts
+    return best_idx, best_score
+
+def _correlate_batched(spotify_df: pd.DataFrame, youtube_df: pd.DataFrame, threshold: int,
+                       block_size: int, workers: int, cache: MatchCache = None,
+                       normalize: bool = True, lsh_index: LSHIndex = None) -> pd.DataFrame:
+    """
+    Matriz de scores com argmax vetorizado sobre chaves únicas.
+
+    Cada chave de faixa (repetida por região) e de título é pontuada uma
+    única vez e o resultado é replicado para todas as linhas. Com normalize,
+    chaves com o mesmo conjunto de tokens são resolvidas por hash join
+    (score 100) antes do RapidFuzz; sem normalize o resultado é idêntico
+    ao do modo legado. Com lsh_index, as chaves que sobram do hash join só
+    são pontuadas contra os candidatos do índice.
+    """
+    spotify_df = spotify_df.reset_index(drop=True)
+    youtube_df = youtube_df.reset_index(drop=True)
+
+    queries = [f"{t} {a}" for t, a in zip(spotify_df["track_name"], spotify_df["artist_name"])]
+    titles = youtube_df["title"].tolist()
+    if normalize:
+        queries = [normalize_key(q) for q in queries]
+        titles = [normalize_key(t) for t in titles]
+
+    q_codes, uniq_queries = pd.factorize(pd.Series(queries, dtype=object), sort=False)
+    t_codes, uniq_titles = pd.factorize(pd.Series(titles, dtype=object), sort=False)
+    uniq_queries, uniq_titles = uniq_queries.tolist(), uniq_titles.tolist()
+    # primeira linha de cada título único, para manter o desempate do modo legado
+    first_row = pd.Series(np.arange(len(titles))).groupby(t_codes).first().to_numpy()
+
+    u_best_idx = np.zeros(len(uniq_queries), dtype=np.int64)
+    u_best_score = np.zeros(len(uniq_queries), dtype=np.float64)
+    pending = np.arange(len(uniq_queries))
+
+    if normalize:
+        join_index = {}
+        for i, title in enumerate(uniq_titles):
+            if title:
+                join_index.setdefault(_join_key(title), i)
+        exact = [join_index.get(_join_key(q)) if q else None for q in uniq_queries]
+        matched = np.array([e is not None for e in exact], dtype=bool)
+        u_best_idx[matched] = [e for e in exact if e is not None]
+        u_best_score[matched] = 100.0
+        pending = np.flatnonzero(~matched)
+        print(f"🔑 Hash join: {int(matched.sum())} de {len(uniq_queries)} chaves únicas resolvidas sem fuzzy.")
+
+    if pending.size:
+        pending_queries = [uniq_queries[i] for i in pending]
+        if lsh_index is not None:
+            idx, score = _best_matches_lsh(pending_queries, uniq_titles, lsh_index, workers)
+        elif cache is None:
+            idx, score = _best_matches(pending_queries, uniq_titles, block_size, workers)
+        else:
+            cache.ensure_compatible(threshold, MATCH_KEY_VERSION if normalize else RAW_KEY_VERSION)
+            idx, score = _best_matches_cached(pending_queries, uniq_titles, cache, block_size, workers)
+        u_best_idx[pending] = idx
+        u_best_score[pending] = score
+
+    best_idx = first_row[u_best_idx[q_codes]]
+    best_score = u_best_score[q_codes]
+
+    # best_score > 0 replica o legado: sem nenhum score positivo não há vídeo escolhido
+    keep = (best_score >= threshold) & (best_score > 0)
+    if not keep.any():
+        return pd.DataFrame()
+
+    tracks = spotify_df[keep]
+    videos = youtube_df.iloc[best_idx[keep]]
+    return pd.DataFrame({
+        "track_id": tracks["track_id"].to_numpy(),
+        "track_name": tracks["track_name"].to_numpy(),
+        "artist_name": tracks["artist_name"].to_numpy(),
+        "video_id": videos["video_id"].to_numpy(),
+        "video_title": videos["title"].to_numpy(),
+        "similarity_score": best_score[keep],
+        "region_spotify": tracks["region"].to_numpy() if "region" in tracks else "N/A",
+        "region_youtube": videos["region"].to_numpy() if "region" in videos else "N/A"
+    })
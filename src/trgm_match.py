@@ -0,0 +1,281 @@
+# ==============================================
+# Correlação dentro do PostgreSQL (pg_trgm)
+# ==============================================
+# Alternativa ao correlate_music_video que não traz as tabelas para o
+# pandas: a chave normalizada é uma função SQL IMMUTABLE (match_key, o
+# mesmo normalize_key do transform.py), indexada com GIN gin_trgm_ops, e
+# cada chave de faixa busca o vídeo mais parecido com um LATERAL top-1:
+#
+#   match_key(title) % chave   → filtro pelo índice GIN (similarity >= threshold)
+#   ORDER BY similarity DESC LIMIT 1
+#
+# O resultado vai direto para correlations (DELETE + INSERT na mesma
+# transação). O score é similarity() * 100: trigramas, não token_set_ratio,
+# então o threshold é outro (TRGM_THRESHOLD, 0-1).
+# Ainda experimental e fora do etl_runner: medido só com dados sintéticos
+# num PostgreSQL 18 (pg_trgm 1.6, a versão do postgres:15); números no README.
+#
+#   python src/trgm_match.py --compare                 → pg_trgm x RapidFuzz nas tabelas do banco
+#   python src/trgm_match.py --compare --scale medium  → idem com dados sintéticos num schema à parte
+#   python src/trgm_match.py --compare --scale medium --sweep  → concordância para vários TRGM_THRESHOLD
+# ==============================================
+
+import argparse
+import os
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from clients import get_engine
+from load import schema_statements
+from transform import _FEAT, _NOISE_BRACKETS
+
+load_dotenv()
+
+# Similaridade mínima de trigramas (0-1) para gravar a correlação. Calibrada com
+# --compare --scale medium --sweep contra o gabarito dos dados sintéticos
+# (0.7: precisão 94%, recall 88%; o RapidFuzz a 85 fica em 26% e 84%)
+TRGM_THRESHOLD = float(os.getenv("TRGM_THRESHOLD", "0.7"))
+
+def _pg_regex(pattern) -> str:
+    # \b do Python é \y nas regex do PostgreSQL ([\W_] do Python, que o PostgreSQL
+    # não aceita dentro de colchetes, vira [^[:alnum:]] direto no SQL)
+    return pattern.pattern.replace(r"\b", r"\y")
+
+# unaccent() não é IMMUTABLE (depende do dicionário do search_path); fixar o
+# dicionário permite usá-la em índice de expressão
+TRGM_SETUP = [
+    # tudo em public: o --compare --scale roda com outro schema no search_path
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public",
+    "CREATE EXTENSION IF NOT EXISTS unaccent SCHEMA public",
+    """
+    CREATE OR REPLACE FUNCTION public.f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION public.match_key(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$
+      SELECT btrim(regexp_replace(
+        regexp_replace(
+          regexp_replace(split_part(lower(public.f_unaccent($1)), '|', 1),
+                         '{_pg_regex(_NOISE_BRACKETS)}', ' ', 'g'),
+          '{_pg_regex(_FEAT)}', ' ', 'g'),
+        '[^[:alnum:]]+', ' ', 'g'))
+    $$
+    """,
+    # título do vídeo: usado pelo LATERAL da correlação
+    "CREATE INDEX IF NOT EXISTS idx_youtube_videos_title_trgm "
+    "ON youtube_videos USING gin (match_key(title) gin_trgm_ops) WITH (fastupdate = off)",
+    # chave da faixa: busca no sentido inverso (vídeo → faixas), ex. consultas ad hoc
+    "CREATE INDEX IF NOT EXISTS idx_spotify_tracks_key_trgm "
+    "ON spotify_tracks USING gin (match_key(coalesce(track_name, '') || ' ' || coalesce(artist_name, '')) "
+    "gin_trgm_ops) WITH (fastupdate = off)",
+]
+
+# Com fastupdate (padrão do GIN), linhas gravadas depois do índice ficam numa lista
+# pendente que toda busca percorre inteira, recalculando match_key: 1k faixas x 1k
+# vídeos levavam ~20s em vez de 0,1s. Índices criados antes do fastupdate = off
+# têm a lista esvaziada a cada run.
+TRGM_INDEXES = ["idx_youtube_videos_title_trgm", "idx_spotify_tracks_key_trgm"]
+
+# Uma busca por chave única de faixa; o resultado é replicado para cada (faixa, região)
+TRGM_MATCH_SELECT = """
+    WITH tracks AS (
+        SELECT track_id, track_name, artist_name, region,
+               match_key(coalesce(track_name, '') || ' ' || coalesce(artist_name, '')) AS key
+        FROM spotify_tracks
+    ),
+    best AS (
+        SELECT k.key, v.video_id, v.title, v.region, v.score
+        FROM (SELECT DISTINCT key FROM tracks WHERE key <> '') k
+        CROSS JOIN LATERAL (
+            SELECT y.video_id, y.title, y.region, similarity(match_key(y.title), k.key) AS score
+            FROM youtube_videos y
+            WHERE match_key(y.title) % k.key
+            ORDER BY score DESC, y.video_id, y.region
+            LIMIT 1
+        ) v
+    )
+    SELECT t.track_id, t.track_name, t.artist_name, b.video_id, b.title AS video_title,
+           CAST(round(CAST(b.score * 100 AS numeric), 2) AS double precision) AS similarity_score,
+           t.region AS region_spotify, b.region AS region_youtube
+    FROM tracks t
+    JOIN best b ON b.key = t.key
+"""
+
+CORRELATION_COLUMNS = ["track_id", "track_name", "artist_name", "video_id", "video_title",
+                       "similarity_score", "region_spotify", "region_youtube"]
+
+def ensure_trgm(conn):
+    """Extensões, funções match_key/f_unaccent e índices GIN (idempotente)."""
+    for table_name in ("spotify_tracks", "youtube_videos", "correlations"):
+        create_table, indexes = schema_statements(table_name)
+        conn.exec_driver_sql(create_table)
+        for _, stmt in indexes:
+            conn.exec_driver_sql(stmt)
+    for stmt in TRGM_SETUP:
+        conn.exec_driver_sql(stmt)
+    for index in TRGM_INDEXES:
+        conn.execute(text("SELECT gin_clean_pending_list(CAST(:index AS regclass))"), {"index": index})
+
+def _set_threshold(conn, threshold: float):
+    # vale só para a transação: o operador % e o índice GIN usam este limite
+    conn.execute(text("SELECT set_config('pg_trgm.similarity_threshold', :t, true)"), {"t": str(threshold)})
+
+def correlate_in_db(threshold: float = TRGM_THRESHOLD, db_engine=None) -> int:
+    """
+    Refaz a tabela correlations inteiramente no banco. Quem lê vê as
+    correlações antigas até o commit. Devolve o número de linhas gravadas.
+    """
+    start = time.perf_counter()
+    columns = ", ".join(CORRELATION_COLUMNS)
+    with (db_engine or get_engine()).begin() as conn:
+        ensure_trgm(conn)
+        _set_threshold(conn, threshold)
+        conn.exec_driver_sql("DELETE FROM correlations")
+        rows = conn.execute(text(f"INSERT INTO correlations ({columns}) {TRGM_MATCH_SELECT}")).rowcount
+    print(f"🐘 pg_trgm: {rows} correlações gravadas no banco em {time.perf_counter() - start:.2f}s "
+          f"(similarity >= {threshold})")
+    return rows
+
+def match_in_db(threshold: float = TRGM_THRESHOLD, db_engine=None, conn=None) -> pd.DataFrame:
+    """As mesmas correlações de correlate_in_db, devolvidas em vez de gravadas (para comparação)."""
+    if conn is None:
+        with (db_engine or get_engine()).begin() as conn:
+            return match_in_db(threshold, conn=conn)
+    ensure_trgm(conn)
+    _set_threshold(conn, threshold)
+    return pd.read_sql(text(TRGM_MATCH_SELECT), conn)
+
+# Limites testados pelo --sweep
+SWEEP_THRESHOLDS = (0.4, 0.5, 0.6, 0.65, 0.7, 0.75, 0.8)
+
+def _agreement(rf: pd.DataFrame, trgm: pd.DataFrame) -> dict:
+    """Concordância das correlações por (faixa, região), com o RapidFuzz como referência."""
+    from transform import normalize_key
+
+    both = rf.merge(trgm, on=["track_id", "region_spotify"], suffixes=("_rf", "_trgm"))
+    return {
+        "trgm_rows": len(trgm),
+        "both": len(both),
+        "same_video": int((both["video_id_rf"] == both["video_id_trgm"]).sum()),
+        # títulos repetidos (mesmo clipe em várias regiões) empatam: o vídeo escolhido pode diferir
+        "same_title": int((both["video_title_rf"].map(normalize_key)
+                           == both["video_title_trgm"].map(normalize_key)).sum()),
+        "only_trgm": len(trgm) - len(both),
+        "only_rapidfuzz": len(rf) - len(both),
+        "recall": len(both) / len(rf) if len(rf) else None,
+        "precision": len(both) / len(trgm) if len(trgm) else None,
+    }
+
+def _truth_scores(matches: pd.DataFrame, spotify_df: pd.DataFrame, source_track: dict) -> dict:
+    """
+    Acerto contra o gabarito dos dados sintéticos ({video_id: track_id de origem}).
+    Uma linha acerta se o vídeo veio de uma faixa com a mesma chave (faixas
+    homônimas são indistinguíveis); recall = chaves de faixa com vídeo de origem
+    que receberam um vídeo certo.
+    """
+    from transform import normalize_key
+
+    key_of = dict(zip(spotify_df["track_id"],
+                      (spotify_df["track_name"].fillna("") + " " + spotify_df["artist_name"].fillna("")).map(normalize_key)))
+    source_key = {video_id: key_of.get(track_id) for video_id, track_id in source_track.items()}
+    keys = matches["track_id"].map(key_of)
+    correct = matches["video_id"].map(source_key) == keys
+    findable = set(source_key.values()) & set(key_of.values())
+    return {
+        "truth_precision": float(correct.mean()) if len(matches) else None,
+        "truth_recall": len(set(keys[correct]) & findable) / len(findable) if findable else None,
+    }
+
+def _truth_line(r: dict) -> str:
+    if "truth_precision" not in r:
+        return ""
+    return f"; gabarito: precisão {r['truth_precision'] or 0:.1%}, recall {r['truth_recall'] or 0:.1%}"
+
+def compare_engines(conn, rf_threshold: int = 85, trgm_threshold: float = TRGM_THRESHOLD,
+                    method: str = "batched", sweep=(), truth: dict = None) -> dict:
+    """
+    pg_trgm x RapidFuzz sobre as tabelas visíveis em conn: tempo de cada motor
+    e concordância das correlações por (faixa, região). Com sweep, repete o
+    pg_trgm para cada limite (o RapidFuzz roda uma vez só) e devolve as
+    medições em result["sweep"]. Com truth ({video_id: track_id de origem},
+    dos dados sintéticos), os dois motores também são medidos contra o gabarito.
+    """
+    from transform import correlate_music_video
+
+    start = time.perf_counter()
+    spotify_df = pd.read_sql(text("SELECT track_id, track_name, artist_name, region FROM spotify_tracks"), conn)
+    youtube_df = pd.read_sql(text("SELECT video_id, title, region FROM youtube_videos"), conn)
+    read_s = time.perf_counter() - start
+    start = time.perf_counter()
+    rf = correlate_music_video(spotify_df, youtube_df, threshold=rf_threshold, method=method)
+    rf_s = time.perf_counter() - start
+    if rf.empty:
+        rf = pd.DataFrame(columns=CORRELATION_COLUMNS)
+    rf_truth = _truth_scores(rf, spotify_df, truth) if truth else {}
+    print(f"🐍 RapidFuzz {method} (score >= {rf_threshold}): {len(rf)} correlações em "
+          f"{rf_s:.2f}s (+ {read_s:.2f}s lendo {len(spotify_df) + len(youtube_df)} linhas do banco)"
+          f"{_truth_line(rf_truth)}")
+
+    measured = []
+    for threshold in sorted(set(sweep) | {trgm_threshold}):
+        start = time.perf_counter()
+        trgm = match_in_db(threshold, conn=conn)
+        r = {"threshold": threshold, "trgm_s": round(time.perf_counter() - start, 3), **_agreement(rf, trgm)}
+        if truth:
+            r.update(_truth_scores(trgm, spotify_df, truth))
+        measured.append(r)
+        print(f"🐘 pg_trgm (similarity >= {threshold}): {r['trgm_rows']} correlações em {r['trgm_s']:.2f}s; "
+              f"nos dois {r['both']} (mesmo vídeo {r['same_video']}, mesmo título {r['same_title']}), "
+              f"só pg_trgm {r['only_trgm']}, só RapidFuzz {r['only_rapidfuzz']}{_truth_line(r)}")
+
+    result = next(r for r in measured if r["threshold"] == trgm_threshold)
+    result.update({
+        "tracks": len(spotify_df),
+        "videos": len(youtube_df),
+        "rapidfuzz_rows": len(rf),
+        "rapidfuzz_read_s": round(read_s, 3),
+        "rapidfuzz_s": round(rf_s, 3),
+        **{f"rapidfuzz_{name}": value for name, value in rf_truth.items()},
+    })
+    if sweep:
+        result["sweep"] = measured
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correlação dentro do PostgreSQL com pg_trgm.")
+    parser.add_argument("--threshold", type=float, default=TRGM_THRESHOLD, help="similarity mínima (0-1)")
+    parser.add_argument("--compare", action="store_true", help="compara com o RapidFuzz em vez de gravar")
+    parser.add_argument("--rf-threshold", type=int, default=85)
+    parser.add_argument("--method", default="batched", help="motor RapidFuzz da comparação")
+    parser.add_argument("--scale", help="com --compare: dados sintéticos (small/medium/large) no schema trgm_bench")
+    parser.add_argument("--sweep", action="store_true", help="com --compare: testa vários limites de similarity")
+    args = parser.parse_args()
+    sweep = SWEEP_THRESHOLDS if args.sweep else ()
+
+    if not args.compare:
+        correlate_in_db(args.threshold)
+    elif not args.scale:
+        with get_engine().begin() as conn:
+            compare_engines(conn, args.rf_threshold, args.threshold, args.method, sweep)
+    else:
+        import sys
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+        from synthetic import make_dataset
+
+        tracks, videos = make_dataset(args.scale)
+        with get_engine().begin() as conn:
+            # schema descartável: as tabelas de verdade não são tocadas
+            conn.exec_driver_sql("DROP SCHEMA IF EXISTS trgm_bench CASCADE")
+            conn.exec_driver_sql("CREATE SCHEMA trgm_bench")
+            conn.exec_driver_sql("SET LOCAL search_path TO trgm_bench, public")
+            tracks.to_sql("spotify_tracks", conn, schema="trgm_bench", index=False)
+            videos.to_sql("youtube_videos", conn, schema="trgm_bench", index=False)
+            compare_engines(conn, args.rf_threshold, args.threshold, args.method, sweep,
+                            truth=videos.attrs.get("source_track_id"))
+            conn.exec_driver_sql("DROP SCHEMA trgm_bench CASCADE")